@@ -0,0 +1,159 @@
+"""
+BenchmarkCrawler.py
+
+This script runs a full crawl of InterpolDataExtractor against MockInterpolAPI and reports how much it cost, so that
+changes to the crawler can be compared objectively on the same corpus:
+- the number of requests per endpoint and the requests per published notice,
+- the coverage (published notices / notices in the corpus),
+- the wall time and the notices published per second,
+- the peak traced Python memory and the peak resident set size of the process.
+
+The notices are counted by an in-process publisher instead of being sent to RabbitMQ. The report is printed as JSON
+and can be appended to a JSON lines file with --output to keep a history of the runs.
+
+Example:
+    python BenchmarkCrawler.py --size 20000 --latency 0.01 --output benchmarks.jsonl
+
+Dependencies:
+- MockInterpolAPI: Custom module serving the mock Interpol API
+- ManageData: Custom module containing the crawler
+- tracemalloc, resource: Python modules for measuring the memory usage
+
+@Author: Nisanur Genc
+
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import resource
+import tempfile
+import time
+import tracemalloc
+from MockInterpolAPI import MockInterpolAPI, load_corpus, synthetic_corpus
+from ManageData import InterpolDataExtractor
+from ResponseCache import ResponseCache
+from RetryQueue import RetryQueue
+
+
+class CountingPublisher:
+    """Stands in for RabbitMQConnection and counts the published notices."""
+
+    def __init__(self):
+        self.published = 0
+        self.entity_ids = set()
+
+    def publish_data(self, data, headers=None):
+        if headers and headers.get("control"):
+            return
+        self.published += 1
+        self.entity_ids.add(data["entity_id"])
+
+    def is_connected(self):
+        return True
+
+
+def run_benchmark(corpus, latency=0.0, rate_limit=0, rate_window=60.0, request_delay=0.0, retry_delay=1.0, verbose=False,
+                  cache_dir=None, offline=False, port=0):
+    """
+    Crawl a corpus served by MockInterpolAPI and measure the crawl.
+
+    Parameters:
+    - corpus (list): The notices to serve.
+    - latency (float): Delay (in seconds) added by the mock to every response.
+    - rate_limit (int): Requests per rate window allowed by the mock, 0 for no limit.
+    - rate_window (float): Length (in seconds) of the rate limit window.
+    - request_delay (float): Delay (in seconds) of the crawler between two listing requests.
+    - retry_delay (float): Delay (in seconds) of the crawler before retrying a listing request.
+    - verbose (bool): Keep the output of the crawler.
+    - cache_dir (str): The directory of a response cache of the listing pages, None for no cache.
+    - offline (bool): Replay the response cache without requesting the listing pages.
+    - port (int): The port of the mock, 0 for any free port. The cached URLs include it.
+
+    Returns:
+    - dict: The benchmark report.
+    """
+    mock_api = MockInterpolAPI(corpus, port=port, latency=latency, rate_limit=rate_limit, rate_window=rate_window)
+    mock_api.start()
+    publisher = CountingPublisher()
+    # A catalog of its own, so the nationalities come from the mock and the shared catalog is left alone
+    catalog_directory = tempfile.TemporaryDirectory()
+    extractor = InterpolDataExtractor(
+        None, None, None, api_url=mock_api.api_url, countries_url=mock_api.countries_url,
+        publisher=publisher, request_delay=request_delay, retry_delay=retry_delay,
+        country_catalog_path=os.path.join(catalog_directory.name, "countries.json"),
+        response_cache=ResponseCache(cache_dir, offline=offline) if cache_dir else None,
+        # The dead letters are reported with the run instead of being appended to the report file
+        retry_queue=RetryQueue(base_delay=retry_delay, dead_letter_path=None),
+    )
+
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    try:
+        with contextlib.ExitStack() as stack:
+            if not verbose:
+                stack.enter_context(contextlib.redirect_stdout(open(os.devnull, "w")))
+            extractor.start_extraction()
+    finally:
+        wall_time = time.perf_counter() - start_time
+        _, peak_traced = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        mock_api.stop()
+        catalog_directory.cleanup()
+
+    requests_by_endpoint = mock_api.request_counts()
+    total_requests = sum(sum(counts.values()) for counts in requests_by_endpoint.values())
+    notices = len(publisher.entity_ids)
+    return {
+        "corpus_size": len(corpus),
+        "crawl_phase": extractor.phase,
+        "notices_published": notices,
+        "coverage": round(notices / len(corpus), 4) if corpus else None,
+        "requests": requests_by_endpoint,
+        "total_requests": total_requests,
+        "requests_per_notice": round(total_requests / notices, 3) if notices else None,
+        "dead_letters": extractor.retry_queue.dead_letter_count(),
+        "wall_time_seconds": round(wall_time, 3),
+        "notices_per_second": round(notices / wall_time, 2) if wall_time else None,
+        "peak_traced_memory_bytes": peak_traced,
+        "max_rss_kilobytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "settings": {
+            "latency": latency, "rate_limit": rate_limit, "rate_window": rate_window,
+            "request_delay": request_delay, "retry_delay": retry_delay,
+            "cache_dir": cache_dir, "offline": offline,
+        },
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark a full crawl against the mock Interpol API.")
+    parser.add_argument("--corpus", help="data.csv or a .jsonl dump to crawl instead of a synthetic corpus")
+    parser.add_argument("--size", type=int, default=20000, help="number of notices of the synthetic corpus")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic corpus")
+    parser.add_argument("--latency", type=float, default=0.0, help="delay (in seconds) added to every response")
+    parser.add_argument("--rate-limit", type=int, default=0, help="requests per rate window, 0 for no limit")
+    parser.add_argument("--rate-window", type=float, default=60.0, help="length (in seconds) of the rate window")
+    parser.add_argument("--request-delay", type=float, default=0.0, help="crawler delay between listing requests")
+    parser.add_argument("--retry-delay", type=float, default=1.0, help="crawler delay before a retry")
+    parser.add_argument("--cache-dir", help="cache the listing pages in this directory, e.g. to compare repeat crawls")
+    parser.add_argument("--offline", action="store_true", help="replay the cache of --cache-dir without requests")
+    parser.add_argument("--port", type=int, default=0,
+                        help="port of the mock, fix it with --cache-dir so the cached URLs match between runs")
+    parser.add_argument("--label", help="name of the run, e.g. the commit being measured")
+    parser.add_argument("--output", help="append the report to this JSON lines file")
+    parser.add_argument("--verbose", action="store_true", help="show the output of the crawler")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus) if args.corpus else synthetic_corpus(args.size, args.seed)
+    report = run_benchmark(
+        corpus, args.latency, args.rate_limit, args.rate_window, args.request_delay, args.retry_delay, args.verbose,
+        args.cache_dir, args.offline, args.port,
+    )
+    report["label"] = args.label
+    report["corpus"] = args.corpus or f"synthetic:{args.size}:{args.seed}"
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "a") as output_file:
+            output_file.write(json.dumps(report) + "\n")
@@ -0,0 +1,524 @@
+"""
+DistributedCrawl.py
+
+This script spreads a full crawl over any number of Container A instances. The partitions of the listing (age
+intervals, split further by gender, wanted-by country, nationality, forename and name initials while they exceed
+the 160-result cap) are messages of a durable RabbitMQ work queue:
+
+- the coordinator starts a generation and enqueues the age intervals,
+- every worker pulls one partition at a time, crawls its pages and acknowledges it once done; a partition above the
+  cap is not crawled but re-enqueued as its child partitions, so the work spreads as it is discovered,
+- a worker that dies leaves its partition unacknowledged and RabbitMQ hands it to another worker.
+
+The workers share their state through PostgreSQL (SharedCrawlState):
+- the entity IDs already published in the generation, so a notice reached through two partitions (e.g. two
+  nationalities) is published and its image looked up only once,
+- the partitions already done and the number still pending, so redelivered partitions are not counted twice and the
+  worker finishing the last partition publishes the end-of-crawl marker of the generation,
+- a token bucket of requests per hour, taken before every request (retries and image lookups included), so the
+  Interpol API sees the same global rate whatever the number of workers.
+
+The tables of the shared state live in a schema of their own (crawl_state): the database is the one of Container B,
+whose Alembic migrations manage the public schema and would otherwise propose to drop them.
+
+Dependencies:
+- pika: Python library for RabbitMQ integration
+- psycopg2: PostgreSQL driver for the shared crawl state
+- ManageData: Custom module containing the crawler whose partition crawl is reused
+- RecrawlScheduler: Custom module defining how partitions are split
+- Readiness: Custom module for polling the dependencies with exponential backoff until they accept connections
+
+@Author: Nisanur Genc
+
+"""
+
+import json
+import os
+import threading
+import time
+import pika
+import psycopg2
+from ExtractCountries import InterpolCountriesExtractor
+from ManageData import AGE_INTERVALS
+from Metrics import DISTRIBUTED_PARTITIONS, GLOBAL_BUDGET_WAIT_SECONDS
+from Readiness import Backoff, wait_for
+from RecrawlScheduler import child_partitions, partition_key, partition_values
+
+CRAWL_STATE_DATABASE_URL = os.environ.get(
+    "CRAWL_STATE_DATABASE_URL",
+    "postgresql://postgres:bxhrYukUTq/6SJGSKvZzH/gCFyn/d5iaHraBuLBvznI=@postgres:5432/my_db",
+)
+CRAWL_STATE_SCHEMA = os.environ.get("CRAWL_STATE_SCHEMA", "crawl_state")
+CRAWL_PARTITION_QUEUE = os.environ.get("CRAWL_PARTITION_QUEUE", "crawl_partitions")
+RATE_LIMIT_NAME = "interpol_api"
+
+# Created in the schema of the shared state, the only one on the search path of its connection
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS crawl_generation (
+        generation bigint PRIMARY KEY,
+        pending integer NOT NULL,
+        truncated integer NOT NULL DEFAULT 0,
+        started_at double precision NOT NULL,
+        finished_at double precision
+    )""",
+    """CREATE TABLE IF NOT EXISTS crawl_partition_done (
+        generation bigint NOT NULL,
+        partition_key text NOT NULL,
+        PRIMARY KEY (generation, partition_key)
+    )""",
+    """CREATE TABLE IF NOT EXISTS crawl_seen_notice (
+        generation bigint NOT NULL,
+        entity_id text NOT NULL,
+        PRIMARY KEY (generation, entity_id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS crawl_rate_limit (
+        name text PRIMARY KEY,
+        tokens double precision NOT NULL,
+        updated_at double precision NOT NULL
+    )""",
+]
+
+
+class SharedCrawlState:
+    """The state shared by the coordinator and the workers, in PostgreSQL."""
+
+    def __init__(self, database_url=CRAWL_STATE_DATABASE_URL, connect_timeout=300, schema=CRAWL_STATE_SCHEMA):
+        """
+        Constructor for the SharedCrawlState class.
+
+        Parameters:
+        - database_url (str): The PostgreSQL URL of the shared state.
+        - connect_timeout (float): The maximum time (in seconds) to wait for PostgreSQL to accept connections.
+        - schema (str): The PostgreSQL schema of the tables of the shared state.
+        """
+        self.database_url = database_url
+        self.connect_timeout = connect_timeout
+        self.schema = schema
+        self.connection = None
+        self.connect()
+
+    def connect(self):
+        """Connect to PostgreSQL, polling with exponential backoff, and create the tables if needed."""
+        def open_connection():
+            self.connection = psycopg2.connect(self.database_url, options=f"-c search_path={self.schema}")
+            return True
+
+        if not wait_for(open_connection, "PostgreSQL", timeout=self.connect_timeout):
+            raise RuntimeError("The shared crawl state is not reachable.")
+        with self.connection, self.connection.cursor() as cursor:
+            cursor.execute(f"CREATE SCHEMA IF NOT EXISTS {self.schema}")
+            for statement in SCHEMA:
+                cursor.execute(statement)
+
+    def run(self, operation):
+        """
+        Run operation(cursor) in a transaction, reconnecting once if the connection was lost.
+
+        Returns:
+        - The value returned by the operation.
+        """
+        for attempt in range(2):
+            try:
+                with self.connection, self.connection.cursor() as cursor:
+                    return operation(cursor)
+            except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+                if attempt:
+                    raise
+                print("Shared crawl state connection lost, reconnecting:", e)
+                self.connect()
+
+    def start_generation(self, generation, partitions):
+        """
+        Register a new generation with its root partitions, and forget the older generations.
+
+        Parameters:
+        - generation (int): The ID of the crawl.
+        - partitions (int): The number of partitions enqueued by the coordinator.
+        """
+        def operation(cursor):
+            for table in ("crawl_seen_notice", "crawl_partition_done"):
+                cursor.execute(f"DELETE FROM {table} WHERE generation < %s", (generation,))
+            cursor.execute(
+                "INSERT INTO crawl_generation (generation, pending, started_at) VALUES (%s, %s, %s)",
+                (generation, partitions, time.time()),
+            )
+        self.run(operation)
+
+    def generation_status(self, generation):
+        """
+        Return the progress of a generation.
+
+        Returns:
+        - dict: pending and truncated partitions, published notices and finish time, or None if unknown.
+        """
+        def operation(cursor):
+            cursor.execute(
+                "SELECT pending, truncated, finished_at, "
+                "(SELECT count(*) FROM crawl_seen_notice WHERE generation = %s) "
+                "FROM crawl_generation WHERE generation = %s",
+                (generation, generation),
+            )
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            return {"pending": row[0], "truncated": row[1], "finished_at": row[2], "notices": row[3]}
+        return self.run(operation)
+
+    def is_done(self, generation, key):
+        """Return True if a partition of the generation has already been crawled, e.g. before a redelivery."""
+        def operation(cursor):
+            cursor.execute(
+                "SELECT 1 FROM crawl_partition_done WHERE generation = %s AND partition_key = %s", (generation, key)
+            )
+            return cursor.fetchone() is not None
+        return self.run(operation)
+
+    def finish_partition(self, generation, key, children, truncated):
+        """
+        Record a crawled partition: it is replaced by its children in the pending count.
+
+        Parameters:
+        - generation (int): The ID of the crawl.
+        - key (str): The key of the partition.
+        - children (int): The number of child partitions enqueued instead of crawling it.
+        - truncated (bool): Whether notices of the partition could not be reached.
+
+        Returns:
+        - tuple: (pending, truncated) partitions of the generation, or None if the partition was already done.
+        """
+        def operation(cursor):
+            cursor.execute(
+                "INSERT INTO crawl_partition_done (generation, partition_key) VALUES (%s, %s) "
+                "ON CONFLICT DO NOTHING",
+                (generation, key),
+            )
+            if not cursor.rowcount:
+                return None
+            cursor.execute(
+                "UPDATE crawl_generation SET pending = pending + %s - 1, truncated = truncated + %s, "
+                "finished_at = CASE WHEN pending + %s - 1 = 0 THEN %s END "
+                "WHERE generation = %s RETURNING pending, truncated",
+                (children, int(truncated), children, time.time(), generation),
+            )
+            return cursor.fetchone()
+        return self.run(operation)
+
+    def unseen(self, generation, entity_ids):
+        """Return the entity IDs that no worker has published yet in the generation."""
+        def operation(cursor):
+            cursor.execute(
+                "SELECT entity_id FROM crawl_seen_notice WHERE generation = %s AND entity_id = ANY(%s)",
+                (generation, list(entity_ids)),
+            )
+            return {row[0] for row in cursor.fetchall()}
+        seen = self.run(operation)
+        return [entity_id for entity_id in entity_ids if entity_id not in seen]
+
+    def mark_seen(self, generation, entity_ids):
+        """Record entity IDs as published in the generation."""
+        def operation(cursor):
+            cursor.execute(
+                "INSERT INTO crawl_seen_notice (generation, entity_id) SELECT %s, unnest(%s) ON CONFLICT DO NOTHING",
+                (generation, list(entity_ids)),
+            )
+        if entity_ids:
+            self.run(operation)
+
+    def take_tokens(self, count, requests_per_hour):
+        """
+        Spend count requests from the global token bucket if it holds enough of them.
+
+        The bucket is refilled with the clock of the database, so the workers do not depend on their own clocks.
+
+        Returns:
+        - float: 0 if the requests were granted, else the time (in seconds) to wait before asking again.
+        """
+        refill_per_second = requests_per_hour / 3600
+        capacity = refill_per_second * 60  # At most a minute of budget can be saved up
+
+        def operation(cursor):
+            cursor.execute(
+                "INSERT INTO crawl_rate_limit (name, tokens, updated_at) "
+                "VALUES (%s, 0, extract(epoch from clock_timestamp())) ON CONFLICT DO NOTHING",
+                (RATE_LIMIT_NAME,),
+            )
+            cursor.execute(
+                "SELECT tokens, extract(epoch from clock_timestamp()) - updated_at FROM crawl_rate_limit "
+                "WHERE name = %s FOR UPDATE",
+                (RATE_LIMIT_NAME,),
+            )
+            tokens, elapsed = cursor.fetchone()
+            tokens = min(tokens + max(elapsed, 0) * refill_per_second, capacity)
+            wait = 0.0
+            if tokens >= count or tokens >= capacity:
+                tokens -= count
+            else:
+                wait = (min(count, capacity) - tokens) / refill_per_second
+            cursor.execute(
+                "UPDATE crawl_rate_limit SET tokens = %s, updated_at = updated_at + %s WHERE name = %s",
+                (tokens, elapsed, RATE_LIMIT_NAME),
+            )
+            return wait
+        return self.run(operation)
+
+
+def open_work_queue(hostname, port, queue_name, connect_timeout=300):
+    """
+    Connect to RabbitMQ and declare the durable work queue of the partitions.
+
+    Returns:
+    - tuple: (connection, channel).
+    """
+    opened = {}
+
+    def open_connection():
+        # A partition can take longer than a heartbeat while the worker waits for the global budget, and the
+        # blocking connection does not send heartbeats meanwhile
+        opened["connection"] = pika.BlockingConnection(
+            pika.ConnectionParameters(host=hostname, port=port, heartbeat=0)
+        )
+        opened["channel"] = opened["connection"].channel()
+        opened["channel"].queue_declare(queue=queue_name, durable=True)
+        return True
+
+    if not wait_for(open_connection, "RabbitMQ", timeout=connect_timeout):
+        raise RuntimeError("RabbitMQ is not reachable.")
+    return opened["connection"], opened["channel"]
+
+
+def publish_partition(channel, queue_name, generation, params):
+    """Enqueue a partition of a generation, persisted by RabbitMQ."""
+    channel.basic_publish(
+        exchange="",
+        routing_key=queue_name,
+        body=json.dumps({"generation": generation, "params": params}),
+        properties=pika.BasicProperties(delivery_mode=2, content_type="application/json"),
+    )
+
+
+class CrawlCoordinator:
+    def __init__(self, state, hostname, port, queue_name=CRAWL_PARTITION_QUEUE):
+        """
+        Constructor for the CrawlCoordinator class.
+
+        Parameters:
+        - state (SharedCrawlState): The state shared with the workers.
+        - hostname (str): The hostname or IP address of the RabbitMQ server.
+        - port (int): The port number for the RabbitMQ server.
+        - queue_name (str): The work queue of the partitions.
+        """
+        self.state = state
+        self.hostname = hostname
+        self.port = port
+        self.queue_name = queue_name
+
+    def start(self):
+        """
+        Start a generation by enqueuing the age intervals.
+
+        Returns:
+        - int: The ID of the generation.
+        """
+        generation = int(time.time())
+        # Registered before the partitions are enqueued, so no worker finishes one of an unknown generation
+        self.state.start_generation(generation, len(AGE_INTERVALS))
+        connection, channel = open_work_queue(self.hostname, self.port, self.queue_name)
+        try:
+            for age_min, age_max in AGE_INTERVALS:
+                publish_partition(channel, self.queue_name, generation, {"ageMin": age_min, "ageMax": age_max})
+        finally:
+            connection.close()
+        print("Generation started:", generation, "partitions", len(AGE_INTERVALS))
+        return generation
+
+    def run(self, poll_interval=30):
+        """
+        Start a generation and report its progress until the workers have crawled every partition.
+
+        Parameters:
+        - poll_interval (float): The time (in seconds) between two progress reports.
+        """
+        start_time = time.time()
+        generation = self.start()
+        while True:
+            time.sleep(poll_interval)
+            status = self.state.generation_status(generation)
+            print("Generation", generation, status)
+            if status and status["pending"] <= 0:
+                break
+        print(f"Generation {generation} crawled in {(time.time() - start_time) / 60:.2f} minutes")
+
+
+class CrawlWorker:
+    def __init__(self, extractor, state, hostname, port, queue_name=CRAWL_PARTITION_QUEUE, requests_per_hour=3600):
+        """
+        Constructor for the CrawlWorker class.
+
+        Parameters:
+        - extractor (InterpolDataExtractor): The crawler used to fetch the listing and publish the notices.
+        - state (SharedCrawlState): The state shared with the coordinator and the other workers.
+        - hostname (str): The hostname or IP address of the RabbitMQ server.
+        - port (int): The port number for the RabbitMQ server.
+        - queue_name (str): The work queue of the partitions.
+        - requests_per_hour (float): The budget of requests sent to the Interpol API by all the workers together.
+        """
+        self.extractor = extractor
+        self.state = state
+        self.hostname = hostname
+        self.port = port
+        self.queue_name = queue_name
+        self.requests_per_hour = requests_per_hour
+        self.nationalities = []
+        self.tokens_lock = threading.Lock()  # The shared state connection is not used by two threads at a time
+        self.failure_backoff = Backoff(initial_delay=1.0, max_delay=60.0)  # While the shared state is unreachable
+        # Every request of the crawler, retries and image lookups included, is taken from the global budget
+        extractor.request_budget = self.take_tokens
+
+    def take_tokens(self, count):
+        """Wait until the global budget allows count more requests, then spend them."""
+        while count > 0:
+            with self.tokens_lock:
+                wait = self.state.take_tokens(count, self.requests_per_hour)
+            if not wait:
+                return
+            GLOBAL_BUDGET_WAIT_SECONDS.inc(wait)
+            time.sleep(wait)
+
+    def publish_notices(self, generation, notices):
+        """Publish the notices that no worker has published yet in the generation."""
+        unseen = set(self.state.unseen(generation, [notice.get("entity_id") for notice in notices]))
+        new_notices = [notice for notice in notices if notice.get("entity_id") in unseen]
+        self.extractor.clean_and_publish_data(new_notices)
+        # Marked once published: a worker dying in between leaves them to the redelivered partition
+        self.state.mark_seen(generation, [notice["entity_id"] for notice in new_notices])
+
+    def crawl(self, generation, params):
+        """
+        Crawl the pages of a partition, or split it if it exceeds the 160-result cap.
+
+        The pages go through InterpolDataExtractor.crawl_partition: a failed page is parked in the retry queue of the
+        extractor, and retried before the partition is acknowledged. The notices whose image lookup failed are
+        published without it instead, their lookups go on in the background.
+
+        Returns:
+        - tuple: (child partitions to enqueue, True if notices of the partition could not be reached).
+        """
+        values = partition_values(params)
+        more_than_160 = []
+        dead_listings_before = self.extractor.retry_queue.dead_letter_count("listing")
+        self.extractor.crawl_partition(
+            self.extractor.api_url + "?", "distributed", more_than_160, values,
+            publish=lambda notices: self.publish_notices(generation, notices),
+        )
+        self.extractor.retry_queue.process(wait=True, kinds=("listing",))
+        self.extractor.retry_queue.release("image")
+        self.extractor.partition_totals.pop(values, None)
+
+        truncated = self.extractor.retry_queue.dead_letter_count("listing") > dead_listings_before
+        if more_than_160:
+            children = child_partitions(params, self.nationalities)
+            if children:
+                return children, truncated
+            truncated = True
+        return [], truncated
+
+    def process(self, channel, method, properties, body):
+        """
+        Crawl a partition pulled from the work queue, and acknowledge it once its outcome is recorded.
+
+        A partition whose crawl fails (an invalid message, an error of the shared state or of the crawler) is
+        recorded as truncated and acknowledged, so it is not redelivered to every worker in turn and its generation
+        still finishes, without a sweep. Only a lost connection to RabbitMQ leaves the partition unacknowledged.
+        """
+        generation, key, enqueued = None, None, 0
+        try:
+            message = json.loads(body)
+            generation, params = message["generation"], message["params"]
+            key = partition_key(params)
+            if self.state.is_done(generation, key):
+                DISTRIBUTED_PARTITIONS.labels("duplicate").inc()
+                channel.basic_ack(delivery_tag=method.delivery_tag)
+                return
+
+            if generation != self.extractor.generation:
+                # The published entity IDs of the previous generation must be published again in this one
+                self.extractor.generation = generation
+                self.extractor.cleaned_data = set()
+            self.extractor.phase = "distributed"
+
+            children, truncated = self.crawl(generation, params)
+            for child in children:
+                publish_partition(channel, self.queue_name, generation, child)
+                enqueued += 1
+            outcome = "split" if children else "truncated" if truncated else "crawled"
+            DISTRIBUTED_PARTITIONS.labels(outcome).inc()
+            print("Partition", outcome + ":", key, "children", len(children))
+            self.record_progress(generation, self.state.finish_partition(generation, key, len(children), truncated))
+        except pika.exceptions.AMQPError:
+            raise
+        except Exception as e:
+            DISTRIBUTED_PARTITIONS.labels("failed").inc()
+            print("Error crawling partition", key or body, ":", e)
+            if not self.give_up_partition(generation, key, enqueued):
+                # The shared state is unreachable: hand the partition back once it may be reachable again
+                self.failure_backoff.sleep()
+                channel.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
+                return
+        self.failure_backoff.reset()
+        channel.basic_ack(delivery_tag=method.delivery_tag)
+
+    def record_progress(self, generation, progress):
+        """Publish the end-of-crawl marker if the partition just recorded was the last one of its generation."""
+        if progress is None:
+            return
+        pending, truncated_partitions = progress
+        # Only a crawl that reached every notice lets Container B sweep the ones it did not see
+        if pending == 0 and not truncated_partitions:
+            status = self.state.generation_status(generation)
+            self.extractor.publish_generation_complete(status["notices"])
+        elif pending == 0:
+            print("Generation crawled with", truncated_partitions, "truncated partitions:", generation)
+
+    def give_up_partition(self, generation, key, enqueued):
+        """
+        Record a partition whose crawl failed as truncated.
+
+        Parameters:
+        - generation (int): The ID of the crawl, None if the message could not be read.
+        - key (str): The key of the partition, None if the message could not be read.
+        - enqueued (int): The number of child partitions already enqueued.
+
+        Returns:
+        - bool: False if the partition could not be recorded and should be crawled again later.
+        """
+        if generation is None or key is None:
+            print("Invalid partition message dropped")
+            return True
+        try:
+            self.record_progress(generation, self.state.finish_partition(generation, key, enqueued, True))
+            return True
+        except Exception as e:
+            print("Error recording the failed partition", key, ":", e)
+            return False
+
+    def run(self):
+        """Pull and crawl partitions forever, reconnecting to RabbitMQ if the connection is lost."""
+        self.nationalities = InterpolCountriesExtractor(
+            self.extractor.countries_url, self.extractor.country_catalog_path
+        ).get_extracted_nationalities()
+        self.extractor.phase = "waiting"
+
+        reconnect_backoff = Backoff(initial_delay=0.5, max_delay=30.0)
+        while True:
+            try:
+                connection, channel = open_work_queue(self.hostname, self.port, self.queue_name)
+                # One partition at a time, the others stay available to the other workers
+                channel.basic_qos(prefetch_count=1)
+                channel.basic_consume(queue=self.queue_name, on_message_callback=self.process)
+                print("Waiting for partitions on", self.queue_name)
+                reconnect_backoff.reset()
+                channel.start_consuming()
+            except (pika.exceptions.AMQPError, RuntimeError) as e:
+                delay = reconnect_backoff.next_delay()
+                print(f"Error consuming partitions: {e}. Reconnecting in {delay:.1f} seconds...")
+                time.sleep(delay)
@@ -1,40 +1,82 @@
 """
 ExtractCountries.py
 
-This script extracts the list of nationalities from the Interpol website.
+This script extracts the list of nationalities from the Interpol website and keeps it in the country catalog shared
+with Container B (shared/countries.json), so both containers use the same list. The catalog is generated at
+runtime and not versioned; until it exists, Container B reads its countries.txt.
 
 Dependencies:
 - requests: Python library for making HTTP requests
-- BeautifulSoup: Python library for web scraping and HTML parsing
+- re, html: Python modules for parsing the nationality select of the page
 
-The main function 'extract' sends a GET request to the Interpol website and parses the HTML 
-content using BeautifulSoup. It finds the select element with the name "nationality" and extracts 
-the values (nationalities) from the option elements. The extracted nationalities are returned as a list.
+The main function 'get_extracted_nationalities' returns the country codes from the catalog while it is fresher than
+its TTL. Once it expires, the page is requested again with the validators (ETag / Last-Modified) of the catalog: a
+304 response only renews the catalog, a 200 response is parsed by a targeted parser that reads the option elements
+of the select with the name "nationality" instead of parsing the whole page. If the website cannot be reached, the
+stale catalog is used.
 
 @Author: Nisanur Genc
 """
+import html
+import json
+import os
+import re
+import time
 import requests
-from bs4 import BeautifulSoup
+
+COUNTRY_CATALOG_PATH = os.environ.get(
+    "COUNTRY_CATALOG_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "shared", "countries.json"),
+)
+COUNTRY_CATALOG_TTL = 7 * 24 * 3600  # Seconds; the list of countries rarely changes
+
+SELECT_PATTERN = re.compile(r'<select[^>]*\bname="nationality"[^>]*>(.*?)</select>', re.IGNORECASE | re.DOTALL)
+OPTION_PATTERN = re.compile(r'<option[^>]*\bvalue="([^"]*)"[^>]*>(.*?)</option>', re.IGNORECASE | re.DOTALL)
+
 
 class InterpolCountriesExtractor:
     """
     A class for extracting nationalities from the Interpol website.
 
     This class provides methods to fetch the Interpol website's HTML content,
-    extract nationalities from the HTML, and test the extraction process.
+    extract nationalities from the HTML, cache them in the country catalog and test the extraction process.
 
     Attributes:
     - url (str): The URL of the Interpol website for Red Notices.
+    - catalog_path (str): The path of the country catalog.
+    - ttl (float): The time (in seconds) after which the catalog is refreshed.
     """
 
-    def __init__(self, url):
+    def __init__(self, url, catalog_path=COUNTRY_CATALOG_PATH, ttl=COUNTRY_CATALOG_TTL):
         """
         Initialize the InterpolCountriesExtractor object.
 
         Parameters:
         - url (str): The URL of the Interpol website for Red Notices.
+        - catalog_path (str): The path of the country catalog.
+        - ttl (float): The time (in seconds) after which the catalog is refreshed.
         """
         self.url = url
+        self.catalog_path = catalog_path
+        self.ttl = ttl
+
+    def extract_countries(self, html_content):
+        """
+        Extract the countries from the HTML content of the Interpol website.
+
+        Parameters:
+        - html_content (str): The HTML content of the Interpol website.
+
+        Returns:
+        - dict: The country names by country code, in the order of the page.
+        """
+        countries = {}
+        for select_content in SELECT_PATTERN.findall(html_content or ""):
+            for code, label in OPTION_PATTERN.findall(select_content):
+                code = html.unescape(code).strip()
+                if code:
+                    countries[code] = html.unescape(re.sub(r"<[^>]+>", "", label)).strip()
+        return countries
 
     def extract_nationalities(self, html_content):
         """
@@ -46,48 +88,106 @@ class InterpolCountriesExtractor:
         Returns:
         - list: A list of nationalities extracted from the HTML.
         """
-        nationality_list = []
+        return list(self.extract_countries(html_content))
 
-        try:
-            # Parse the HTML content using BeautifulSoup
-            content = BeautifulSoup(html_content, "html.parser")
-            select_elements = content.find_all("select", {"name": "nationality"})
-            for select_element in select_elements:
-                options = select_element.find_all("option")
-                for opt in options:
-                    if opt.has_attr('value'):
-                        nationality_list.append(opt['value'])
-        except (AttributeError, TypeError) as e:
-            print("Error while parsing the HTML content:", e)
+    def load_catalog(self):
+        """
+        Load the country catalog.
 
-        return nationality_list
+        Returns:
+        - dict: The catalog, or None if it does not exist or cannot be read.
+        """
+        try:
+            with open(self.catalog_path, encoding="utf-8") as catalog_file:
+                catalog = json.load(catalog_file)
+            return catalog if catalog.get("countries") else None
+        except (OSError, ValueError, AttributeError) as e:
+            print("Country catalog not available:", e)
+            return None
+
+    def save_catalog(self, catalog):
+        """
+        Write the country catalog atomically, so Container B never reads a partial file.
 
-    def get_extracted_nationalities(self):
+        Parameters:
+        - catalog (dict): The catalog.
+        """
+        try:
+            os.makedirs(os.path.dirname(self.catalog_path) or ".", exist_ok=True)
+            temporary_path = self.catalog_path + ".tmp"
+            with open(temporary_path, "w", encoding="utf-8") as catalog_file:
+                json.dump(catalog, catalog_file, ensure_ascii=False, indent=1)
+            os.replace(temporary_path, self.catalog_path)
+        except OSError as e:
+            print("Error writing the country catalog:", e)
+
+    def refresh_catalog(self, catalog):
         """
-        Fetch and extract nationalities from the Interpol website.
+        Fetch the Interpol website with a conditional GET and update the country catalog.
+
+        Parameters:
+        - catalog (dict): The current catalog, whose validators are sent, or None.
 
         Returns:
-        - list: A list of nationalities extracted from the website.
+        - dict: The refreshed catalog, the current one if the request fails.
         """
-        # Send a GET request to the Interpol website and fetch the HTML content
-        response = requests.get(self.url)
-        if response.status_code == 200:
-            html_content = response.text
-            nationalities = self.extract_nationalities(html_content)
-            return nationalities
+        headers = {}
+        if catalog and catalog.get("etag"):
+            headers["If-None-Match"] = catalog["etag"]
+        if catalog and catalog.get("last_modified"):
+            headers["If-Modified-Since"] = catalog["last_modified"]
+
+        try:
+            response = requests.get(self.url, headers=headers, timeout=30)
+        except requests.exceptions.RequestException as e:
+            print("Failed to fetch the Interpol website:", e)
+            return catalog
+
+        if response.status_code == 304 and catalog:
+            catalog["fetched_at"] = time.time()
+        elif response.status_code == 200:
+            countries = self.extract_countries(response.text)
+            if not countries:
+                print("No nationality found on the Interpol website, keeping the country catalog.")
+                return catalog
+            catalog = {
+                "source": self.url,
+                "fetched_at": time.time(),
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "countries": countries,
+            }
         else:
             print("Failed to fetch the Interpol website. Status code:", response.status_code)
-            return []
+            return catalog
+
+        self.save_catalog(catalog)
+        return catalog
+
+    def get_extracted_nationalities(self, force_refresh=False):
+        """
+        Return the nationalities of the country catalog, refreshed from the Interpol website if it has expired.
+
+        Parameters:
+        - force_refresh (bool): Refresh the catalog even if it has not expired.
+
+        Returns:
+        - list: A list of nationalities extracted from the website.
+        """
+        catalog = self.load_catalog()
+        if force_refresh or catalog is None or time.time() - catalog.get("fetched_at", 0) >= self.ttl:
+            catalog = self.refresh_catalog(catalog)
+        return list(catalog["countries"]) if catalog else []
 
     def test_extraction(self):
         """
         Test the extraction of nationalities from the Interpol website.
         """
-        nationalities = self.get_extracted_nationalities()
+        nationalities = self.get_extracted_nationalities(force_refresh=True)
         print("Extracted Nationalities:", nationalities)
 
 if __name__ == "__main__":
     # Create an instance of InterpolCountriesExtractor with the Interpol website URL
     interpol_countries_extractor = InterpolCountriesExtractor("https://www.interpol.int/How-we-work/Notices/View-Red-Notices")
-    # Test the extraction of nationalities
+    # Refresh the country catalog and test the extraction of nationalities
     interpol_countries_extractor.test_extraction()
@@ -0,0 +1,87 @@
+"""
+HealthServer.py
+
+This script defines the HealthServer class, a minimal HTTP server running in a background thread of Container A.
+It exposes the health signal of the crawler so that Docker (or an operator) can tell whether it is working.
+
+Endpoints:
+- /healthz: 200 if the crawler reports itself healthy (e.g. connected to RabbitMQ), 503 otherwise, with a JSON status.
+
+Dependencies:
+- http.server: Python module providing the HTTP server
+- threading: Python module for running the server next to the crawler
+
+@Author: Nisanur Genc
+
+"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class HealthServer:
+    def __init__(self, port, status_provider, host="0.0.0.0"):
+        """
+        Constructor for the HealthServer class.
+
+        Parameters:
+        - port (int): The port to listen on.
+        - status_provider (callable): Returns a (healthy, status) tuple, where status is a JSON-serializable dict.
+        - host (str): The interface to listen on.
+        """
+        self.routes = {"/healthz": self.health_response}
+        self.status_provider = status_provider
+        self.server = ThreadingHTTPServer((host, port), self.make_handler())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, name="health-server", daemon=True)
+
+    def start(self):
+        """Start serving in the background thread."""
+        self.thread.start()
+        print(f"Health server listening on port {self.server.server_address[1]}")
+
+    def stop(self):
+        """Stop the server."""
+        self.server.shutdown()
+        self.server.server_close()
+
+    def add_route(self, path, handler):
+        """
+        Register an additional endpoint.
+
+        Parameters:
+        - path (str): The URL path of the endpoint.
+        - handler (callable): Returns a (status code, content type, body bytes) tuple.
+        """
+        self.routes[path] = handler
+
+    def health_response(self):
+        """Build the /healthz response from the status provider."""
+        healthy, status = self.status_provider()
+        body = json.dumps(dict(status, healthy=healthy)).encode()
+        return (200 if healthy else 503), "application/json", body
+
+    def make_handler(self):
+        """Create the request handler class bound to this server's routes."""
+        routes = self.routes
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                route = routes.get(self.path.split("?", 1)[0])
+                if route is None:
+                    self.send_error(404)
+                    return
+
+                status_code, content_type, body = route()
+                self.send_response(status_code)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # Probes hit the server every few seconds, keep them out of the crawler output
+                pass
+
+        return Handler
@@ -5,26 +5,154 @@ This script contains the InterpolDataExtractor class, which is responsible for e
 cleaning it, and publishing the cleaned data to a RabbitMQ queue.
 
 Dependencies:
-- ExtractCountries: Custom module for extracting nationalities from the Interpol website
+- ExtractCountries: Custom module for extracting nationalities from the Interpol website (cached in the country catalog)
 - RabbitMQConnection: Custom module for establishing a connection to RabbitMQ
+- ResponseCache: Custom module caching the listing pages on disk (optional)
+- RetryQueue: Custom module parking the failed requests until they are retried
+- HealthServer: Custom module exposing the health signal of the crawler over HTTP
+- Metrics: Custom module defining the Prometheus metrics of the crawler
 - string: Python module for working with string constants
 - time: Python module for adding delays between requests
 - requests: Python library for making HTTP requests
 - json: Python module for working with JSON data
+- uuid: Python module for generating the trace IDs of the published notices
+- concurrent.futures: Python module for requesting the pages of a partition concurrently
+- os: Python module for reading the Interpol URLs from the environment
 
 @Author: Nisanur Genc
 
 """
 
-from ExtractCountries import InterpolCountriesExtractor
+from ExtractCountries import COUNTRY_CATALOG_PATH, InterpolCountriesExtractor
 from RabbitMQConnection import RabbitMQConnection
+from ResponseCache import ResponseCache
+from RetryQueue import RetryQueue
+from HealthServer import HealthServer
+from Metrics import (API_REQUESTS, API_RETRIES, NOTICES_PUBLISHED, PARTITIONS_DONE, PARTITIONS_PENDING,
+                     PARTITION_FETCHES, RATE_LIMIT_WAIT_SECONDS, RATE_LIMIT_WAITS, RESPONSE_CACHE_LOOKUPS,
+                     metrics_response)
+import math
 import string
 import time
 import requests
 import json
+import uuid
+import os
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+# The Interpol endpoints, overridable to crawl a local mock of the API (see MockInterpolAPI.py)
+INTERPOL_API_URL = os.environ.get("INTERPOL_API_URL", "https://ws-public.interpol.int/notices/v1/red")
+INTERPOL_COUNTRIES_URL = os.environ.get("INTERPOL_COUNTRIES_URL", "https://www.interpol.int/How-we-work/Notices/View-Red-Notices")
+
+# The age intervals of the first extraction tier
+AGE_INTERVALS = [
+    (18, 24),
+    (25, 25),
+    (26, 26),
+    (27, 27),
+    (28, 28),
+    (29, 29),
+    (30, 30),
+    (31, 31),
+    (32, 32),
+    (33, 33),
+    (34, 34),
+    (35, 35),
+    (36, 36),
+    (37, 37),
+    (38, 38),
+    (39, 39),
+    (40, 40),
+    (41, 41),
+    (42, 42),
+    (43, 43),
+    (44, 44),
+    (45, 45),
+    (46, 46),
+    (47, 47),
+    (48, 48),
+    (49, 49),
+    (50, 50),
+    (51, 51),
+    (52, 52),
+    (53, 53),
+    (54, 54),
+    (55, 55),
+    (56, 56),
+    (57, 57),
+    (58, 58),
+    (59, 59),
+    (60, 60),
+    (61, 61),
+    (62, 62),
+    (63, 63),
+    (64, 64),
+    (65, 65),
+    (66, 66),
+    (67, 67),
+    (68, 68),
+    (69, 69),
+    (70, 75),
+    (76, 80),
+    (81, 85),
+    (86, 89),
+    (90, 120)
+]
+GENDERS = ["U", "F", "M"]
+
+# The filters of a partition, in the order of the values of its tuple, e.g. (ageMin, ageMax, sexId)
+PARTITION_PARAMETERS = ["ageMin", "ageMax", "sexId", "arrestWarrantCountryId", "nationality", "forename", "name"]
+MAX_REACHABLE_RESULTS = 160  # The API does not page past the first 160 results of a query
+RESULTS_PER_PAGE = int(os.environ.get("CRAWL_RESULTS_PER_PAGE", 160))  # The largest page size of the API
+# Concurrent page requests of a partition. At the default page size a reachable partition is a single page, so the
+# pages are only fetched concurrently when CRAWL_RESULTS_PER_PAGE is set below 160.
+PAGE_FETCH_WORKERS = int(os.environ.get("CRAWL_PAGE_FETCH_WORKERS", 4))
+# Partitions expected to hold more than this are probed with a count-only request before their notices are
+# downloaded; below it, a probe would mostly be an extra request
+PROBE_EXPECTED_TOTAL = 2 * MAX_REACHABLE_RESULTS
+
+# Times a request waits for an exhausted rate limit before it is given up
+RATE_LIMIT_MAX_WAITS = 15
 
 class ExtractImages:
-    def fetch_image_url(self, image_data, entity_id, max_retries=9, retry_delay=200):
+    def __init__(self, response_cache=None, request_budget=None):
+        """
+        Constructor for the ExtractImages class.
+
+        Args:
+            response_cache (ResponseCache, optional): The on-disk cache of the image lookups. Default is no cache.
+            request_budget (callable, optional): Called with the number of requests about to be sent, and waits
+                until they fit in the budget of the crawler. Default is no budget.
+        """
+        self.response_cache = response_cache
+        self.request_budget = request_budget
+
+    @staticmethod
+    def image_url_from_json(image_json):
+        """
+        Read the URL of the first image of an image lookup response.
+
+        Args:
+            image_json (dict): The JSON response of the images endpoint.
+
+        Returns:
+            str: The URL of the first image, otherwise "No Image Available".
+        """
+        # Check if the '_embedded' key is present in the image JSON
+        if '_embedded' in image_json and 'images' in image_json['_embedded']:
+            images = image_json['_embedded']['images']
+            if images:
+                first_image = images[0]  # Take the first image from the list
+                if '_links' in first_image and 'self' in first_image['_links']:
+                    image_url = first_image['_links']['self']['href']
+                    print("image_url: ", image_url)
+                    return image_url
+
+        print("Error: Image data is missing or in an unexpected format.")
+        return "No Image Available"
+
+    def fetch_image_url(self, image_data, entity_id, max_retries=9, retry_delay=200, defer=False):
         """
         Fetches the URL of the image from the given image_data.
 
@@ -33,54 +161,65 @@ class ExtractImages:
             entity_id (str): The ID of the entity associated with the image.
             max_retries (int, optional): Maximum number of retries in case of a failure. Default is 9.
             retry_delay (int, optional): Delay (in milliseconds) between retries. Default is 200ms.
+            defer (bool, optional): Return None instead of "No Image Available" when the lookup failed for a reason
+                that may go away (403, 429, connection error), so the caller can retry it later. Default is False.
 
         Returns:
-            str: The URL of the image if successfully fetched, otherwise "No Image Available".
+            str: The URL of the image if successfully fetched, otherwise "No Image Available" (or None, see defer).
         """
+        cache = self.response_cache
+        if cache is not None and isinstance(image_data, dict) and image_data.get('href'):
+            cached = cache.get(image_data['href'])
+            if cached is not None and (cache.offline or cache.is_fresh(cached)):
+                RESPONSE_CACHE_LOOKUPS.labels("hit").inc()
+                return self.image_url_from_json(json.loads(cached["body"]))
+            if cache.offline:
+                RESPONSE_CACHE_LOOKUPS.labels("miss").inc()
+                return "No Image Available"
+
         retries = 0
 
         while retries < max_retries:
             try:
+                if self.request_budget is not None:
+                    self.request_budget(1)
                 response = requests.get(image_data['href'])
+                API_REQUESTS.labels("images", response.status_code).inc()
                 if response.status_code == 200:
                     image_json = response.json()
-
-                    # Check if the '_embedded' key is present in the image JSON
-                    if '_embedded' in image_json and 'images' in image_json['_embedded']:
-                        images = image_json['_embedded']['images']
-                        if images:
-                            first_image = images[0]  # Take the first image from the list
-                            if '_links' in first_image and 'self' in first_image['_links']:
-                                image_url = first_image['_links']['self']['href']
-                                print("image_url: ", image_url)
-                                return image_url
-
-                    print("Error: Image data is missing or in an unexpected format.")
-                    return "No Image Available"
-                elif response.status_code == 403:
+                    if cache is not None:
+                        RESPONSE_CACHE_LOOKUPS.labels("miss").inc()
+                        cache.put(image_data['href'], response.text, response.headers)
+                    return self.image_url_from_json(image_json)
+                elif response.status_code in (403, 429):
                     # Retry after a delay
                     retries += 1
-                    print(f"Received Forbidden (403) status code. Retrying ({retries}/{max_retries})...")
-                    time.sleep(retry_delay)
+                    API_RETRIES.labels("images").inc()
+                    print(f"Received status code {response.status_code}. Retrying ({retries}/{max_retries})...")
+                    if retries < max_retries:
+                        time.sleep(retry_delay / 1000)
                 else:
                     # Other non-200 status codes are considered as errors
                     print(f"Error: Unexpected status code - {response.status_code}")
                     return "No Image Available"
 
             except requests.exceptions.RequestException as e:
+                API_REQUESTS.labels("images", "error").inc()
                 print(f"Error requesting image URL: {str(e)}")
-                return "No Image Available"
+                return None if defer else "No Image Available"
             except json.JSONDecodeError as e:
                 print(f"Error while parsing JSON response for image: {str(e)}")
                 return "No Image Available"
 
         print(f"Max retries reached. Unable to fetch image URL.")
-        return "No Image Available"
+        return None if defer else "No Image Available"
     
 
 
 class InterpolDataExtractor:
-    def __init__(self, hostname, port, queue_name):
+    def __init__(self, hostname, port, queue_name, api_url=INTERPOL_API_URL, countries_url=INTERPOL_COUNTRIES_URL,
+                 publisher=None, request_delay=1, retry_delay=120, country_catalog_path=COUNTRY_CATALOG_PATH,
+                 response_cache=None, retry_queue=None, page_workers=PAGE_FETCH_WORKERS):
         """
         Constructor for the InterpolDataExtractor class.
 
@@ -88,20 +227,80 @@ class InterpolDataExtractor:
             hostname (str): The hostname or IP address of the RabbitMQ server.
             port (int): The port number for the RabbitMQ server (default is usually 5672).
             queue_name (str): The name of the queue to which data will be published.
+            api_url (str, optional): The URL of the red notices listing endpoint.
+            countries_url (str, optional): The URL of the page listing the nationalities.
+            publisher (object, optional): Used instead of a RabbitMQConnection when given, e.g. by the benchmark.
+                It must provide publish_data(data, headers) and is_connected().
+            request_delay (float, optional): Delay (in seconds) between two listing requests. Default is 1 second.
+            retry_delay (float, optional): Delay (in seconds) before retrying a failed listing request. Default is 120 seconds.
+            country_catalog_path (str, optional): The path of the country catalog shared with Container B.
+            response_cache (ResponseCache, optional): The on-disk cache of the listing pages and image lookups.
+                Default is no cache.
+            retry_queue (RetryQueue, optional): Where the failed listing pages and image lookups are parked instead
+                of being retried in-line. Default is a RetryQueue whose first retry comes after retry_delay.
+            page_workers (int, optional): The number of pages of a partition requested concurrently. Default is 4.
         """
         self.total_cleaned_data = 0
         self.cleaned_data = set()  # Using a set to store unique entity_ids
-        self.rabbitmq_publisher = RabbitMQConnection(hostname, port, queue_name)
+        self.phase = "starting"  # The extraction step in progress, reported by the health signal
+        self.last_progress = time.time()
+        self.api_url = api_url
+        self.countries_url = countries_url
+        self.request_delay = request_delay
+        self.retry_delay = retry_delay
+        self.country_catalog_path = country_catalog_path
+        self.response_cache = response_cache
+        self.retry_queue = retry_queue if retry_queue is not None else RetryQueue(base_delay=retry_delay)
+        self.page_workers = page_workers
+        self.partition_totals = {}  # Partition -> total, to decide which child partitions are probed first
+        self.generation = None  # ID of the full crawl in progress, stamped on the published notices
+        # Called with the number of requests about to be sent to the API, e.g. the token bucket of the recrawl
+        # scheduler or of the distributed workers, so retries and image lookups are budgeted like listing pages
+        self.request_budget = None
+        self.rabbitmq_publisher = publisher or RabbitMQConnection(hostname, port, queue_name)
+
+    def health_status(self):
+        """
+        Report the health of the crawler for the health server.
+
+        Returns:
+            tuple: (healthy, status) where healthy is True while RabbitMQ is connected.
+        """
+        healthy = self.rabbitmq_publisher.is_connected()
+        return healthy, {
+            "broker_connected": healthy,
+            "phase": self.phase,
+            "published": self.total_cleaned_data,
+            "seconds_since_progress": round(time.time() - self.last_progress, 1),
+            "deferred": len(self.retry_queue),
+            "dead_letters": self.retry_queue.dead_letter_count(),
+        }
+
+    @staticmethod
+    def partition_done(tier):
+        """
+        Record a crawled partition in the crawl progress metrics.
+
+        Parameters:
+            tier (str): The extraction tier of the partition, e.g. "age" or "gender".
+        """
+        PARTITIONS_PENDING.labels(tier).dec()
+        PARTITIONS_DONE.labels(tier).inc()
 
     def clean_and_publish_data(self, notices):
         """
         Clean the data for each notice and publish it to RabbitMQ.
 
+        Every message carries the trace context of its batch as AMQP headers: a trace ID and the time the listing
+        response was handed over for cleaning (fetched_at). RabbitMQConnection adds the publish time, and
+        Container B the consume and commit times. During a full crawl, the generation of the crawl is sent too.
+
         Parameters:
             notices (list): A list of Interpol notices obtained from the API response.
         """
+        trace_headers = self.trace_headers()
         clean_data = []
-        image_extractor = ExtractImages()  # Create an instance of the ExtractImages class
+        image_extractor = ExtractImages(self.response_cache, self.request_budget)  # Create an instance of the ExtractImages class
 
         for notice in notices:
             entity_id = notice.get("entity_id")
@@ -115,8 +314,8 @@ class InterpolDataExtractor:
                 image_data = notice.get("_links", {}).get("images", {}) or "Unknown"
 
                 print("image_data: ", image_data)
-                # Fetch the image URL using the ExtractImages class
-                image_url = image_extractor.fetch_image_url(image_data, entity_id)
+                # Fetch the image URL using the ExtractImages class, a failed lookup is retried later
+                image_url = image_extractor.fetch_image_url(image_data, entity_id, max_retries=1, defer=True)
 
                 clean_item = {
                     "name": name,
@@ -127,50 +326,354 @@ class InterpolDataExtractor:
                     "image": image_url,  # Use the fetched image URL here
                 }
 
-                clean_data.append(clean_item)
                 self.cleaned_data.add(entity_id)  # Add the entity_id to the set
+                if image_url is None:
+                    # Published once its image lookup succeeds, the crawl goes on meanwhile
+                    self.defer_image(clean_item, image_data)
+                    continue
+                clean_data.append(clean_item)
+
+        self.publish_clean_data(clean_data, trace_headers)
 
+    def publish_clean_data(self, clean_data, trace_headers):
+        """
+        Publish cleaned notices to RabbitMQ.
+
+        Parameters:
+            clean_data (list): The cleaned notices.
+            trace_headers (dict): The trace context of the notices.
+        """
         self.total_cleaned_data += len(clean_data)
+        self.last_progress = time.time()
         print("counter:", self.total_cleaned_data)
-        self.cleaned_data.update(item["entity_id"] for item in clean_data)  # Update the set
 
         # Publish the cleaned data
         for data_item in clean_data:
-            self.rabbitmq_publisher.publish_data(data_item)
+            self.rabbitmq_publisher.publish_data(data_item, headers=trace_headers)
+        NOTICES_PUBLISHED.inc(len(clean_data))
+
+    def trace_headers(self):
+        """Return the trace context of a new batch of notices."""
+        headers = {"trace_id": uuid.uuid4().hex, "fetched_at": time.time()}
+        if self.generation is not None:
+            headers["generation"] = self.generation
+        return headers
+
+    def defer_image(self, clean_item, image_data):
+        """
+        Park a notice whose image lookup failed in the retry queue.
+
+        The notice is published when a retry of the lookup succeeds, or without its image once the lookup is
+        dead-lettered or released (see RetryQueue.release), so it is never left out of the crawl. A released notice
+        is published again if a later retry finds its image.
+
+        Parameters:
+            clean_item (dict): The cleaned notice, without its image.
+            image_data (dict): The images link of the notice.
+        """
+        def attempt():
+            image_url = ExtractImages(self.response_cache, self.request_budget).fetch_image_url(
+                image_data, clean_item["entity_id"], max_retries=1, defer=True
+            )
+            if image_url is None:
+                return False
+            self.publish_clean_data([dict(clean_item, image=image_url)], self.trace_headers())
+            return True
+
+        def give_up():
+            self.publish_clean_data([dict(clean_item, image="No Image Available")], self.trace_headers())
 
+        self.retry_queue.defer("image", image_data.get("href"), attempt, context={"entity_id": clean_item["entity_id"]},
+                               give_up=give_up)
 
     @staticmethod
-    def fetch_data_with_retry(url, max_retries=15, retry_delay=300):
+    def page_url(url, partition, page=1, results_per_page=RESULTS_PER_PAGE):
+        """
+        Build the URL of a listing page of a partition.
+
+        Parameters:
+            url (str): The base URL for the Interpol API, ending with "?".
+            partition (tuple): The partition, its values in the order of PARTITION_PARAMETERS.
+            page (int, optional): The page number. Default is 1.
+            results_per_page (int, optional): The page size. Default is RESULTS_PER_PAGE.
+
+        Returns:
+            str: The URL of the page.
+        """
+        params = dict(zip(PARTITION_PARAMETERS, partition), resultPerPage=results_per_page, page=page)
+        return url + urlencode(params)
+
+    def probe_total(self, url, partition, use_cache=True):
+        """
+        Request the number of notices of a partition, with a single-result page instead of the notices.
+
+        Parameters:
+            url (str): The base URL for the Interpol API.
+            partition (tuple): The partition, () for the whole listing.
+            use_cache (bool, optional): Use the response cache, if any. Default is True.
+
+        Returns:
+            int or None: The total of the partition, None if the request failed.
+        """
+        data = self.fetch_data_with_retry(self.page_url(url, partition, results_per_page=1), max_retries=1,
+                                          retry_delay=self.retry_delay, use_cache=use_cache)
+        PARTITION_FETCHES.labels("probe").inc()
+        if not data or "total" not in data:
+            return None
+        return data["total"]
+
+    def fetch_pages(self, urls, use_cache=True):
+        """
+        Fetch listing pages concurrently, with a single attempt each.
+
+        Only the requests run in the worker threads: the notices are published from the calling thread.
+
+        Parameters:
+            urls (list): The URLs of the pages.
+            use_cache (bool, optional): Use the response cache, if any. Default is True.
+
+        Returns:
+            list: The JSON response data of every page, in the order of urls, None for a failed page.
+        """
+        def fetch(url):
+            return self.fetch_data_with_retry(url, max_retries=1, retry_delay=self.retry_delay, use_cache=use_cache)
+
+        if len(urls) <= 1 or self.page_workers <= 1:
+            return [fetch(url) for url in urls]
+        with ThreadPoolExecutor(max_workers=min(self.page_workers, len(urls))) as pool:
+            return list(pool.map(fetch, urls))
+
+    def crawl_partition(self, url, tier, more_than_160, partition, probe=False, defer=True, publish=None,
+                        use_cache=True):
+        """
+        Crawl a partition of the listing, or record it in more_than_160 if it exceeds the 160-result cap.
+
+        The first page tells the total of the partition, and the other pages are then fetched concurrently. At the
+        default page size (160, the cap itself) there are no other pages; they only exist when CRAWL_RESULTS_PER_PAGE
+        is set below 160. With probe set, the total is requested first with a count-only page, so a
+        partition expected to exceed the cap does not download notices that its child partitions fetch again.
+        A failed first page parks the whole partition in the retry queue, a failed later page only that page.
+
+        This is the page loop of every crawl mode: the extraction tiers, the recrawl scheduler and the distributed
+        workers.
+
+        Parameters:
+            url (str): The base URL for the Interpol API.
+            tier (str): The extraction tier of the partition, e.g. "age" or "gender".
+            more_than_160 (list): The partitions of the tier with more than 160 entries.
+            partition (tuple): The partition, its values in the order of PARTITION_PARAMETERS.
+            probe (bool, optional): Request the total before any notice; the pages of a partition over the cap are
+                then only fetched if it cannot be split any further. Default is False.
+            defer (bool, optional): Park the failed requests in the retry queue, False when the crawl is itself a
+                retry of the queue. Default is True.
+            publish (callable, optional): Cleans and publishes the notices of a page, also when a deferred page is
+                retried. Default is clean_and_publish_data.
+            use_cache (bool, optional): Use the response cache, if any. Default is True.
+
+        Returns:
+            bool: True if the partition was crawled, False if it failed (and was deferred).
+        """
+        publish = publish or self.clean_and_publish_data
+        total = None
+        if probe:
+            total = self.probe_total(url, partition, use_cache=use_cache)
+            # A partition filtered on every parameter has no child partitions, its first 160 results are fetched
+            splittable = len(partition) < len(PARTITION_PARAMETERS)
+            if total is not None and total > MAX_REACHABLE_RESULTS and splittable:
+                self.record_partition_total(tier, more_than_160, partition, total)
+                return True
+            if total == 0:
+                self.record_partition_total(tier, more_than_160, partition, total)
+                return True
+
+        first_url = self.page_url(url, partition)
+        data = None
+        if not probe or total is not None:
+            data = self.fetch_data_with_retry(first_url, max_retries=1, retry_delay=self.retry_delay,
+                                              use_cache=use_cache)
+            PARTITION_FETCHES.labels("page").inc()
+        if not data or "_embedded" not in data:
+            if defer:
+                self.retry_queue.defer(
+                    "listing", first_url,
+                    lambda: self.crawl_partition(url, tier, more_than_160, partition, defer=False, publish=publish,
+                                                 use_cache=use_cache),
+                    context={"tier": tier, "partition": list(partition)}, error="missing or unexpected response",
+                )
+            return False
+
+        total = data.get("total", 0)
+        self.record_partition_total(tier, more_than_160, partition, total)
+        publish(data["_embedded"].get("notices", []))
+        time.sleep(self.request_delay)
+
+        # Only the first 160 results of a query can be paged through
+        pages = math.ceil(min(total, MAX_REACHABLE_RESULTS) / RESULTS_PER_PAGE)
+        page_urls = [self.page_url(url, partition, page) for page in range(2, pages + 1)]
+        if not page_urls:
+            return True
+        PARTITION_FETCHES.labels("page").inc(len(page_urls))
+
+        crawled = True
+        for page_url, page_data in zip(page_urls, self.fetch_pages(page_urls, use_cache=use_cache)):
+            if page_data and "_embedded" in page_data:
+                publish(page_data["_embedded"].get("notices", []))
+            elif defer:
+                self.retry_queue.defer(
+                    "listing", page_url,
+                    lambda page_url=page_url: self.retry_listing_page(page_url, publish, use_cache),
+                    context={"tier": tier, "partition": list(partition)}, error="missing or unexpected response",
+                )
+            else:
+                crawled = False
+        time.sleep(self.request_delay)
+        return crawled
+
+    def record_partition_total(self, tier, more_than_160, partition, total):
+        """Keep the total of a crawled partition, and add it to more_than_160 if it exceeds the 160-result cap."""
+        self.partition_totals[partition] = total
+        print("Partition", tier, partition, "total", total)
+        if total > MAX_REACHABLE_RESULTS and partition not in more_than_160:
+            more_than_160.append(partition)
+
+    def retry_listing_page(self, url, publish=None, use_cache=True):
+        """
+        Retry a deferred listing page of a partition whose first page was crawled.
+
+        Parameters:
+            url (str): The URL of the page.
+            publish (callable, optional): Cleans and publishes the notices, see crawl_partition.
+            use_cache (bool, optional): Use the response cache, if any. Default is True.
+
+        Returns:
+            bool: True if the page was fetched and its notices published.
+        """
+        data = self.fetch_data_with_retry(url, max_retries=1, retry_delay=self.retry_delay, use_cache=use_cache)
+        if not data or "_embedded" not in data:
+            return False
+        (publish or self.clean_and_publish_data)(data["_embedded"].get("notices", []))
+        return True
+
+    def split_partitions(self, parents, values):
+        """
+        Split the partitions exceeding the 160-result cap by the values of the next filter.
+
+        Parameters:
+            parents (list): The partitions to split.
+            values (list): The values of the next filter.
+
+        Returns:
+            list: (child partition, expected total) tuples, where the expected total is the share of the total of
+            the parent, or None if it is not known.
+        """
+        children = []
+        for parent in parents:
+            parent_total = self.partition_totals.get(parent)
+            expected_total = parent_total / len(values) if parent_total is not None else None
+            children.extend((parent + (value,), expected_total) for value in values)
+        return children
+
+    def crawl_tier(self, url, tier, partitions):
+        """
+        Crawl the partitions of an extraction tier.
+
+        The partitions expected to hold well over 160 entries are probed before their notices are downloaded.
+
+        Parameters:
+            url (str): The base URL for the Interpol API.
+            tier (str): The extraction tier, e.g. "age" or "gender".
+            partitions (list): (partition, expected total) tuples, see split_partitions.
+
+        Returns:
+            list: The partitions of the tier with more than 160 entries.
+        """
+        more_than_160 = []
+        PARTITIONS_PENDING.labels(tier).set(len(partitions))
+
+        for partition, expected_total in partitions:
+            probe = expected_total is not None and expected_total > PROBE_EXPECTED_TOTAL
+            self.crawl_partition(url, tier, more_than_160, partition, probe=probe)
+            self.partition_done(tier)
+            self.retry_queue.process()
+
+        # The deferred pages of the tier can still add partitions to it, the deferred image lookups go on meanwhile
+        self.retry_queue.process(wait=True, kinds=("listing",))
+        return more_than_160
+
+
+    def fetch_data_with_retry(self, url, max_retries=15, retry_delay=300, use_cache=True):
         """
         Fetch data from the given URL with automatic retry in case of HTTP errors.
 
+        With a response cache, a fresh cached page is returned without any request and an expired one is
+        revalidated with a conditional GET. In offline mode, only the cache is read.
+
         Parameters:
             url (str): The URL to fetch data from.
             max_retries (int, optional): Maximum number of retries in case of a failure. Default is 15.
             retry_delay (int, optional): Delay (in seconds) between retries. Default is 300 seconds (5 minutes).
+            use_cache (bool, optional): Use the response cache, if any. Default is True.
 
         Returns:
             dict or list or None: The JSON response data if successfully fetched, None if max_retries reached.
         """
+        cache = self.response_cache if use_cache else None
+        cached = None
+        if cache is not None:
+            cached = cache.get(url)
+            if cached is not None and (cache.offline or cache.is_fresh(cached)):
+                RESPONSE_CACHE_LOOKUPS.labels("hit").inc()
+                return json.loads(cached["body"])
+            if cache.offline:
+                RESPONSE_CACHE_LOOKUPS.labels("miss").inc()
+                print("Offline replay: page not cached:", url)
+                return None
+
         retries = 0
+        rate_limit_waits = 0
 
         while retries < max_retries:
             try:
                 # Make the HTTP request
-                r = requests.get(url)
-                r.raise_for_status()  # Check for HTTP errors
+                try:
+                    if self.request_budget is not None:
+                        # Every attempt is a request, the retries and the rate limit waits included
+                        self.request_budget(1)
+                    r = requests.get(url, headers=ResponseCache.validators(cached))
+                except requests.exceptions.RequestException:
+                    API_REQUESTS.labels("listing", "error").inc()
+                    raise
+                API_REQUESTS.labels("listing", r.status_code).inc()
+                rate_limited = r.status_code == 429
+                if not rate_limited:
+                    r.raise_for_status()  # Check for HTTP errors
+
+                if r.status_code == 304 and cached is not None:
+                    # Unchanged since it was cached
+                    RESPONSE_CACHE_LOOKUPS.labels("revalidated").inc()
+                    cache.renew(url, cached)
+                    return json.loads(cached["body"])
 
                 # Check for rate limit exceeded
-                if "X-RateLimit-Remaining" in r.headers and int(r.headers["X-RateLimit-Remaining"]) == 0:
+                if rate_limited or ("X-RateLimit-Remaining" in r.headers and int(r.headers["X-RateLimit-Remaining"]) == 0):
+                    # It holds back every request, not only this URL: waited for without using up the retries
+                    if rate_limit_waits >= RATE_LIMIT_MAX_WAITS:
+                        break
                     print("Rate limit exceeded. Retrying in a few minutes...")
                     print(retries, "retries so far.")
-                    retries += 1
+                    rate_limit_waits += 1
+                    RATE_LIMIT_WAITS.inc()
+                    RATE_LIMIT_WAIT_SECONDS.inc(retry_delay)
                     print("Waiting to retry..")
                     time.sleep(retry_delay)  # Wait for the retry delay
                     continue  # Retry the request
 
                 # Process the response data
-                return r.json()  # For example, return the JSON data
+                data = r.json()
+                if cache is not None:
+                    RESPONSE_CACHE_LOOKUPS.labels("miss").inc()
+                    cache.put(url, r.text, r.headers)
+                return data
 
             except requests.exceptions.RequestException as e:
                 print(f"Error while fetching data: {e}")
@@ -182,7 +685,9 @@ class InterpolDataExtractor:
                 print(f"An error occurred: {e}")
 
             retries += 1
-            time.sleep(retry_delay)  # Wait for the retry delay
+            if retries < max_retries:
+                API_RETRIES.labels("listing").inc()
+                time.sleep(retry_delay)  # Wait for the retry delay
 
         print("Max retries reached. Unable to fetch data.")
         return None  # Return None or handle the retry limit exceeded situation as needed
@@ -203,100 +708,11 @@ class InterpolDataExtractor:
         Returns:
             list: A list of tuples (ageMin, ageMax) representing age intervals with more than 160 entries.
         """
+        # The total of the whole listing tells which age intervals are worth probing first
+        listing_total = self.probe_total(url, ())
+        expected_total = listing_total / len(AGE_INTERVALS) if listing_total is not None else None
 
-        age_intervals = [  # Define a list of age intervals
-            (18, 24),
-            (25, 25),
-            (26, 26),
-            (27, 27),
-            (28, 28),
-            (29, 29),
-            (30, 30),
-            (31, 31),
-            (32, 32),
-            (33, 33),
-            (34, 34),
-            (35, 35),
-            (36, 36),
-            (37, 37),
-            (38, 38),
-            (39, 39),
-            (40, 40),
-            (41, 41),
-            (42, 42),
-            (43, 43),
-            (44, 44),
-            (45, 45),
-            (46, 46),
-            (47, 47),
-            (48, 48),
-            (49, 49),
-            (50, 50),
-            (51, 51),
-            (52, 52),
-            (53, 53),
-            (54, 54),
-            (55, 55),
-            (56, 56),
-            (57, 57),
-            (58, 58),
-            (59, 59),
-            (60, 60),
-            (61, 61),
-            (62, 62),
-            (63, 63),
-            (64, 64),
-            (65, 65),
-            (66, 66),
-            (67, 67),
-            (68, 68),
-            (69, 69),
-            (70, 75),
-            (76, 80),
-            (81, 85),
-            (86, 89),
-            (90, 120)
-        ]
-        more_than_160 = []  # List to store age intervals with more than 160 entries
-
-        for ageMin, ageMax in age_intervals:
-            page = 1
-            while True:
-                url_with_params = url + "&ageMin=" + str(ageMin) + "&ageMax=" + str(ageMax)
-                data = self.fetch_data_with_retry(url_with_params, max_retries=15, retry_delay=120)
-
-                # Check if the response data is as expected
-                if "_embedded" in data and "notices" in data["_embedded"]:
-                    notices = data["_embedded"]["notices"]
-                    print("Yaş ", ageMin, "-", ageMax, data["total"])  # Print information about the age interval
-        
-                    if data["total"] > 160:
-                        more_than_160.append((ageMin, ageMax))
-
-                    # Clean the data for77777 ,
-                    # 8 the current age interval and publish it
-                    self.clean_and_publish_data(notices)
-
-                else:
-                    print("Unexpected response format or missing data for age interval:", ageMin, "-", ageMax)
-
-                # Add a delay between requests to avoid rate limiting
-                time.sleep(1)
-
-                # Check if there are more pages, if not, break the loop
-                if "last" in data["_links"]:
-                    last_page_url = data["_links"]["last"]["href"]
-                    max_pages = int(last_page_url.split("page=")[-1])
-                    page += 1  # Increment the page number for the next iteration
-                else:
-                    print("No more pages for age interval:", ageMin, "-", ageMax)
-                    break
-
-                # Check if we have reached the maximum number of pages
-                if page > max_pages:
-                    print("Reached the maximum number of pages for age interval:", ageMin, "-", ageMax)
-                    break
-                
+        more_than_160 = self.crawl_tier(url, "age", [(interval, expected_total) for interval in AGE_INTERVALS])
         print("Age interval with more than 160 entries:", more_than_160)
         return more_than_160
 
@@ -317,50 +733,7 @@ class InterpolDataExtractor:
         Returns:
             list: A list of tuples (age interval, gender) representing combinations with more than 160 entries.
         """
-
-        more_than_160 = []  # List to store combinations (age interval, gender) with more than 160 entries
-        genders = ["U", "F", "M"]
-
-        for ageMin, ageMax in more_than_160_age:
-            for gender in genders:
-                page = 1
-
-                while True:
-                    url_with_params = f"{url}&sexId={gender}&ageMin={ageMin}&ageMax={ageMax}&page={page}"
-                    data = self.fetch_data_with_retry(url_with_params, max_retries=15, retry_delay=120)
-
-                    # Check if the response data is as expected
-                    if "_embedded" in data and "notices" in data["_embedded"]:
-                        notices = data["_embedded"]["notices"]
-                        print("Age", ageMin, "-", ageMax, "Gender", gender, "Page", page, data["total"])  # Print information about the age, gender, and page
-
-                        if data["total"] > 160:
-                            more_than_160.append((ageMin, ageMax, gender))
-
-                        # Clean the data for the current age and gender and publish it if it has less than or equal to 160 entries
-                        self.clean_and_publish_data(notices)
-
-                    else:
-                        print("Unexpected response format or missing data for age", ageMin, "-", ageMax, "Gender", gender)
-                        break
-
-                    # Add a delay between requests to avoid rate limiting
-                    time.sleep(1)
-
-                    # Check if there are more pages, if not, break the loop
-                    if "last" in data["_links"]:
-                        last_page_url = data["_links"]["last"]["href"]
-                        max_pages = int(last_page_url.split("page=")[-1])
-                        page += 1  # Increment the page number for the next iteration
-                    else:
-                        print("No more pages for age", ageMin, "-", ageMax, "Gender", gender)
-                        break
-
-                    # Check if we have reached the maximum number of pages
-                    if page > max_pages:
-                        print("Reached the maximum number of pages for age", ageMin, "-", ageMax, "Gender", gender)
-                        break
-
+        more_than_160 = self.crawl_tier(url, "gender", self.split_partitions(more_than_160_age, GENDERS))
         print("Age and Gender with more than 160 entries:", more_than_160)
         return more_than_160
 
@@ -382,48 +755,7 @@ class InterpolDataExtractor:
         Returns:
             list: A list of tuples (age interval, gender, wantedBy) representing combinations with more than 160 entries.
         """
-        more_than_160 = [] # List to store combinations (age interval, gender, wantedBy) with more than 160 entries
-
-        for ageMin, ageMax, gender in more_than_160_gender:
-            for wanted_by in nationalities:
-                page = 1
-
-                while True:
-                    url_with_params = f"{url}&sexId={gender}&ageMin={ageMin}&ageMax={ageMax}&arrestWarrantCountryId={wanted_by}&page={page}"
-                    data = self.fetch_data_with_retry(url_with_params, max_retries=15, retry_delay=120)
-
-                    # Check if the response data is as expected
-                    if "_embedded" in data and "notices" in data["_embedded"]:
-                        notices = data["_embedded"]["notices"]
-                        print("Ülkelerden istenen:", wanted_by, "Gender", gender, "Page", page, data["total"])  # Print information about the wantedBy nationality
-
-                        if data["total"] > 160:
-                            more_than_160.append((ageMin, ageMax, gender, wanted_by))
-
-                        # Clean the data for the current nationality
-                        self.clean_and_publish_data(notices)
-
-                    else:
-                        print("Unexpected response format or missing data for nationality:", wanted_by)
-                        break
-
-                    # Add a delay between requests to avoid rate limiting
-                    time.sleep(1)
-
-                    # Check if there are more pages, if not, break the loop
-                    if "last" in data["_links"]:
-                        last_page_url = data["_links"]["last"]["href"]
-                        max_pages = int(last_page_url.split("page=")[-1])
-                        page += 1  # Increment the page number for the next iteration
-                    else:
-                        print("No more pages for", wanted_by, "Gender", gender)
-                        break
-
-                    # Check if we have reached the maximum number of pages
-                    if page > max_pages:
-                        print("Reached the maximum number of pages for", wanted_by, "Gender", gender)
-                        break
-
+        more_than_160 = self.crawl_tier(url, "wanted_by", self.split_partitions(more_than_160_gender, nationalities))
         print("WantedBy nationalities with more than 160 entries:", more_than_160)
         return more_than_160
 
@@ -438,56 +770,14 @@ class InterpolDataExtractor:
         more than 160 entries are added to a list.
 
         Parameters:
-            more_than_160_wanted (list): A list of tuples (ageMin, ageMax, gender, wantedBy, nationality) representing combinations with more than 160 entries.
+            more_than_160_wanted (list): A list of tuples (ageMin, ageMax, gender, wantedBy) representing combinations with more than 160 entries.
             url (str): The base URL for the Interpol API.
             nationalities (list): A list of nationalities extracted from the Interpol website.
 
         Returns:
             list: A list of tuples (age interval, gender, wantedBy, nationality) representing combinations with more than 160 entries.
         """
-
-        more_than_160 = []  # List to store combinations (age interval, gender, wantedBy, nationality) with more than 160 entries
-
-        for ageMin, ageMax, gender, wanted_by, nation in more_than_160_wanted:
-            for nation in nationalities:
-                page = 1
-
-                while True:
-                    url_with_params = f"{url}&sexId={gender}&ageMin={ageMin}&ageMax={ageMax}&arrestWarrantCountryId={wanted_by}&nationality={nation}&page={page}"
-                    data = self.fetch_data_with_retry(url_with_params, max_retries=15, retry_delay=120)
-
-                    # Check if the response data is as expected
-                    if "_embedded" in data and "notices" in data["_embedded"]:
-                        notices = data["_embedded"]["notices"]
-                        print("Ülkesi:", nation, "Gender", gender, "WantedBy", wanted_by, "Page", page, data["total"])
-
-                        if data["total"] > 160:
-                            more_than_160.append((ageMin, ageMax, gender, wanted_by, nation))
-
-                        # Clean the data for the current nationality
-                        self.clean_and_publish_data(notices)
-
-                    else:
-                        print("Unexpected response format or missing data for nationality:", wanted_by, "Gender", gender, "WantedBy", wanted_by)
-                        break
-
-                    # Add a delay between requests to avoid rate limiting
-                    time.sleep(1)
-
-                    # Check if there are more pages, if not, break the loop
-                    if "last" in data["_links"]:
-                        last_page_url = data["_links"]["last"]["href"]
-                        max_pages = int(last_page_url.split("page=")[-1])
-                        page += 1  # Increment the page number for the next iteration
-                    else:
-                        print("No more pages for", nation, "Gender", gender, "WantedBy", wanted_by)
-                        break
-
-                    # Check if we have reached the maximum number of pages
-                    if page > max_pages:
-                        print("Reached the maximum number of pages for", nation, "Gender", gender, "WantedBy", wanted_by)
-                        break
-
+        more_than_160 = self.crawl_tier(url, "nationality", self.split_partitions(more_than_160_wanted, nationalities))
         print("Nationalities with more than 160 entries:", more_than_160)
         return more_than_160
 
@@ -501,56 +791,13 @@ class InterpolDataExtractor:
         The combinations with more than 160 entries are added to a list.
 
         Parameters:
-            more_than_160_nat (list): A list of tuples (ageMin, ageMax, gender, wantedBy, nationality, forename) representing combinations with more than 160 entries.
+            more_than_160_nat (list): A list of tuples (ageMin, ageMax, gender, wantedBy, nationality) representing combinations with more than 160 entries.
             url (str): The base URL for the Interpol API.
 
         Returns:
             list: A list of tuples (age interval, gender, wantedBy, nationality, forename) representing combinations with more than 160 entries.
         """
-
-        more_than_160 = [] # List to store combinations (age interval, gender, wantedBy, nationality, forename) with more than 160 entries
-
-
-        for ageMin, ageMax, gender, wanted_by, nation, forename in more_than_160_nat:
-            for forename in string.ascii_uppercase:
-                page = 1
-
-                while True:
-                    url_with_params = f"{url}&sexId={gender}&ageMin={ageMin}&ageMax={ageMax}&arrestWarrantCountryId={wanted_by}&nationality={nation}&forename={forename}&page={page}"
-                    data = self.fetch_data_with_retry(url_with_params, max_retries=15, retry_delay=120)
-
-                    # Check if the response data is as expected
-                    if "_embedded" in data and "notices" in data["_embedded"]:
-                        notices = data["_embedded"]["notices"]
-                        print("Soyadı harfi:", forename, "Gender", gender, "WantedBy", wanted_by, "Nationality", nation, "Page", page, data["total"]) 
-
-                        if data["total"] > 160:
-                            more_than_160.append((ageMin, ageMax, gender, wanted_by, nation, forename))
-
-                        # Clean the data for the current nationality
-                        self.clean_and_publish_data(notices)
-
-                    else:
-                        print("Unexpected response format or missing data for nationality:", wanted_by, "Gender", gender, "WantedBy", wanted_by)
-                        break
-
-                    # Add a delay between requests to avoid rate limiting
-                    time.sleep(1)
-
-                    # Check if there are more pages, if not, break the loop
-                    if "last" in data["_links"]:
-                        last_page_url = data["_links"]["last"]["href"]
-                        max_pages = int(last_page_url.split("page=")[-1])
-                        page += 1  # Increment the page number for the next iteration
-                    else:
-                        print("No more pages for", forename, "Gender", gender, "WantedBy", wanted_by, "Nationality", nation)
-                        break
-
-                    # Check if we have reached the maximum number of pages
-                    if page > max_pages:
-                        print("Reached the maximum number of pages for", forename, "Gender", gender, "WantedBy", wanted_by, "Nationality", nation)
-                        break
-
+        more_than_160 = self.crawl_tier(url, "forename", self.split_partitions(more_than_160_nat, string.ascii_uppercase))
         print("Forenames with more than 160 entries:", more_than_160)
         return more_than_160
 
@@ -571,55 +818,26 @@ class InterpolDataExtractor:
         Returns:
             list: A list of tuples (age interval, gender, wantedBy, nationality, forename, name) representing combinations with more than 160 entries.
         """
-
-
-        more_than_160 = []  # List to store combinations (age interval, gender, wantedBy, nationality, forename, name) with more than 160 entries
-
-
-        for ageMin, ageMax, gender, wanted_by, nation, forename in more_than_160_forename:
-            for name in string.ascii_uppercase:
-                page = 1
-
-                while True:
-                    url_with_params = f"{url}&sexId={gender}&ageMin={ageMin}&ageMax={ageMax}&arrestWarrantCountryId={wanted_by}&nationality={nation}&forename={forename}&name={name}&page={page}"
-                    data = self.fetch_data_with_retry(url_with_params, max_retries=15, retry_delay=120)
-
-                    # Check if the response data is as expected
-                    if "_embedded" in data and "notices" in data["_embedded"]:
-                        notices = data["_embedded"]["notices"]
-                        print("Adının harfi:", name, "Forename", forename, "Gender", gender, "WantedBy", wanted_by, "Nationality", nation, "Page", page, data["total"]) 
-
-                        if data["total"] > 160:
-                            more_than_160.append((ageMin, ageMax, gender, wanted_by, nation, forename, name))
-
-                        # Clean the data for the current nationality
-                        self.clean_and_publish_data(notices)
-
-                    else:
-                        print("Unexpected response format or missing data for nationality:", wanted_by, "Forename", forename, "Gender", gender, "WantedBy", wanted_by)
-                        break
-
-                    # Add a delay between requests to avoid rate limiting
-                    time.sleep(1)
-
-                    # Check if there are more pages, if not, break the loop
-                    if "last" in data["_links"]:
-                        last_page_url = data["_links"]["last"]["href"]
-                        max_pages = int(last_page_url.split("page=")[-1])
-                        page += 1  # Increment the page number for the next iteration
-                    else:
-                        print("No more pages for", name, "Forename", forename, "Gender", gender, "WantedBy", wanted_by, "Nationality", nation)
-                        break
-
-                    # Check if we have reached the maximum number of pages
-                    if page > max_pages:
-                        print("Reached the maximum number of pages for", name, "Forename", forename, "Gender", gender, "WantedBy", wanted_by, "Nationality", nation)
-                        break
-
+        more_than_160 = self.crawl_tier(url, "name", self.split_partitions(more_than_160_forename, string.ascii_uppercase))
         print("Names with more than 160 entries:", more_than_160)
         return more_than_160
 
 
+    def publish_generation_complete(self, notices=None):
+        """
+        Publish the end-of-crawl marker of the current generation.
+
+        Container B receives it after all the notices of the crawl (the queue is consumed in order) and deletes
+        the records that the crawl did not see.
+
+        Parameters:
+            notices (int, optional): The number of notices of the generation, default the ones published by this crawler.
+        """
+        if notices is None:
+            notices = len(self.cleaned_data)
+        headers = {"control": "generation_complete", "generation": self.generation}
+        self.rabbitmq_publisher.publish_data({"generation": self.generation, "notices": notices}, headers=headers)
+        print("Generation complete:", self.generation)
 
     def start_extraction(self):
         """
@@ -638,34 +856,56 @@ class InterpolDataExtractor:
             None
         """
         start_time = time.time()  # Record the start time
-        interpol_countries_extractor = InterpolCountriesExtractor("https://www.interpol.int/How-we-work/Notices/View-Red-Notices")
+        self.generation = int(start_time)
+        self.partition_totals = {}
+        dead_listings_before = self.retry_queue.dead_letter_count("listing")
+        interpol_countries_extractor = InterpolCountriesExtractor(self.countries_url, self.country_catalog_path)
         nationalities = interpol_countries_extractor.get_extracted_nationalities()
 
         try:
-            base_url = "https://ws-public.interpol.int/notices/v1/red?"
+            base_url = self.api_url + "?"
 
             # Extract data for age intervals
+            self.phase = "age"
             more_than_160_age = self.extract_by_age(base_url)
 
             # Extract data for genders with more than 160 entries
+            self.phase = "gender"
             more_than_160_gender = self.extract_by_gender(more_than_160_age, base_url)
 
             # Extract data for wantedBy nationalities with more than 160 entries
+            self.phase = "wanted_by"
             more_than_160_wanted = self.extract_by_wanted(more_than_160_gender, base_url, nationalities)
 
             # Extract data for target nationalities with more than 160 entries
+            self.phase = "nationality"
             more_than_160_nat = self.extract_by_nationality(more_than_160_wanted, base_url, nationalities)
 
             # Extract data for forenames with more than 160 entries
+            self.phase = "forename"
             more_than_160_forename = self.extract_by_forename(more_than_160_nat, base_url)
 
             # Extract data for names with more than 160 entries
+            self.phase = "name"
             more_than_160 = self.extract_by_name(more_than_160_forename, base_url)
 
             print("Combinations with more than 160 entries:", len(more_than_160))
+            self.phase = "done"
+
+            # Only a crawl that reached every notice lets Container B sweep the ones it did not see
+            dead_listings = self.retry_queue.dead_letter_count("listing") - dead_listings_before
+            if dead_listings:
+                print("Listing pages dead-lettered:", dead_listings, "see", self.retry_queue.dead_letter_path)
+            # The notices still waiting for their image are published without it before the end-of-crawl marker
+            self.retry_queue.release("image")
+            if not more_than_160 and not dead_listings:
+                self.publish_generation_complete()
+            # Their image lookups go on after the crawl, and publish them again once found
+            self.retry_queue.process(wait=True)
 
         except Exception as e:
             print("Error in main:", e)
+            self.phase = "failed"
 
         print("Total data cleaned and published:", self.total_cleaned_data)
 
@@ -685,6 +925,29 @@ if __name__ == "__main__":
     rabbitmq_host = "container_c"  # hostname or IP address of RabbitMQ
     rabbitmq_port = 5672  # The default port for RabbitMQ
     queue_name = "interpol_data"  # The name of the RabbitMQ queue
-
-    data_extractor = InterpolDataExtractor(rabbitmq_host, rabbitmq_port, queue_name)
-    data_extractor.start_extraction()
\ No newline at end of file
+    health_port = 8000  # The port of the health server
+
+    # "sweep": one full crawl, "schedule": keep recrawling for new notices (no updates or deletions),
+    # "coordinator" / "worker": full crawl spread over workers
+    crawl_mode = os.environ.get("CRAWL_MODE", "sweep")
+    requests_per_hour = float(os.environ.get("CRAWL_REQUESTS_PER_HOUR", 3600))
+
+    # Enabled by RESPONSE_CACHE_DIR, e.g. for development runs or an offline replay of a crawl
+    data_extractor = InterpolDataExtractor(rabbitmq_host, rabbitmq_port, queue_name,
+                                           response_cache=ResponseCache.from_environment())
+    health_server = HealthServer(health_port, data_extractor.health_status)
+    health_server.add_route("/metrics", metrics_response)
+    health_server.start()
+    if crawl_mode == "schedule":
+        from RecrawlScheduler import RecrawlScheduler
+        RecrawlScheduler(data_extractor, requests_per_hour=requests_per_hour).run()
+    elif crawl_mode in ("coordinator", "worker"):
+        from DistributedCrawl import CrawlCoordinator, CrawlWorker, SharedCrawlState
+        crawl_state = SharedCrawlState()
+        if crawl_mode == "coordinator":
+            CrawlCoordinator(crawl_state, rabbitmq_host, rabbitmq_port).run()
+        else:
+            CrawlWorker(data_extractor, crawl_state, rabbitmq_host, rabbitmq_port,
+                        requests_per_hour=requests_per_hour).run()
+    else:
+        data_extractor.start_extraction()
\ No newline at end of file
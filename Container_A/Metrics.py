@@ -0,0 +1,49 @@
+"""
+Metrics.py
+
+This script defines the Prometheus metrics of the Container A crawler. They are served in the Prometheus text
+format on the /metrics endpoint of the HealthServer.
+
+Dependencies:
+- prometheus_client: Python client library for Prometheus
+
+@Author: Nisanur Genc
+
+"""
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, generate_latest
+
+# HTTP requests to the Interpol API, by endpoint ("listing" or "images") and status code or error
+API_REQUESTS = Counter('interpol_requests_total', 'Requests sent to the Interpol API', ['endpoint', 'status'])
+API_RETRIES = Counter('interpol_request_retries_total', 'Requests to the Interpol API that had to be retried', ['endpoint'])
+RATE_LIMIT_WAITS = Counter('interpol_rate_limit_waits_total', 'Times the crawler waited because the rate limit was exhausted')
+RATE_LIMIT_WAIT_SECONDS = Counter('interpol_rate_limit_wait_seconds_total', 'Time spent waiting for the rate limit to reset')
+
+# Partitions (age intervals, genders, nationalities, ...) of the crawl, by extraction tier
+PARTITIONS_PENDING = Gauge('crawl_partitions_pending', 'Partitions of the current tier that are not crawled yet', ['tier'])
+PARTITIONS_DONE = Counter('crawl_partitions_done_total', 'Partitions crawled', ['tier'])
+PARTITION_FETCHES = Counter('crawl_partition_requests_total', 'Listing requests of the partitions, count-only probes or pages', ['kind'])
+
+NOTICES_PUBLISHED = Counter('notices_published_total', 'Cleaned notices published to RabbitMQ')
+
+# Failed requests parked in the retry queue (RetryQueue.py), by kind ("listing" or "image")
+DEFERRED_ITEMS = Counter('retry_deferred_total', 'Failed requests parked in the retry queue', ['kind'])
+DEAD_LETTERS = Counter('retry_dead_letters_total', 'Failed requests given up after their last retry', ['kind'])
+RETRY_QUEUE_SIZE = Gauge('retry_queue_size', 'Requests waiting in the retry queue')
+
+# Listing pages looked up in the response cache (ResponseCache.py), by result ("hit", "revalidated" or "miss")
+RESPONSE_CACHE_LOOKUPS = Counter('response_cache_lookups_total', 'Listing pages looked up in the response cache', ['result'])
+
+# Recrawl scheduler (RecrawlScheduler.py)
+SCHEDULED_PARTITIONS = Gauge('recrawl_partitions', 'Partitions tracked by the recrawl scheduler')
+NEW_NOTICES_FOUND = Counter('recrawl_new_notices_total', 'New notices found by the recrawls of known partitions')
+RECRAWL_BUDGET_WAIT_SECONDS = Counter('recrawl_budget_wait_seconds_total', 'Time spent waiting for the request budget')
+
+# Distributed crawl (DistributedCrawl.py), by outcome ("crawled", "split", "truncated", "duplicate" or "failed")
+DISTRIBUTED_PARTITIONS = Counter('distributed_crawl_partitions_total', 'Partitions pulled from the work queue', ['outcome'])
+GLOBAL_BUDGET_WAIT_SECONDS = Counter('distributed_crawl_budget_wait_seconds_total', 'Time spent waiting for the global request budget')
+
+
+def metrics_response():
+    """Build the /metrics response for the HealthServer."""
+    return 200, CONTENT_TYPE_LATEST, generate_latest()
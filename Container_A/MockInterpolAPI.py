@@ -0,0 +1,473 @@
+"""
+MockInterpolAPI.py
+
+This script defines the MockInterpolAPI class, a local stand-in for the Interpol red notices API used to measure the
+crawler without hitting the real service. It serves a fixed corpus of notices, either loaded from a file (data.csv or
+a JSON lines dump) or generated from a seed, so a crawl can be replayed against exactly the same data.
+
+Endpoints:
+- /notices/v1/red: The paginated listing, honoring ageMin, ageMax, sexId, arrestWarrantCountryId, nationality,
+  forename, name, page and resultPerPage. Like the real API, only the first 160 results of a query can be paged
+  through, while "total" reports all the matches.
+- /notices/v1/red/<id>: The detail document of a notice.
+- /notices/v1/red/<id>/images: The image list of a notice.
+- /notices/v1/red/<id>/images/<picture_id>: The image itself.
+- /How-we-work/Notices/View-Red-Notices: A page with the nationality select parsed by ExtractCountries.
+
+Every response can be delayed by a fixed latency, and a fixed-window rate limit answers 429 once exhausted. The
+X-RateLimit-Remaining header is sent like the real API does, so the retry logic of the crawler is exercised too.
+
+Dependencies:
+- http.server: Python module providing the HTTP server
+- threading: Python module for running the server next to the crawler
+- csv, ast, json: Python modules for loading and dumping the corpus
+- random: Python module for generating the synthetic corpus
+
+@Author: Nisanur Genc
+
+"""
+
+import argparse
+import ast
+import csv
+import json
+import math
+import random
+import threading
+import time
+import zlib
+from collections import Counter, defaultdict
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+MAX_REACHABLE_RESULTS = 160  # The API does not page past the first 160 results of a query
+DEFAULT_RESULTS_PER_PAGE = 20
+LISTING_PATH = "/notices/v1/red"
+COUNTRIES_PATH = "/How-we-work/Notices/View-Red-Notices"
+
+# A 1x1 transparent GIF, served for every notice image
+IMAGE_BYTES = bytes.fromhex(
+    "47494638396101000100800000000000ffffff21f90401000000002c00000000010001000002024401003b"
+)
+
+SYNTHETIC_COUNTRIES = [
+    "RU", "AR", "SV", "IN", "PK", "GT", "HN", "US", "CO", "TR", "BR", "MX", "UA", "CN", "AL", "NG", "FR", "DE",
+    "IT", "ES", "GB", "PL", "RO", "BY", "KZ", "UZ", "TJ", "KG", "AM", "AZ", "GE", "IQ", "IR", "SY", "EG", "MA",
+    "DZ", "TN", "LY", "SD", "ET", "KE", "GH", "CM", "VE", "PE", "EC", "BO", "PY", "CL", "DO", "HT", "CU", "JM",
+    "PH", "VN", "TH", "ID", "MY", "BD",
+]
+SYNTHETIC_SYLLABLES = [
+    "AL", "AN", "AR", "BE", "DA", "DI", "EL", "EM", "GO", "HA", "IL", "IR", "JO", "KA", "KO", "LA", "LI", "MA",
+    "MI", "NA", "NO", "OR", "PA", "RA", "RI", "SA", "SE", "TA", "TO", "UR", "VA", "YA", "ZA", "ZE",
+]
+
+
+def entity_path(entity_id):
+    """Return the URL form of an entity ID, e.g. "2013/54969" -> "2013-54969"."""
+    return entity_id.replace("/", "-")
+
+
+def age_on(date_of_birth, today):
+    """
+    Compute the age of a person at a given day.
+
+    Parameters:
+    - date_of_birth (str): The date of birth as "YYYY/MM/DD", "YYYY/MM" or "YYYY".
+    - today (date): The reference day.
+
+    Returns:
+    - int: The age in years, or None if the date of birth is missing or invalid.
+    """
+    try:
+        parts = [int(part) for part in (date_of_birth or "").split("/")]
+    except ValueError:
+        return None
+    if not parts or len(parts) > 3:
+        return None
+    year, month, day = (parts + [1, 1])[:3]
+    return today.year - year - ((today.month, today.day) < (month, day))
+
+
+def stable_sex_id(entity_id):
+    """Derive a stable sexId for the notices of data.csv, which does not contain it (about 80% M, 15% F, 5% U)."""
+    bucket = zlib.crc32(entity_id.encode()) % 20
+    return "M" if bucket < 16 else "F" if bucket < 19 else "U"
+
+
+def load_corpus(path):
+    """
+    Load a corpus of notices from the data.csv export of the crawler or from a JSON lines dump.
+
+    Every notice is a dict with the fields of the API (forename, date_of_birth, entity_id, nationalities, name) plus
+    sex_id, arrest_warrant_country_id and has_image, which the API only exposes as filters.
+
+    Parameters:
+    - path (str): The path of the .csv or .jsonl file.
+
+    Returns:
+    - list: The notices.
+    """
+    if path.endswith(".jsonl"):
+        with open(path) as corpus_file:
+            return [json.loads(line) for line in corpus_file if line.strip()]
+
+    corpus = []
+    with open(path, newline="") as corpus_file:
+        for row in csv.DictReader(corpus_file):
+            nationalities = ast.literal_eval(row["nationalities"]) if row.get("nationalities") else []
+            corpus.append({
+                "forename": row.get("forename") or None,
+                "date_of_birth": row.get("date_of_birth") or None,
+                "entity_id": row["entity_id"],
+                "nationalities": nationalities or None,
+                "name": row.get("name") or None,
+                "sex_id": stable_sex_id(row["entity_id"]),
+                "arrest_warrant_country_id": nationalities[0] if nationalities else None,
+                "has_image": "thumbnail" in (row.get("_links") or ""),
+            })
+    return corpus
+
+
+def synthetic_corpus(size, seed=0):
+    """
+    Generate a reproducible corpus of notices.
+
+    The countries follow a long-tailed distribution, like the real data, so that some partitions of the crawl have
+    to be split further than others.
+
+    Parameters:
+    - size (int): The number of notices.
+    - seed (int): The seed of the random generator; the same seed always gives the same corpus.
+
+    Returns:
+    - list: The notices.
+    """
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(len(SYNTHETIC_COUNTRIES))]
+    today = date.today()
+
+    def random_name():
+        return "".join(rng.choice(SYNTHETIC_SYLLABLES) for _ in range(rng.randint(2, 4)))
+
+    corpus = []
+    for number in range(size):
+        birth_year = today.year - rng.randint(18, 95)
+        nationalities = rng.choices(SYNTHETIC_COUNTRIES, weights)[:1]
+        if rng.random() < 0.1:
+            nationalities.append(rng.choice(SYNTHETIC_COUNTRIES))
+        corpus.append({
+            "forename": random_name(),
+            "date_of_birth": f"{birth_year}/{rng.randint(1, 12):02d}/{rng.randint(1, 28):02d}",
+            "entity_id": f"{rng.randint(2000, today.year)}/{number + 1}",
+            "nationalities": nationalities,
+            "name": random_name(),
+            "sex_id": rng.choices(["M", "F", "U"], [80, 15, 5])[0],
+            "arrest_warrant_country_id": rng.choices(SYNTHETIC_COUNTRIES, weights)[0],
+            "has_image": rng.random() < 0.9,
+        })
+    return corpus
+
+
+def dump_corpus(corpus, path):
+    """Write a corpus as JSON lines, to replay it later with load_corpus()."""
+    with open(path, "w") as corpus_file:
+        for notice in corpus:
+            corpus_file.write(json.dumps(notice) + "\n")
+
+
+class MockInterpolAPI:
+    def __init__(self, corpus, port=0, host="127.0.0.1", latency=0.0, rate_limit=0, rate_window=60.0):
+        """
+        Constructor for the MockInterpolAPI class.
+
+        Parameters:
+        - corpus (list): The notices to serve, see load_corpus() and synthetic_corpus().
+        - port (int): The port to listen on, 0 picks a free port.
+        - host (str): The interface to listen on.
+        - latency (float): Delay (in seconds) added to every response.
+        - rate_limit (int): Maximum number of requests per rate window, 0 disables the rate limit.
+        - rate_window (float): Length (in seconds) of the rate limit window.
+        """
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.lock = threading.Lock()
+        self.window_start = time.monotonic()
+        self.window_requests = 0
+        self.requests = Counter()  # (endpoint, status code) -> number of requests
+
+        today = date.today()
+        self.notices = {}
+        self.by_age = defaultdict(list)  # age -> notices, the age filters are the first partition of every crawl
+        for notice in corpus:
+            self.notices[entity_path(notice["entity_id"])] = notice
+            self.by_age[age_on(notice.get("date_of_birth"), today)].append(notice)
+        self.countries = sorted({
+            country
+            for notice in corpus
+            for country in (notice.get("nationalities") or []) + [notice.get("arrest_warrant_country_id")]
+            if country
+        })
+
+        self.server = ThreadingHTTPServer((host, port), self.make_handler())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, name="mock-interpol-api", daemon=True)
+
+    @property
+    def base_url(self):
+        """The root URL of the server."""
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def api_url(self):
+        """The URL of the listing endpoint, to pass to InterpolDataExtractor."""
+        return self.base_url + LISTING_PATH
+
+    @property
+    def countries_url(self):
+        """The URL of the nationalities page, to pass to InterpolDataExtractor."""
+        return self.base_url + COUNTRIES_PATH
+
+    def start(self):
+        """Start serving in the background thread."""
+        self.thread.start()
+
+    def stop(self):
+        """Stop the server."""
+        self.server.shutdown()
+        self.server.server_close()
+
+    def request_counts(self):
+        """Return the number of requests served so far per endpoint and status code, as a dict."""
+        with self.lock:
+            counts = defaultdict(dict)
+            for (endpoint, status_code), count in self.requests.items():
+                counts[endpoint][str(status_code)] = count
+            return dict(counts)
+
+    def take_rate_limit_token(self):
+        """
+        Count a request against the rate limit.
+
+        Returns:
+        - int: The number of requests left in the current window, or None if the limit is already exhausted
+          (or -1 if there is no rate limit).
+        """
+        if not self.rate_limit:
+            return -1
+        with self.lock:
+            now = time.monotonic()
+            if now - self.window_start >= self.rate_window:
+                self.window_start = now
+                self.window_requests = 0
+            if self.window_requests >= self.rate_limit:
+                return None
+            self.window_requests += 1
+            return self.rate_limit - self.window_requests
+
+    def matching_notices(self, query):
+        """
+        Filter the corpus with the query parameters of a listing request.
+
+        Parameters:
+        - query (dict): The parsed query string (single values).
+
+        Returns:
+        - list: The matching notices, in a stable order.
+        """
+        age_min = int(query.get("ageMin", 0))
+        age_max = int(query.get("ageMax", 200))
+        if "ageMin" in query or "ageMax" in query:
+            candidates = [
+                notice
+                for age, notices in self.by_age.items() if age is not None and age_min <= age <= age_max
+                for notice in notices
+            ]
+        else:
+            candidates = [notice for notices in self.by_age.values() for notice in notices]
+
+        sex_id = query.get("sexId")
+        wanted_by = query.get("arrestWarrantCountryId")
+        nationality = query.get("nationality")
+        forename = query.get("forename", "").upper()
+        name = query.get("name", "").upper()
+
+        matches = [
+            notice for notice in candidates
+            if (sex_id is None or notice.get("sex_id") == sex_id)
+            and (wanted_by is None or notice.get("arrest_warrant_country_id") == wanted_by)
+            and (nationality is None or nationality in (notice.get("nationalities") or []))
+            and (notice.get("forename") or "").upper().startswith(forename)
+            and (notice.get("name") or "").upper().startswith(name)
+        ]
+        matches.sort(key=lambda notice: notice["entity_id"])
+        return matches
+
+    def notice_json(self, notice):
+        """Build the listing entry of a notice."""
+        notice_url = f"{self.api_url}/{entity_path(notice['entity_id'])}"
+        links = {"self": {"href": notice_url}, "images": {"href": notice_url + "/images"}}
+        if notice.get("has_image"):
+            links["thumbnail"] = {"href": notice_url + "/images/1"}
+        return {
+            "forename": notice.get("forename"),
+            "date_of_birth": notice.get("date_of_birth"),
+            "entity_id": notice["entity_id"],
+            "nationalities": notice.get("nationalities"),
+            "name": notice.get("name"),
+            "_links": links,
+        }
+
+    def listing_response(self, query):
+        """Build the response of the listing endpoint."""
+        try:
+            results_per_page = min(int(query.get("resultPerPage", DEFAULT_RESULTS_PER_PAGE)), MAX_REACHABLE_RESULTS)
+            page = int(query.get("page", 1))
+            matches = self.matching_notices(query)
+        except ValueError:
+            return 400, "application/json", json.dumps({"error": "invalid parameter"}).encode()
+        if results_per_page < 1 or page < 1:
+            return 400, "application/json", json.dumps({"error": "invalid parameter"}).encode()
+
+        reachable = matches[:MAX_REACHABLE_RESULTS]
+        pages = max(math.ceil(len(reachable) / results_per_page), 1)
+        page_notices = reachable[(page - 1) * results_per_page:page * results_per_page]
+
+        def page_url(number):
+            # The page parameter goes last, the crawler reads the page count from the end of the "last" link
+            params = {key: value for key, value in query.items() if key != "page"}
+            params["resultPerPage"] = results_per_page
+            params["page"] = number
+            return f"{self.api_url}?{urlencode(params)}"
+
+        links = {"self": {"href": page_url(page)}}
+        if pages > 1:
+            links["first"] = {"href": page_url(1)}
+            links["last"] = {"href": page_url(pages)}
+            if page < pages:
+                links["next"] = {"href": page_url(page + 1)}
+        body = {
+            "total": len(matches),
+            "query": dict(query, page=page, resultPerPage=results_per_page),
+            "_embedded": {"notices": [self.notice_json(notice) for notice in page_notices]},
+            "_links": links,
+        }
+        return 200, "application/json", json.dumps(body).encode()
+
+    def detail_response(self, notice):
+        """Build the response of the detail endpoint of a notice, with the fields the listing does not carry."""
+        body = dict(self.notice_json(notice))
+        body.update({
+            "sex_id": notice.get("sex_id"),
+            "arrest_warrants": [
+                {"issuing_country_id": notice.get("arrest_warrant_country_id"), "charge": "Synthetic charge"}
+            ],
+            "languages_spoken_ids": ["ENG"],
+            "height": 1.75,
+            "weight": 75,
+            "eyes_colors_id": None,
+            "hairs_id": None,
+            "distinguishing_marks": None,
+        })
+        return 200, "application/json", json.dumps(body).encode()
+
+    def images_response(self, notice):
+        """Build the response of the image list endpoint of a notice."""
+        notice_url = f"{self.api_url}/{entity_path(notice['entity_id'])}"
+        images = []
+        if notice.get("has_image"):
+            images.append({"picture_id": "1", "_links": {"self": {"href": notice_url + "/images/1"}}})
+        body = {"_embedded": {"images": images}, "_links": {"self": {"href": notice_url + "/images"}}}
+        return 200, "application/json", json.dumps(body).encode()
+
+    def countries_response(self):
+        """Build the nationalities page."""
+        options = "".join(f'<option value="{country}">{country}</option>' for country in self.countries)
+        body = f'<html><body><select name="nationality">{options}</select></body></html>'
+        return 200, "text/html; charset=utf-8", body.encode()
+
+    def route(self, path, query):
+        """
+        Dispatch a request.
+
+        Returns:
+        - tuple: (endpoint name, status code, content type, body bytes).
+        """
+        if path == COUNTRIES_PATH:
+            return ("countries",) + self.countries_response()
+        if path == LISTING_PATH:
+            return ("listing",) + self.listing_response(query)
+
+        parts = path[len(LISTING_PATH) + 1:].split("/") if path.startswith(LISTING_PATH + "/") else []
+        notice = self.notices.get(parts[0]) if parts else None
+        if notice is not None and len(parts) == 1:
+            return ("detail",) + self.detail_response(notice)
+        if notice is not None and len(parts) == 2 and parts[1] == "images":
+            return ("images",) + self.images_response(notice)
+        if notice is not None and len(parts) == 3 and parts[1] == "images" and notice.get("has_image"):
+            return "image", 200, "image/gif", IMAGE_BYTES
+        return "not_found", 404, "application/json", json.dumps({"error": "not found"}).encode()
+
+    def make_handler(self):
+        """Create the request handler class bound to this server."""
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if api.latency:
+                    time.sleep(api.latency)
+
+                url = urlsplit(self.path)
+                remaining = api.take_rate_limit_token()
+                if remaining is None:
+                    endpoint, status_code, content_type, body = (
+                        "rate_limited", 429, "application/json", json.dumps({"error": "rate limit exceeded"}).encode()
+                    )
+                    remaining = 0
+                else:
+                    query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+                    endpoint, status_code, content_type, body = api.route(url.path, query)
+                with api.lock:
+                    api.requests[(endpoint, status_code)] += 1
+
+                self.send_response(status_code)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                if remaining >= 0:
+                    self.send_header("X-RateLimit-Limit", str(api.rate_limit))
+                    self.send_header("X-RateLimit-Remaining", str(remaining))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # A crawl sends thousands of requests, keep them out of the output
+                pass
+
+        return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a mock of the Interpol red notices API.")
+    parser.add_argument("--corpus", help="data.csv or a .jsonl dump to serve instead of a synthetic corpus")
+    parser.add_argument("--size", type=int, default=20000, help="number of notices of the synthetic corpus")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic corpus")
+    parser.add_argument("--dump", help="write the corpus to this .jsonl file, to replay it later")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0, help="delay (in seconds) added to every response")
+    parser.add_argument("--rate-limit", type=int, default=0, help="requests per rate window, 0 for no limit")
+    parser.add_argument("--rate-window", type=float, default=60.0, help="length (in seconds) of the rate window")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus) if args.corpus else synthetic_corpus(args.size, args.seed)
+    if args.dump:
+        dump_corpus(corpus, args.dump)
+
+    mock_api = MockInterpolAPI(corpus, args.port, args.host, args.latency, args.rate_limit, args.rate_window)
+    print(f"Serving {len(corpus)} notices on {mock_api.api_url}")
+    try:
+        mock_api.server.serve_forever()
+    except KeyboardInterrupt:
+        mock_api.server.server_close()
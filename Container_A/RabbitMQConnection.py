@@ -6,7 +6,8 @@ and handling reconnections in case of connection failures.
 
 Dependencies:
 - pika: Python library for RabbitMQ integration
-- time: Python module for adding delays between connection retries
+- time: Python module for stamping the publish time of the messages and throttling the reconnections
+- Readiness: Custom module for polling RabbitMQ with exponential backoff until it accepts connections
 - queue.Queue: Python module for implementing a thread-safe queue for queuing data during connection failures
 
 @Author: Nisanur Genc
@@ -14,11 +15,12 @@ Dependencies:
 """
 
 import queue
-import pika
 import time
+import pika
+from Readiness import wait_for
 
 class RabbitMQConnection:
-    def __init__(self, hostname, port, queue_name):
+    def __init__(self, hostname, port, queue_name, connect_timeout=300, reconnect_interval=30, reconnect_timeout=5):
         """
         Constructor for the RabbitMQConnection class.
 
@@ -26,6 +28,10 @@ class RabbitMQConnection:
         - hostname (str): The hostname or IP address of the RabbitMQ server.
         - port (int): The port number for the RabbitMQ server (default is usually 5672).
         - queue_name (str): The name of the queue to which data will be published.
+        - connect_timeout (float): The maximum time (in seconds) to wait for RabbitMQ to accept connections at startup.
+        - reconnect_interval (float): The minimum time (in seconds) between two reconnection attempts after a
+          connection loss; the data published meanwhile is queued right away.
+        - reconnect_timeout (float): The maximum time (in seconds) a reconnection attempt waits for RabbitMQ.
         """
         self.hostname = hostname
         self.port = port
@@ -34,53 +40,43 @@ class RabbitMQConnection:
         self.channel = None
         self.connected = False
         self.data_queue = queue.Queue()
+        self.connect_timeout = connect_timeout
+        self.reconnect_interval = reconnect_interval
+        self.reconnect_timeout = reconnect_timeout
+        self.last_reconnect = 0.0  # time.monotonic() of the last reconnection attempt
 
-        # Sleep for a few seconds to allow other components to initialize before connecting to RabbitMQ
-        print("Sleeping for 5 seconds to allow other components to initialize...")
-        time.sleep(5)
-        print("Done sleeping")
-
-        # Establish the RabbitMQ connection
+        # Establish the RabbitMQ connection as soon as the broker is ready
         self.connect()
 
-    def connect(self):
-        """
-        Connect to RabbitMQ and attempt retries in case of connection failure.
-
-        This method is called by the constructor to establish the connection to RabbitMQ.
-        If the connection fails, it will attempt to reconnect with a maximum number of retries.
-        """
-        max_retries = 5
-        retry_interval = 5  # Retry every 5 seconds
-        retry_count = 0
-
-        while not self.is_connected() and retry_count < max_retries:
-            try:
-                # Establish the RabbitMQ connection
-                self.connection = pika.BlockingConnection(
-                    pika.ConnectionParameters(host=self.hostname, port=self.port)
-                )
-                self.channel = self.connection.channel()
-                self.channel.queue_declare(queue=self.queue_name)
-                self.connected = True
-                print("Connection to RabbitMQ established.")
-            except pika.exceptions.AMQPConnectionError as e:
-                print("Failed to connect to RabbitMQ:", e)
-                self.connected = False
-                retry_count += 1
-                if retry_count < max_retries:
-                    print(f"Retrying in {retry_interval} seconds...")
-                    time.sleep(retry_interval)
+    def connect(self, timeout=None):
+        """
+        Connect to RabbitMQ, polling the broker with exponential backoff until it accepts the connection.
+
+        This method is called by the constructor to establish the connection to RabbitMQ, and again after a
+        connection loss.
+
+        Parameters:
+        - timeout (float): The time (in seconds) after which it gives up, connect_timeout if None.
+        """
+        def open_connection():
+            self.connection = pika.BlockingConnection(
+                pika.ConnectionParameters(host=self.hostname, port=self.port)
+            )
+            self.channel = self.connection.channel()
+            self.channel.queue_declare(queue=self.queue_name)
+            return True
+
+        timeout = self.connect_timeout if timeout is None else timeout
+        self.connected = bool(wait_for(open_connection, "RabbitMQ", timeout=timeout))
 
         if not self.is_connected():
             print("Failed to establish connection after retries.")
         else:
+            print("Connection to RabbitMQ established.")
             # Connection successful, publish any queued data
             while not self.data_queue.empty():
-                queued_data = self.data_queue.get()
-                self.channel.basic_publish(exchange='',
-                                           routing_key=self.queue_name,
-                                           body=str(queued_data))
+                queued_data, queued_headers = self.data_queue.get()
+                self.send(queued_data, queued_headers)
                 print("Queued data published to RabbitMQ:", queued_data)
 
     def is_connected(self):
@@ -97,48 +93,66 @@ class RabbitMQConnection:
         Check the connection status and attempt reconnection if necessary.
 
         This method is used to verify the connection status and handle reconnection attempts in case of connection loss.
+        A reconnection is attempted at most once every reconnect_interval seconds and waits reconnect_timeout seconds
+        at most, so a crawl publishing while the broker is down keeps going and queues its data.
         """
-        if not self.is_connected():
+        if not self.is_connected() and time.monotonic() - self.last_reconnect >= self.reconnect_interval:
+            self.last_reconnect = time.monotonic()
             print("Connection lost. Attempting to reconnect...")
-            self.connect()
+            self.connect(timeout=self.reconnect_timeout)
 
-    def publish_data(self, data):
+    def send(self, data, headers=None):
+        """
+        Send a message on the open channel.
+
+        The trace context headers, if any, are stamped with the publish time just before the message is sent,
+        so that data queued during a connection loss reports the time it actually left Container A.
+
+        Parameters:
+        - data (str): The data to be published to the RabbitMQ queue in string format.
+        - headers (dict): The AMQP headers of the message (optional).
+        """
+        properties = None
+        if headers is not None:
+            properties = pika.BasicProperties(headers=dict(headers, published_at=time.time()))
+
+        self.channel.basic_publish(exchange='',
+                                   routing_key=self.queue_name,
+                                   body=str(data),
+                                   properties=properties)
+
+    def publish_data(self, data, headers=None):
         """
         Publish data to RabbitMQ.
 
         Parameters:
         - data (str): The data to be published to the RabbitMQ queue in string format.
+        - headers (dict): The AMQP headers of the message, e.g. the trace context of the notice (optional).
         """
         try:
+            # Reconnect if the connection was lost and no attempt was made recently, queue the data otherwise
+            self.check_connection()
             if not self.is_connected():
                 print("RabbitMQ not connected. Queueing data...")
-                self.data_queue.put(data)
+                self.data_queue.put((data, headers))
                 return
 
-            self.check_connection()
-
-            # Wait until the connection is reestablished
-            while not self.is_connected():
-                time.sleep(1)
-                self.check_connection()
-
             # Publish the queued data first
             while not self.data_queue.empty():
-                queued_data = self.data_queue.get()
-                self.channel.basic_publish(exchange='',
-                                           routing_key=self.queue_name,
-                                           body=str(queued_data))
+                queued_data, queued_headers = self.data_queue.get()
+                self.send(queued_data, queued_headers)
                 print("Queued data published to RabbitMQ:", queued_data)
 
             # Now publish the current data
-            self.channel.basic_publish(exchange='',
-                                       routing_key=self.queue_name,
-                                       body=str(data))
+            self.send(data, headers)
             print("Data published to RabbitMQ:", data)
         except pika.exceptions.AMQPChannelError as e:
             print("Failed to publish data. Channel error:", e)
         except pika.exceptions.AMQPConnectionError as e:
             print("Failed to publish data. Connection error:", e)
+            # Reconnect on the next publish and send the data then
+            self.connected = False
+            self.data_queue.put((data, headers))
         except Exception as e:
             print("An error occurred while publishing data:", e)
 
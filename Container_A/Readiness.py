@@ -0,0 +1,76 @@
+"""
+Readiness.py
+
+This module contains the helpers used to wait for the dependencies of Container A (RabbitMQ) to
+become ready. Instead of sleeping for a fixed time, a readiness check is polled with a fast exponential backoff,
+so the container starts working as soon as its dependencies actually accept connections.
+
+@Author: Nisanur Genc
+
+"""
+
+import time
+
+
+class Backoff:
+    """Exponential backoff delays: initial_delay, 2 * initial_delay, ... capped at max_delay."""
+
+    def __init__(self, initial_delay=0.1, max_delay=5.0):
+        """
+        Initialize the Backoff.
+
+        :param initial_delay: The first delay (in seconds).
+        :type initial_delay: float
+        :param max_delay: The maximum delay (in seconds).
+        :type max_delay: float
+        """
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.delay = initial_delay
+
+    def next_delay(self):
+        """Return the current delay and double it for the next call."""
+        delay = self.delay
+        self.delay = min(self.delay * 2, self.max_delay)
+        return delay
+
+    def sleep(self):
+        """Sleep for the next delay."""
+        time.sleep(self.next_delay())
+
+    def reset(self):
+        """Start again from the initial delay, e.g. after a successful attempt."""
+        self.delay = self.initial_delay
+
+
+def wait_for(check, description, timeout=300, initial_delay=0.1, max_delay=5.0):
+    """
+    Poll a readiness check with exponential backoff until it succeeds or the timeout expires.
+
+    :param check: A callable that returns a truthy value when the dependency is ready. Exceptions count as "not ready".
+    :type check: callable
+    :param description: The name of the dependency, used in the log messages.
+    :type description: str
+    :param timeout: The maximum time to wait (in seconds), None to wait forever.
+    :type timeout: float
+    :return: The value returned by the successful check, or None if the timeout expired.
+    """
+    backoff = Backoff(initial_delay, max_delay)
+    start_time = time.monotonic()
+    attempts = 0
+
+    while True:
+        attempts += 1
+        try:
+            result = check()
+            if result:
+                print(f"{description} is ready after {time.monotonic() - start_time:.2f} seconds ({attempts} attempts).")
+                return result
+        except Exception as e:
+            if attempts == 1:
+                print(f"Waiting for {description}: {str(e)}")
+
+        if timeout is not None and time.monotonic() - start_time >= timeout:
+            print(f"{description} is not ready after {timeout} seconds, giving up.")
+            return None
+        backoff.sleep()
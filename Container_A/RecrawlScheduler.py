@@ -0,0 +1,311 @@
+"""
+RecrawlScheduler.py
+
+This script defines the RecrawlScheduler class, a long-running alternative to the one-shot sweep of
+InterpolDataExtractor.start_extraction. It keeps crawling the partitions of the listing (age intervals, split further
+by gender, wanted-by country, nationality, forename and name initials while they exceed the 160-result cap) and
+learns how often each of them receives new notices:
+
+- every partition keeps an exponentially weighted rate of new notices per hour,
+- a partition is due again once about one new notice is expected in it, within [min_interval, max_interval], so
+  hot partitions are recrawled within minutes and cold ones rarely,
+- among the due partitions, the one with the most expected new notices is crawled first,
+- all the requests (listing pages, image lookups and their retries) are taken from a global budget of requests
+  per hour.
+
+The state of the partitions is saved to a JSON file, so a restart keeps the learned rates.
+
+The scheduler only publishes the notices it has not published since its start: it finds new notices quickly, but
+the changes and withdrawals of known notices are left to the full crawls (the sweep of
+InterpolDataExtractor.start_extraction or DistributedCrawl), which stamp their generation and let Container B delete
+what they did not see.
+
+Dependencies:
+- ManageData: Custom module containing the crawler whose partition crawl is reused
+- Metrics: Custom module defining the Prometheus metrics of the crawler
+- json, os, threading, time: Python modules for the state file and the timing
+
+@Author: Nisanur Genc
+
+"""
+
+import json
+import os
+import string
+import threading
+import time
+from urllib.parse import urlencode
+from ExtractCountries import InterpolCountriesExtractor
+from ManageData import AGE_INTERVALS, GENDERS, PARTITION_PARAMETERS
+from Metrics import NEW_NOTICES_FOUND, RECRAWL_BUDGET_WAIT_SECONDS, SCHEDULED_PARTITIONS
+
+RECRAWL_STATE_PATH = os.environ.get("RECRAWL_STATE_PATH", "recrawl_state.json")
+
+# The filters a partition is split by, in order, once it exceeds the 160-result cap
+SPLIT_PARAMETERS = ["sexId", "arrestWarrantCountryId", "nationality", "forename", "name"]
+PARAMETER_ORDER = PARTITION_PARAMETERS  # ["ageMin", "ageMax"] + SPLIT_PARAMETERS
+
+
+def child_partitions(params, nationalities):
+    """
+    Split the filters of a partition exceeding the 160-result cap by the next filter.
+
+    Parameters:
+    - params (dict): The filters of the partition.
+    - nationalities (list): The country codes, for the wanted-by country and nationality filters.
+
+    Returns:
+    - list: The filters of the child partitions, empty if the partition cannot be split any further.
+    """
+    depth = len(params) - 2
+    if depth >= len(SPLIT_PARAMETERS):
+        return []
+    parameter = SPLIT_PARAMETERS[depth]
+    if parameter == "sexId":
+        values = GENDERS
+    elif parameter in ("arrestWarrantCountryId", "nationality"):
+        values = nationalities
+    else:
+        values = string.ascii_uppercase
+    return [dict(params, **{parameter: value}) for value in values]
+
+
+def partition_key(params):
+    """Return the canonical query string of the filters of a partition."""
+    return urlencode([(name, params[name]) for name in PARAMETER_ORDER if name in params])
+
+
+def partition_values(params):
+    """Return the filters of a partition as the tuple crawled by InterpolDataExtractor.crawl_partition."""
+    return tuple(params[name] for name in PARAMETER_ORDER if name in params)
+
+
+class Partition:
+    """A query of the listing endpoint and what the scheduler learned about it."""
+
+    def __init__(self, params, rate=0.0, last_crawl=0.0, last_total=None):
+        """
+        Parameters:
+        - params (dict): The filters of the partition, e.g. {"ageMin": 30, "ageMax": 30, "sexId": "M"}.
+        - rate (float): The estimated number of new notices per hour.
+        - last_crawl (float): The time of the last crawl (0 if never crawled).
+        - last_total (int): The number of notices reported by the last crawl.
+        """
+        self.params = params
+        self.rate = rate
+        self.last_crawl = last_crawl
+        self.last_total = last_total
+        # New notices found since the last rate update, including those of the pages that the retry queue of the
+        # extractor published after the crawl that deferred them
+        self.new_notices = 0
+
+    @property
+    def key(self):
+        """The canonical query string of the partition."""
+        return partition_key(self.params)
+
+    def to_dict(self):
+        return {"params": self.params, "rate": self.rate, "last_crawl": self.last_crawl, "last_total": self.last_total}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["params"], data.get("rate", 0.0), data.get("last_crawl", 0.0), data.get("last_total"))
+
+
+class RecrawlScheduler:
+    def __init__(self, extractor, requests_per_hour=3600, min_interval=300, max_interval=7 * 24 * 3600,
+                 smoothing=0.3, state_path=RECRAWL_STATE_PATH):
+        """
+        Constructor for the RecrawlScheduler class.
+
+        Parameters:
+        - extractor (InterpolDataExtractor): The crawler used to fetch the listing and publish the new notices.
+        - requests_per_hour (float): The global budget of requests sent to the Interpol API.
+        - min_interval (float): The minimum time (in seconds) between two crawls of a partition.
+        - max_interval (float): The maximum time (in seconds) between two crawls of a partition.
+        - smoothing (float): The weight of the latest crawl in the rate of new notices (0 to 1).
+        - state_path (str): The JSON file in which the state of the partitions is saved.
+        """
+        self.extractor = extractor
+        self.requests_per_hour = requests_per_hour
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.smoothing = smoothing
+        self.state_path = state_path
+        self.partitions = {}
+        self.crawled_this_run = set()  # Keys of the partitions crawled since the start of the process
+        self.nationalities = []
+        self.tokens = 0.0
+        self.tokens_updated = time.monotonic()
+        self.tokens_lock = threading.Lock()  # The pages of a partition can be requested concurrently
+        # Every request of the crawler, retries and image lookups included, is taken from the budget
+        extractor.request_budget = self.take_tokens
+
+    def load_state(self):
+        """Load the partitions from the state file, or start from the age intervals."""
+        try:
+            with open(self.state_path) as state_file:
+                for data in json.load(state_file):
+                    partition = Partition.from_dict(data)
+                    self.partitions[partition.key] = partition
+        except (OSError, ValueError, KeyError) as e:
+            print("No recrawl state loaded:", e)
+
+        if not self.partitions:
+            for age_min, age_max in AGE_INTERVALS:
+                partition = Partition({"ageMin": age_min, "ageMax": age_max})
+                self.partitions[partition.key] = partition
+        SCHEDULED_PARTITIONS.set(len(self.partitions))
+
+    def save_state(self):
+        """Save the partitions to the state file."""
+        try:
+            temporary_path = self.state_path + ".tmp"
+            with open(temporary_path, "w") as state_file:
+                json.dump([partition.to_dict() for partition in self.partitions.values()], state_file)
+            os.replace(temporary_path, self.state_path)
+        except OSError as e:
+            print("Error saving the recrawl state:", e)
+
+    def interval(self, partition):
+        """Return the time (in seconds) after which about one new notice is expected in a partition."""
+        if partition.rate <= 0:
+            return self.max_interval
+        return min(max(3600 / partition.rate, self.min_interval), self.max_interval)
+
+    def next_partition(self, now):
+        """
+        Pick the partition to crawl next.
+
+        Returns:
+        - tuple: (partition, seconds to wait before it is due); never crawled partitions come first.
+        """
+        best, best_score, next_due = None, None, None
+        for partition in self.partitions.values():
+            if not partition.last_crawl:
+                return partition, 0
+            due = partition.last_crawl + self.interval(partition)
+            if due <= now:
+                # Expected new notices since the last crawl
+                score = partition.rate * (now - partition.last_crawl) / 3600
+                if best_score is None or score > best_score:
+                    best, best_score = partition, score
+            elif next_due is None or due < next_due[1]:
+                next_due = (partition, due)
+        if best is not None:
+            return best, 0
+        return next_due[0], next_due[1] - now
+
+    def take_tokens(self, count):
+        """Wait until the request budget allows count more requests, then spend them."""
+        refill_per_second = self.requests_per_hour / 3600
+        with self.tokens_lock:
+            while True:
+                now = time.monotonic()
+                # At most a minute of budget can be saved up
+                self.tokens = min(self.tokens + (now - self.tokens_updated) * refill_per_second, refill_per_second * 60)
+                self.tokens_updated = now
+                if self.tokens >= count or self.tokens >= refill_per_second * 60:
+                    self.tokens -= count
+                    return
+                wait = (min(count, refill_per_second * 60) - self.tokens) / refill_per_second
+                RECRAWL_BUDGET_WAIT_SECONDS.inc(wait)
+                time.sleep(wait)
+
+    def split(self, partition):
+        """
+        Replace a partition exceeding the 160-result cap by its child partitions.
+
+        Returns:
+        - bool: False if the partition cannot be split any further.
+        """
+        children = child_partitions(partition.params, self.nationalities)
+        if not children:
+            return False
+
+        del self.partitions[partition.key]
+        for params in children:
+            # The children share the rate of their parent until they have been crawled
+            child = Partition(params, partition.rate / len(children))
+            self.partitions[child.key] = child
+        SCHEDULED_PARTITIONS.set(len(self.partitions))
+        return True
+
+    def crawl(self, partition):
+        """
+        Crawl the pages of a partition, publish the new notices and update its rate.
+
+        The pages go through InterpolDataExtractor.crawl_partition, so a failed page is parked in the retry queue of
+        the extractor instead of being retried in-line.
+
+        Returns:
+        - int: The number of new notices published.
+        """
+        values = partition_values(partition.params)
+        more_than_160 = []
+        # A recrawl is about what changed since the last one, a cached page would hide it
+        self.extractor.crawl_partition(self.extractor.api_url + "?", "scheduled", more_than_160, values,
+                                       publish=lambda notices: self.publish(partition, notices), use_cache=False)
+        # None if the first page was deferred
+        total = self.extractor.partition_totals.pop(values, None)
+        if more_than_160 and self.split(partition):
+            # The children are crawled instead, starting with the next iteration of the scheduler
+            print("Partition split:", partition.key, total)
+            return 0
+
+        new_notices, partition.new_notices = partition.new_notices, 0
+
+        now = time.time()
+        if partition.key in self.crawled_this_run and partition.last_crawl:
+            # The first crawl after a start publishes everything again, it says nothing about the rate
+            hours = max(now - partition.last_crawl, 1) / 3600
+            partition.rate = self.smoothing * (new_notices / hours) + (1 - self.smoothing) * partition.rate
+            NEW_NOTICES_FOUND.inc(new_notices)
+        partition.last_crawl = now
+        if total is not None:
+            partition.last_total = total
+        self.crawled_this_run.add(partition.key)
+        return new_notices
+
+    def publish(self, partition, notices):
+        """
+        Publish the notices of a page of a partition and count the new ones in the partition.
+
+        Counted when they are first seen, so a notice published later (once its image lookup succeeds) counts too.
+        """
+        seen_before = len(self.extractor.cleaned_data)
+        self.extractor.clean_and_publish_data(notices)
+        partition.new_notices += len(self.extractor.cleaned_data) - seen_before
+
+    def run(self, max_crawls=None):
+        """
+        Crawl the partitions as they become due, forever (or max_crawls times).
+
+        Parameters:
+        - max_crawls (int): Stop after this many partition crawls, None to run forever.
+        """
+        self.nationalities = InterpolCountriesExtractor(
+            self.extractor.countries_url, self.extractor.country_catalog_path
+        ).get_extracted_nationalities()
+        self.load_state()
+        self.extractor.phase = "scheduled"
+
+        crawls = 0
+        while max_crawls is None or crawls < max_crawls:
+            partition, wait = self.next_partition(time.time())
+            if wait > 0:
+                time.sleep(min(wait, 60))
+                continue
+
+            try:
+                new_notices = self.crawl(partition)
+                print("Partition crawled:", partition.key, "total", partition.last_total, "new", new_notices,
+                      "rate", round(partition.rate, 3), "next in", round(self.interval(partition)), "s")
+            except Exception as e:
+                print("Error crawling partition", partition.key, ":", e)
+                # Retry later instead of looping on a failing partition
+                partition.last_crawl = time.time()
+            crawls += 1
+            # Failed pages and image lookups of the previous crawls, retried once due
+            self.extractor.retry_queue.process()
+            self.save_state()
@@ -0,0 +1,210 @@
+"""
+ResponseCache.py
+
+This script defines the ResponseCache class, an optional on-disk cache of the listing pages fetched by
+InterpolDataExtractor.fetch_data_with_retry, so that development runs and repeated crawls do not download the same
+pages again:
+
+- the entries are keyed by the normalized URL (lowercase scheme and host, sorted query parameters),
+- every entry is a gzip-compressed JSON file holding the body and the validators (ETag / Last-Modified) of the
+  response,
+- an entry younger than the TTL is served from disk; an expired one is revalidated with a conditional GET, and a
+  304 response renews it without downloading the page again,
+- the least recently used entries are deleted once the cache is larger than its size cap,
+- in offline mode, the cache is replayed without any request, expired entries included; a page missing from the
+  cache is reported as a failed request.
+
+The cache is enabled by setting RESPONSE_CACHE_DIR (see from_environment).
+
+Dependencies:
+- gzip, json, hashlib, os: Python modules for the cache files
+- urllib.parse: Python module for normalizing the URLs
+
+@Author: Nisanur Genc
+
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+RESPONSE_CACHE_TTL = 3600  # Seconds
+RESPONSE_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+
+def normalize_url(url):
+    """
+    Normalize a URL, so that the same query written differently has the same cache key.
+
+    Parameters:
+    - url (str): The URL.
+
+    Returns:
+    - str: The URL with a lowercase scheme and host, sorted query parameters and no fragment.
+    """
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or "/", query, ""))
+
+
+class ResponseCache:
+    def __init__(self, directory, ttl=RESPONSE_CACHE_TTL, max_bytes=RESPONSE_CACHE_MAX_BYTES, offline=False):
+        """
+        Constructor for the ResponseCache class.
+
+        Parameters:
+        - directory (str): The directory of the cache files.
+        - ttl (float): The time (in seconds) during which an entry is served without revalidation.
+        - max_bytes (int): The maximum size of the cache files; the least recently used entries are deleted above it.
+        - offline (bool): Serve the cache only, never send a request.
+        """
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.total_bytes = None  # Size of the cache files, computed on the first write
+
+    @classmethod
+    def from_environment(cls):
+        """
+        Build the cache from the environment variables.
+
+        - RESPONSE_CACHE_DIR: the directory of the cache, the cache is disabled if it is not set.
+        - RESPONSE_CACHE_TTL: the TTL in seconds.
+        - RESPONSE_CACHE_MAX_BYTES: the size cap in bytes.
+        - RESPONSE_CACHE_OFFLINE: "1" to replay the cache without any request.
+
+        Returns:
+        - ResponseCache: The cache, or None if it is disabled.
+        """
+        directory = os.environ.get("RESPONSE_CACHE_DIR")
+        if not directory:
+            return None
+        return cls(
+            directory,
+            ttl=float(os.environ.get("RESPONSE_CACHE_TTL", RESPONSE_CACHE_TTL)),
+            max_bytes=int(os.environ.get("RESPONSE_CACHE_MAX_BYTES", RESPONSE_CACHE_MAX_BYTES)),
+            offline=os.environ.get("RESPONSE_CACHE_OFFLINE") == "1",
+        )
+
+    def path(self, url):
+        """Return the path of the cache file of a URL."""
+        key = hashlib.sha256(normalize_url(url).encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, key[:2], key + ".json.gz")
+
+    def get(self, url):
+        """
+        Read the entry of a URL and mark it as recently used.
+
+        Parameters:
+        - url (str): The URL of the listing page.
+
+        Returns:
+        - dict: The entry (url, fetched_at, etag, last_modified, body), or None if the URL is not cached.
+        """
+        path = self.path(url)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as cache_file:
+                entry = json.load(cache_file)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print("Discarding unreadable cache entry:", path, e)
+            self.delete(path)
+            return None
+        # The modification time orders the entries for the LRU eviction
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry
+
+    def is_fresh(self, entry):
+        """Return True if an entry is younger than the TTL."""
+        return time.time() - entry.get("fetched_at", 0) < self.ttl
+
+    @staticmethod
+    def validators(entry):
+        """Return the conditional request headers of an entry."""
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def put(self, url, body, headers):
+        """
+        Store a response.
+
+        Parameters:
+        - url (str): The URL of the listing page.
+        - body (str): The body of the response.
+        - headers (Mapping): The headers of the response, for the validators.
+        """
+        self.write(url, {
+            "url": normalize_url(url),
+            "fetched_at": time.time(),
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "body": body,
+        })
+
+    def renew(self, url, entry):
+        """Restart the TTL of an entry after a 304 response."""
+        entry["fetched_at"] = time.time()
+        self.write(url, entry)
+
+    def write(self, url, entry):
+        """Write an entry atomically, then evict the least recently used entries above the size cap."""
+        path = self.path(url)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            previous_size = os.path.getsize(path) if os.path.exists(path) else 0
+            temporary_path = path + ".tmp"
+            with gzip.open(temporary_path, "wt", encoding="utf-8") as cache_file:
+                json.dump(entry, cache_file)
+            os.replace(temporary_path, path)
+            if self.total_bytes is None:
+                self.total_bytes = sum(size for _, size, _ in self.entries())
+            else:
+                self.total_bytes += os.path.getsize(path) - previous_size
+        except OSError as e:
+            print("Error writing the response cache:", e)
+            return
+        if self.total_bytes > self.max_bytes:
+            self.evict()
+
+    def entries(self):
+        """Yield (path, size, last use) for every cache file."""
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".json.gz"):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    yield path, stat.st_size, stat.st_mtime
+
+    def evict(self):
+        """Delete the least recently used entries until the cache is 10% below its size cap."""
+        entries = sorted(self.entries(), key=lambda entry: entry[2])
+        self.total_bytes = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for path, size, _ in entries:
+            if self.total_bytes <= target:
+                break
+            if self.delete(path):
+                self.total_bytes -= size
+
+    @staticmethod
+    def delete(path):
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
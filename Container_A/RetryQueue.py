@@ -0,0 +1,200 @@
+"""
+RetryQueue.py
+
+This script defines the RetryQueue class, the deferred retry queue of the crawler. A listing page or an image lookup
+that fails is not retried in-line (which stalled the whole crawl behind one bad URL) but parked in the queue with a
+deadline, and the crawler goes on with the healthy partitions:
+
+- every item is re-attempted once its deadline has passed, with an exponential backoff per item,
+- an item still failing after max_attempts goes to the dead-letter report, a JSON lines file with the URL, the
+  number of attempts and the last error, so the failures can be inspected and replayed,
+- the crawl only waits for the kinds of items it depends on (the listing pages of a tier): the other items are
+  retried when due, and can be released, i.e. given up on without being dropped, when their outcome is needed.
+
+Dependencies:
+- heapq: Python module for ordering the items by deadline
+- json, time, os: Python modules for the dead-letter report and the deadlines
+- Metrics: Custom module defining the Prometheus metrics of the crawler
+
+@Author: Nisanur Genc
+
+"""
+
+import heapq
+import itertools
+import json
+import os
+import time
+from Metrics import DEAD_LETTERS, DEFERRED_ITEMS, RETRY_QUEUE_SIZE
+
+DEAD_LETTER_PATH = os.environ.get("DEAD_LETTER_PATH", "dead_letters.jsonl")
+
+
+class RetryItem:
+    """A failed work item waiting for its next attempt."""
+
+    def __init__(self, kind, url, attempt, context=None, give_up=None):
+        """
+        Parameters:
+        - kind (str): The kind of work, "listing" or "image".
+        - url (str): The URL that failed.
+        - attempt (callable): Retries the work once; returns True when it succeeded, False or raises when it failed.
+        - context (dict): What the dead-letter report should say about the item, e.g. the entity ID.
+        - give_up (callable): Called when the item is dead-lettered, e.g. to publish a notice without its image.
+        """
+        self.kind = kind
+        self.url = url
+        self.attempt = attempt
+        self.context = context or {}
+        self.give_up = give_up
+        self.attempts = 1  # The failed attempt that deferred the item
+        self.last_error = None
+        self.released = False  # Given up on by release(), still re-attempted
+
+
+class RetryQueue:
+    def __init__(self, max_attempts=5, base_delay=120, max_delay=3600, dead_letter_path=DEAD_LETTER_PATH):
+        """
+        Constructor for the RetryQueue class.
+
+        Parameters:
+        - max_attempts (int): The number of attempts of an item, the failed one included, before it is dead-lettered.
+        - base_delay (float): The delay (in seconds) before the first retry, doubled after every failed retry.
+        - max_delay (float): The maximum delay (in seconds) between two attempts.
+        - dead_letter_path (str): The JSON lines file of the dead-letter report, None to keep it in memory only.
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.dead_letter_path = dead_letter_path
+        self.heap = []  # (due time, insertion order, item)
+        self.counter = itertools.count()
+        self.dead_letters = []
+
+    def __len__(self):
+        return len(self.heap)
+
+    def schedule(self, item, now=None):
+        """Push an item with the deadline of its next attempt."""
+        delay = min(self.base_delay * 2 ** (item.attempts - 1), self.max_delay)
+        heapq.heappush(self.heap, ((now or time.time()) + delay, next(self.counter), item))
+        RETRY_QUEUE_SIZE.set(len(self.heap))
+
+    def defer(self, kind, url, attempt, context=None, error=None, give_up=None):
+        """
+        Park a failed work item in the queue.
+
+        Parameters:
+        - kind (str): The kind of work, "listing" or "image".
+        - url (str): The URL that failed.
+        - attempt (callable): Retries the work once, see RetryItem.
+        - context (dict): What the dead-letter report should say about the item.
+        - error (str): Why the first attempt failed.
+        - give_up (callable): Called when the item is dead-lettered.
+        """
+        item = RetryItem(kind, url, attempt, context, give_up)
+        item.last_error = error
+        DEFERRED_ITEMS.labels(kind).inc()
+        print("Deferred", kind, url, "retry in", min(self.base_delay, self.max_delay), "s")
+        self.schedule(item)
+
+    def next_due(self):
+        """Return the deadline of the next item, or None if the queue is empty."""
+        return self.heap[0][0] if self.heap else None
+
+    def pending(self, kinds=None):
+        """Return True if items of the given kinds (None for any kind) are queued."""
+        return any(kinds is None or item.kind in kinds for _, _, item in self.heap)
+
+    def process(self, wait=False, kinds=None):
+        """
+        Re-attempt the items whose deadline has passed.
+
+        Parameters:
+        - wait (bool): Sleep until every item has succeeded or been dead-lettered, e.g. at the end of a tier.
+        - kinds (tuple): The kinds of items waited for, None for all of them. The items of the other kinds are
+          re-attempted when they are due, but never waited for.
+
+        Returns:
+        - int: The number of items that succeeded.
+        """
+        succeeded = 0
+        while self.heap:
+            due, _, item = self.heap[0]
+            now = time.time()
+            if due > now:
+                if not wait or not self.pending(kinds):
+                    break
+                time.sleep(due - now)
+                continue
+
+            heapq.heappop(self.heap)
+            try:
+                done = item.attempt()
+            except Exception as e:
+                done = False
+                item.last_error = str(e)
+            item.attempts += 1
+            if done:
+                succeeded += 1
+            elif item.attempts >= self.max_attempts:
+                self.dead_letter(item)
+            else:
+                self.schedule(item)
+        RETRY_QUEUE_SIZE.set(len(self.heap))
+        return succeeded
+
+    def dead_letter(self, item):
+        """Give up on an item and append it to the dead-letter report."""
+        record = {
+            "kind": item.kind,
+            "url": item.url,
+            "attempts": item.attempts,
+            "last_error": item.last_error,
+            "dead_at": time.time(),
+        }
+        record.update(item.context)
+        self.dead_letters.append(record)
+        DEAD_LETTERS.labels(item.kind).inc()
+        print("Dead-lettered", item.kind, item.url, "after", item.attempts, "attempts:", item.last_error)
+        if not item.released:
+            self.give_up(item)
+        if self.dead_letter_path:
+            try:
+                with open(self.dead_letter_path, "a", encoding="utf-8") as report:
+                    report.write(json.dumps(record) + "\n")
+            except OSError as e:
+                print("Error writing the dead-letter report:", e)
+
+    def give_up(self, item):
+        """Call the give_up callback of an item, if any."""
+        if item.give_up is None:
+            return
+        try:
+            item.give_up()
+        except Exception as e:
+            print("Error giving up on", item.kind, item.url, ":", e)
+
+    def release(self, kind):
+        """
+        Give up on the queued items of a kind without dropping them, e.g. to publish the notices still waiting for
+        their image before a partition is acknowledged. The items keep being re-attempted until they succeed or are
+        dead-lettered, and are not given up on a second time.
+
+        Parameters:
+        - kind (str): The kind of the items, e.g. "image".
+
+        Returns:
+        - int: The number of items released.
+        """
+        released = 0
+        for _, _, item in self.heap:
+            if item.kind == kind and not item.released:
+                item.released = True
+                self.give_up(item)
+                released += 1
+        return released
+
+    def dead_letter_count(self, kind=None):
+        """Return the number of dead-lettered items, of one kind or of all kinds."""
+        return sum(1 for record in self.dead_letters if kind is None or record["kind"] == kind)
@@ -10,13 +10,23 @@ This module contains the RabbitMQConsumer class responsible for consuming data f
 import json
 import pika
 import time
+from readiness import Backoff, wait_for
+from metrics import DECODE_FAILURES, MESSAGES_CONSUMED
+from tracing import start_trace
+
+
+def header_value(headers, key):
+    """Return an AMQP header value, with the byte strings decoded (None if the header is missing)."""
+    value = headers.get(key)
+    return value.decode() if isinstance(value, bytes) else value
+
 
 class RabbitMQConsumer:
     """
     Class for consuming data from RabbitMQ, processing it, and storing it in the PostgreSQL database.
     """
         
-    def __init__(self, hostname, port, queue_name, db_registrar):
+    def __init__(self, hostname, port, queue_name, db_registrar, connect_timeout=300):
         """
         Constructor for the RabbitMQConsumer class.
 
@@ -28,6 +38,8 @@ class RabbitMQConsumer:
         :type queue_name: str
         :param db_registrar: The instance of DBRegistrar for storing data in the database.
         :type db_registrar: db_registrar.DBRegistrar
+        :param connect_timeout: The maximum time (in seconds) to wait for RabbitMQ to accept connections.
+        :type connect_timeout: float
         """
 
         self.hostname = hostname
@@ -37,51 +49,33 @@ class RabbitMQConsumer:
         self.channel = None
         self.connected = False
         self.db_registrar = db_registrar  # Store the db_registrar instance
+        self.connect_timeout = connect_timeout
 
-        # Sleep for a few seconds to allow other components to initialize before connecting to RabbitMQ
-        print("Sleeping for 25 seconds to allow other components to initialize...")
-        time.sleep(25)
-        print("Done sleeping")
-
-        # Establish the RabbitMQ connection
+        # Establish the RabbitMQ connection as soon as the broker is ready
         self.connect()
 
 
     def connect(self):
         """
-        Connect to RabbitMQ and attempt retries in case of connection failure.
+        Connect to RabbitMQ, polling the broker with exponential backoff until it accepts the connection.
 
-        This method is called by the constructor to establish the connection to RabbitMQ.
-        If the connection fails, it will attempt to reconnect with a maximum number of retries.
+        This method is called by the constructor to establish the connection to RabbitMQ, and again after a
+        connection loss. It gives up after connect_timeout seconds.
         """
-        
-        max_retries = 5
-        retry_interval = 5  # Retry every 5 seconds
-        retry_count = 0
+        def open_connection():
+            self.connection = pika.BlockingConnection(
+                pika.ConnectionParameters(host=self.hostname, port=self.port)
+            )
+            self.channel = self.connection.channel()
+            self.channel.queue_declare(queue=self.queue_name)
+            return True
 
-        while not self.is_connected() and retry_count < max_retries:
-            try:
-                # Establish the RabbitMQ connection
-                self.connection = pika.BlockingConnection(
-                    pika.ConnectionParameters(host=self.hostname, port=self.port)
-                )
-                self.channel = self.connection.channel()
-                self.channel.queue_declare(queue=self.queue_name)
-                self.connected = True
-                print("Connection to RabbitMQ established.")
-            except pika.exceptions.AMQPConnectionError as e:
-                print("Failed to connect to RabbitMQ:", e)
-                self.connected = False
-                retry_count += 1
-                if retry_count < max_retries:
-                    print(f"Retrying in {retry_interval} seconds...")
-                    time.sleep(retry_interval)
+        self.connected = bool(wait_for(open_connection, "RabbitMQ", timeout=self.connect_timeout))
 
         if not self.is_connected():
             print("Failed to establish connection after retries.")
         else:
-            # Connection successful, start consuming data
-            self.consume_data()
+            print("Connection to RabbitMQ established.")
         
 
     def is_connected(self):
@@ -109,17 +103,20 @@ class RabbitMQConsumer:
 
         This method will handle reconnections and consume data from RabbitMQ using the callback function.
         """
-    
-        print("Sleeping for 5 seconds to allow other components to initialize...")
-        time.sleep(5)
-        print("Done sleeping")
-        connection_parameters = pika.ConnectionParameters(self.hostname, self.port)
-        connection = pika.BlockingConnection(connection_parameters)
-        channel = connection.channel()
-        channel.queue_declare(queue=self.queue_name)
-
+        reconnect_backoff = Backoff(initial_delay=0.5, max_delay=30.0)
 
         def callback(ch, method, properties, body):
+            MESSAGES_CONSUMED.inc()
+            headers = properties.headers or {}
+            generation = header_value(headers, 'generation')
+            generation = int(generation) if generation is not None else None
+
+            # End-of-crawl marker: every notice of the generation has been consumed before it
+            if header_value(headers, 'control') == 'generation_complete':
+                self.db_registrar.sweep_generation(generation)
+                return
+
+            trace = start_trace(properties.headers)
             try:
                 # Attempt to decode the message body as JSON
                 try:
@@ -131,10 +128,11 @@ class RabbitMQConsumer:
                     data = json.loads(fixed_body_str)
 
                 # Process the data
-                self.get_data(data)
+                self.get_data(data, trace, generation)
 
 
             except json.JSONDecodeError as e:
+                DECODE_FAILURES.inc()
                 print(f"Error decoding JSON message in Consumer: {str(e)}")
                 # If JSON decoding fails, print the received body to investigate the issue
                 print("Received Message Body (Failed to Decode) in Consumer:", body.decode())
@@ -146,6 +144,9 @@ class RabbitMQConsumer:
             try:
                 # Check the connection status and reconnect if necessary
                 self.check_connection()
+                if not self.is_connected():
+                    reconnect_backoff.sleep()
+                    continue
 
                 # Set up the callback function to consume messages from the queue
                 self.channel.basic_consume(queue=self.queue_name,
@@ -153,20 +154,23 @@ class RabbitMQConsumer:
                                            on_message_callback=callback)
 
                 print("Starting consuming")
+                reconnect_backoff.reset()
                 self.channel.start_consuming()
 
             except pika.exceptions.AMQPError as e:
                 print(f"Error consuming data from RabbitMQ: {e}")
-                print("Retrying in 5 seconds...")
-                time.sleep(5)
+                self.connected = False
+                delay = reconnect_backoff.next_delay()
+                print(f"Reconnecting in {delay:.1f} seconds...")
+                time.sleep(delay)
 
 
 
-    def get_data(self, data):
-        """Process the data (called by the callback function) and store it in the database."""
+    def get_data(self, data, trace=None, generation=None):
+        """Process the data (called by the callback function) and store it in the database, with its trace context and crawl generation."""
         try:
             # Call the callback function to handle the data
-            self.db_registrar.store_data_to_my_db(data)
+            self.db_registrar.store_data_to_my_db(data, trace=trace, generation=generation)
 
         except json.JSONDecodeError as e:
             print(f"Error decoding JSON message in Consumer: {str(e)}")
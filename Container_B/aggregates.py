@@ -0,0 +1,150 @@
+"""
+aggregates.py
+
+This module maintains the summary table of the Person records (PersonAggregate) and builds the statistics served by
+/aggregates. Every write of the Person table adjusts the counts of the records it adds and removes in the same
+transaction, so reading the statistics or the total number of records never scans the Person table:
+
+- 'total': the number of records,
+- 'nationality': the number of records per nationality code,
+- 'birth_year': the number of records per year of birth ('unknown' if the date of birth could not be parsed).
+
+The age bands are derived from the birth years when the statistics are read, so they do not go stale as the
+records get older.
+
+@Author: Nisanur Genc
+
+"""
+
+import datetime
+import json
+from collections import Counter
+from sqlalchemy.dialects.postgresql import insert
+
+TOTAL = 'total'
+NATIONALITY = 'nationality'
+BIRTH_YEAR = 'birth_year'
+UNKNOWN = 'unknown'
+AGE_BANDS = [(0, 17), (18, 24), (25, 34), (35, 44), (45, 54), (55, 64), (65, None)]  # Inclusive, in years
+
+# Recomputes the whole summary table from the Person table, after a bulk load and in the migration
+REBUILD_SQL = [
+    'DELETE FROM person_aggregate',
+    "INSERT INTO person_aggregate (dimension, value, count) "
+    "SELECT 'total', '', count(*) FROM person "
+    "UNION ALL "
+    "SELECT 'nationality', nationality, count(DISTINCT entity_id) "
+    "FROM person, json_array_elements_text(person.nationalities::json) AS nationality GROUP BY nationality "
+    "UNION ALL "
+    "SELECT 'birth_year', coalesce(extract(year FROM birth_date)::int::text, 'unknown'), count(*) FROM person GROUP BY 2",
+]
+
+
+def aggregate_keys(nationalities, birth_date):
+    """
+    Return the summary table keys that a record counts towards.
+
+    :param nationalities: The JSON list of nationality codes, as stored in the nationalities column.
+    :type nationalities: str
+    :param birth_date: The parsed date of birth, or None.
+    :type birth_date: datetime.date
+    :return: The (dimension, value) keys.
+    :rtype: list
+    """
+    keys = [(TOTAL, '')]
+    try:
+        codes = json.loads(nationalities) if nationalities else []
+    except ValueError:
+        codes = []
+    keys.extend((NATIONALITY, code) for code in sorted(set(codes)))
+    keys.append((BIRTH_YEAR, str(birth_date.year) if birth_date is not None else UNKNOWN))
+    return keys
+
+
+def adjust_aggregates(db, aggregate_model, added=(), removed=()):
+    """
+    Apply the count changes of a write to the summary table, in the current transaction.
+
+    The keys of a record that is replaced by itself cancel out, so an unchanged record costs no write.
+
+    :param db: The SQLAlchemy database instance.
+    :type db: flask_sqlalchemy.SQLAlchemy
+    :param aggregate_model: The PersonAggregate model class.
+    :type aggregate_model: class
+    :param added: The keys of the records added, see aggregate_keys(), one entry per record.
+    :type added: iterable
+    :param removed: The keys of the records removed.
+    :type removed: iterable
+    """
+    deltas = Counter(added)
+    deltas.subtract(Counter(removed))
+    rows = [
+        {'dimension': dimension, 'value': value, 'count': delta}
+        for (dimension, value), delta in sorted(deltas.items()) if delta
+    ]
+    if not rows:
+        return
+
+    table = aggregate_model.__table__
+    statement = insert(table).values(rows)
+    db.session.execute(statement.on_conflict_do_update(
+        index_elements=[table.c.dimension, table.c.value],
+        set_={'count': table.c.count + statement.excluded.count},
+    ))
+
+
+def age_band_label(age_min, age_max):
+    return f"{age_min}-{age_max}" if age_max is not None else f"{age_min}+"
+
+
+def aggregate_statistics(db, aggregate_model, today=None):
+    """
+    Read the statistics from the summary table.
+
+    :param db: The SQLAlchemy database instance.
+    :type db: flask_sqlalchemy.SQLAlchemy
+    :param aggregate_model: The PersonAggregate model class.
+    :type aggregate_model: class
+    :param today: The reference date of the age bands, defaults to the current date.
+    :type today: datetime.date
+    :return: The total number of records and the counts per nationality, birth year and age band.
+    :rtype: dict
+    """
+    today = today or datetime.date.today()
+    table = aggregate_model.__table__
+    rows = db.session.execute(
+        db.select(table.c.dimension, table.c.value, table.c.count).where(table.c.count > 0)
+    ).all()
+
+    statistics = {'total_people': 0, 'nationalities': {}, 'birth_years': {}}
+    for dimension, value, count in rows:
+        if dimension == TOTAL:
+            statistics['total_people'] = count
+        elif dimension == NATIONALITY:
+            statistics['nationalities'][value] = count
+        elif dimension == BIRTH_YEAR:
+            statistics['birth_years'][value] = count
+
+    age_bands = {age_band_label(age_min, age_max): 0 for age_min, age_max in AGE_BANDS}
+    age_bands[UNKNOWN] = 0
+    for year, count in statistics['birth_years'].items():
+        if year == UNKNOWN:
+            age_bands[UNKNOWN] += count
+            continue
+        # The age reached this year, so a band may include people born up to a year too late
+        age = today.year - int(year)
+        for age_min, age_max in AGE_BANDS:
+            if age >= age_min and (age_max is None or age <= age_max):
+                age_bands[age_band_label(age_min, age_max)] += count
+                break
+    statistics['age_bands'] = age_bands
+    return statistics
+
+
+def total_people(db, aggregate_model):
+    """Return the number of Person records from the summary table."""
+    table = aggregate_model.__table__
+    count = db.session.execute(
+        db.select(table.c.count).where(table.c.dimension == TOTAL, table.c.value == '')
+    ).scalar()
+    return count or 0
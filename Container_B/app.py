@@ -1,8 +1,9 @@
 """
 app.py
 
-This script defines a Flask web application with a PostgreSQL database. It includes functionalities to consume data from a RabbitMQ queue,
-store it in the database, and provide endpoints for retrieving and filtering the data. The application also serves static files and images.
+This script defines the Flask web application factory with a PostgreSQL database. It provides endpoints for retrieving and filtering
+the data stored by the RabbitMQ consumer process (consumer.py), and serves static files and images. In production the application
+runs behind a multi-worker server, see wsgi.py and gunicorn.conf.py.
 
 @Author: Nisanur Genc
 
@@ -10,84 +11,293 @@ store it in the database, and provide endpoints for retrieving and filtering the
 
 
 
+import datetime
+import hashlib
 import json
-from RabbitMQConsumer import RabbitMQConsumer
-from db_registrar import DBRegistrar
-from readFile import read_country_data
-from flask import Flask, render_template, request, send_from_directory, jsonify
-from flask_sqlalchemy import SQLAlchemy
-import threading
+import os
+import queue
+import time
+from birth_dates import MAX_AGE, birth_date_range_for_age
+from name_index import NameIndex
+from change_events import ChangeBroadcaster
+from change_follower import ChangeFollower
+from aggregates import aggregate_statistics, total_people
+from models import (my_db, Person, PersonAggregate, PersonChange, PersonDetail, current_change_seq, first_change_seq,
+                    migrate_database)
+from notice_details import DetailUnavailable, NoticeDetails
+from read_model import build_person_view, json_array, parse_fields, serialize_view
+from readiness import wait_for
+from metrics import REQUEST_LATENCY, metrics_payload
+from readFile import read_country_catalog
+from flask import Blueprint, Flask, Response, current_app, g, render_template, request, send_from_directory, jsonify, stream_with_context
+from flask_migrate import Migrate
 
 
-app = Flask(__name__, static_url_path='/static', static_folder='static')
 # Used PostgreSQL instead of SQLite
-
-app.config['SQLALCHEMY_DATABASE_URI'] = 'postgresql://postgres:bxhrYukUTq/6SJGSKvZzH/gCFyn/d5iaHraBuLBvznI=@postgres:5432/my_db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-my_db = SQLAlchemy(app)
-COUNTRY_NAMES = read_country_data("countries.txt")
-
-
-class Person(my_db.Model):
-    """Model class representing a Person entity in the database."""
-    forename = my_db.Column(my_db.String(100))
-    date_of_birth = my_db.Column(my_db.String(100))
-    entity_id = my_db.Column(my_db.String(100), primary_key=True)
-    nationalities = my_db.Column(my_db.String(1000))
-    name = my_db.Column(my_db.String(100))
-    image = my_db.Column(my_db.String(1000))
-
-    def __repr__(self):
-            return f"Person(forename={self.forename}, date_of_birth={self.date_of_birth}, " \
-                f"entity_id={self.entity_id}, nationalities={self.nationalities}, " \
-                f"name={self.name}, image={self.image}"
-
-
-
-def clean_database():
-    """Clean the whole database by deleting all records."""
-    my_db.session.query(Person).delete()
-    my_db.session.commit()
-    print("Database cleaned")
-
-
-@app.route('/images/<path:filename>')
+DATABASE_URI = os.environ.get('DATABASE_URL', 'postgresql://postgres:bxhrYukUTq/6SJGSKvZzH/gCFyn/d5iaHraBuLBvznI=@postgres:5432/my_db')
+COUNTRY_NAMES = read_country_catalog()
+NAME_INDEX = NameIndex()
+# Every /events client holds a request thread of its worker for as long as it is connected, so only part of the
+# threads (see gunicorn.conf.py) may serve them and the others remain for the regular requests
+SSE_MAX_SUBSCRIBERS = int(os.environ.get('SSE_MAX_SUBSCRIBERS', max(1, int(os.environ.get('GUNICORN_THREADS', 16)) // 2)))
+CHANGE_EVENTS = ChangeBroadcaster(max_subscribers=SSE_MAX_SUBSCRIBERS)
+NOTICE_DETAILS = NoticeDetails(my_db, PersonDetail)
+SSE_KEEPALIVE_SECONDS = 15
+SSE_RETRY_MILLISECONDS = 30000  # Reconnection delay sent to the clients turned away by SSE_MAX_SUBSCRIBERS
+STREAM_CHUNK_ROWS = 1000  # Rows fetched from the server-side cursor and serialized at a time by the read endpoints
+MAX_PAGE_ROWS = 1000  # Largest 'limit' of a paginated read request
+MAX_SEARCH_RESULTS = 100  # Largest 'limit' of a /search request
+
+views = Blueprint('views', __name__)
+
+
+def create_app(engine_options=None, follow_changes=False, migrate=False):
+    """
+    Application factory shared by the web server and the standalone consumer process.
+
+    :param engine_options: The SQLAlchemy engine options (pool sizes etc.) of the process.
+    :type engine_options: dict
+    :param follow_changes: Whether to load the name index and follow the change log in a background thread,
+        which the web workers need for /search and /events.
+    :type follow_changes: bool
+    :param migrate: Whether to wait for PostgreSQL and bring the schema up to date (see models.migrate_database)
+        before the application, and its change follower, use it.
+    :type migrate: bool
+    :return: The configured Flask application.
+    :rtype: flask.Flask
+    """
+    app = Flask(__name__, static_url_path='/static', static_folder='static')
+    app.config['SQLALCHEMY_DATABASE_URI'] = DATABASE_URI
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options or {}
+    my_db.init_app(app)
+    Migrate(app, my_db, directory=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations'))
+    app.register_blueprint(views)
+    app.before_request(start_request_timer)
+    app.after_request(observe_request_latency)
+
+    if migrate:
+        with app.app_context():
+            wait_for(lambda: my_db.session.execute(my_db.text('SELECT 1')), "PostgreSQL")
+            my_db.session.remove()
+            migrate_database()
+
+    if follow_changes:
+        follower = ChangeFollower(app, my_db, Person, PersonChange, NAME_INDEX, CHANGE_EVENTS)
+        app.extensions['change_follower'] = follower
+        follower.start()
+
+    return app
+
+
+def start_request_timer():
+    """Record the start time of the request for the latency metric."""
+    g.request_start_time = time.perf_counter()
+
+
+def observe_request_latency(response):
+    """Observe the request latency, labelled with the route template to keep the number of series bounded."""
+    start_time = g.pop('request_start_time', None)
+    if start_time is not None:
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        REQUEST_LATENCY.labels(request.method, route, response.status_code).observe(time.perf_counter() - start_time)
+    return response
+
+
+def json_response(body, etag=None):
+    """Wrap an already serialized JSON body in a response, optionally tagged with an ETag."""
+    response = Response(body, mimetype='application/json')
+    if etag is not None:
+        response.set_etag(etag)
+    return response
+
+
+def snapshot_etag(*parts):
+    """Build the ETag of a snapshot response from the latest change sequence and the request parameters."""
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def not_modified(etag):
+    """Return an empty 304 response if the client already has the snapshot with this ETag, otherwise None."""
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+    return None
+
+
+def requested_fields():
+    """
+    Parse the 'fields' projection of a read request, from the query string or the form.
+
+    :return: The requested fields, or None for the whole documents.
+    :raises ValueError: If a field is unknown.
+    """
+    return parse_fields(request.values.get('fields'))
+
+
+def requested_page():
+    """
+    Parse the optional 'offset' and 'limit' pagination of a read request, from the query string or the form.
+
+    :return: (offset, limit), limit is None if the request is not paginated.
+    :rtype: tuple
+    """
+    # Empty or non-numeric values are ignored (type=int returns the default for them)
+    offset = max(request.values.get('offset', 0, type=int), 0)
+    limit = request.values.get('limit', type=int)
+    if limit is not None:
+        limit = max(1, min(limit, MAX_PAGE_ROWS))
+    return offset, limit
+
+
+def requested_int(name, lowest, highest):
+    """
+    Parse an optional integer parameter of a request, from the query string or the form, and check its range.
+
+    :param name: The name of the parameter.
+    :type name: str
+    :param lowest: The smallest accepted value.
+    :type lowest: int
+    :param highest: The largest accepted value.
+    :type highest: int
+    :return: The value, or None if it is empty or not numeric.
+    :raises ValueError: If the value is out of range.
+    """
+    # Empty or non-numeric values are ignored (type=int returns None for them)
+    value = request.values.get(name, type=int)
+    if value is not None and not lowest <= value <= highest:
+        raise ValueError(f"'{name}' must be between {lowest} and {highest}")
+    return value
+
+
+def select_people(fields, conditions=(), offset=0, limit=None):
+    """
+    Build the Core select of a read endpoint, projected on the requested fields.
+
+    :param fields: The requested fields, or None to select the stored read model documents.
+    :type fields: list
+    :param conditions: The filter conditions.
+    :type conditions: iterable
+    :param offset: The number of records skipped, if paginated.
+    :type offset: int
+    :param limit: The number of records of the page, or None for all the records.
+    :type limit: int
+    """
+    if fields is None:
+        columns = [Person.document]
+    else:
+        columns = [Person.__table__.c[field] for field in fields]
+    query = my_db.select(*columns).where(*conditions)
+    if limit is not None:
+        # Pages are only stable in a fixed order, the primary key index serves it
+        query = query.order_by(Person.entity_id).offset(offset).limit(limit)
+    return query
+
+
+def count_people(conditions=()):
+    """Return the number of records matching the filter conditions."""
+    if not conditions:
+        # Maintained by every write, see aggregates.py
+        return total_people(my_db, PersonAggregate)
+    return my_db.session.execute(my_db.select(my_db.func.count()).select_from(Person).where(*conditions)).scalar()
+
+
+def stream_documents(engine, query, fields):
+    """
+    Yield the rows of a read query as serialized JSON documents, comma-separated, one chunk of rows at a time.
+
+    The rows are plain tuples read from a server-side cursor, so neither the ORM identity map nor the whole
+    result set is held in memory.
+
+    :param engine: The engine of the application, taken in the request context.
+    :param query: The select built by select_people().
+    :param fields: The requested fields, or None if the query selects the stored documents.
+    :type fields: list
+    """
+    separator = ''
+    with engine.connect() as connection:
+        result = connection.execution_options(stream_results=True).execute(query)
+        for rows in result.partitions(STREAM_CHUNK_ROWS):
+            if fields is None:
+                documents = [document for document, in rows]
+            else:
+                documents = [serialize_view(build_person_view(row._mapping, COUNTRY_NAMES, fields)) for row in rows]
+            yield separator + ','.join(documents)
+            separator = ','
+
+
+def stream_json_array(prefix, documents, suffix):
+    """Yield a JSON body made of a prefix, the streamed documents as an array, and a suffix."""
+    yield prefix + '['
+    yield from documents
+    yield ']' + suffix
+
+
+def invalid_request(message):
+    """Return a 400 response with the error message."""
+    return jsonify(error=message), 400
+
+
+@views.route('/images/<path:filename>')
 def serve_image(filename):
     """Serve images from the 'image_data' directory."""
     return send_from_directory('./image_data', filename)
 
 
-@app.route('/live_data', methods=['POST'])
+@views.route('/live_data', methods=['GET', 'POST'])
 def live_data():
-    """Retrieve live data from the database and return it in JSON format."""
-    total_people = Person.query.count()
-    people = Person.query.all()
-
-    # Format the nationalities field from JSON string to a list of country names
-    for person in people:
-        nationalities_list = json.loads(person.nationalities)
-        person.nationalities = [COUNTRY_NAMES.get(country_code, country_code) for country_code in nationalities_list]
-
-    # Convert the SQLAlchemy objects to dictionaries for JSON serialization
-    data = [person.__dict__ for person in people]
-    
-    # Remove any unnecessary keys (e.g., '_sa_instance_state') from the dictionary
-    for person_data in data:
-        person_data.pop('_sa_instance_state', None)
-
-    # Return the live data in JSON format
-    return jsonify(total_people=total_people, data=data)
-
-
-@app.route('/')
+    """
+    Retrieve live data from the database and return it in JSON format.
+
+    The optional 'fields' parameter (e.g. fields=entity_id,name) limits the returned fields of every record. With
+    the optional 'limit' and 'offset' parameters only one page of records, ordered by entity ID, is returned.
+    """
+    try:
+        fields = requested_fields()
+    except ValueError as e:
+        return invalid_request(str(e))
+    offset, limit = requested_page()
+
+    # Read the sequence before the rows, so a client syncing from 'last_seq' can only see changes twice, never miss one
+    last_seq = current_change_seq()
+    etag = snapshot_etag('live_data', last_seq, fields, offset, limit)
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+
+    total_people = count_people()
+
+    # The stored read model documents are streamed as they are, without building any Person objects
+    body = stream_json_array(
+        f'{{"total_people":{total_people},"last_seq":{last_seq},"offset":{offset},"data":',
+        stream_documents(my_db.engine, select_people(fields, offset=offset, limit=limit), fields),
+        '}',
+    )
+    return json_response(body, etag)
+
+
+@views.route('/')
 def index():
     """Render the index.html template for the home page."""
-    return render_template('index.html')
+    return render_template('index.html', countries=COUNTRY_NAMES.items())
 
 
-@app.route('/filter', methods=['POST'])
+@views.route('/filter', methods=['POST'])
 def filter_data():
-    """Filter the data based on the provided criteria and return the filtered results in JSON format."""
+    """
+    Filter the data based on the provided criteria and return the filtered results in JSON format.
+
+    The optional 'fields' parameter (e.g. fields=entity_id,name) limits the returned fields of every record. With
+    the optional 'limit' and 'offset' parameters only one page of the results, ordered by entity ID, is returned,
+    together with the 'total' number of results.
+    """
+    try:
+        fields = requested_fields()
+    except ValueError as e:
+        return invalid_request(str(e))
+    offset, limit = requested_page()
+
     forename = request.form.get('name')
     date_of_birth = request.form.get('date_of_birth')
     entity_id = request.form.get('entity_id')
@@ -95,63 +305,233 @@ def filter_data():
     name = request.form.get('forename')
     image = request.form.get('image')
 
+    # Out of range values would not make a valid date
+    try:
+        birth_year_min = requested_int('birth_year_min', datetime.MINYEAR, datetime.MAXYEAR - 1)
+        birth_year_max = requested_int('birth_year_max', datetime.MINYEAR, datetime.MAXYEAR - 1)
+        age_min = requested_int('age_min', 0, MAX_AGE)
+        age_max = requested_int('age_max', 0, MAX_AGE)
+    except ValueError as e:
+        return invalid_request(str(e))
+
+    # Age filters depend on the current date, so it is part of the ETag
+    etag = snapshot_etag('filter', current_change_seq(), sorted(request.form.items()), fields, offset, limit, datetime.date.today())
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+
     # Filter the data based on the provided criteria
-    filtered_data = Person.query
+    conditions = []
     if forename:
-        filtered_data = filtered_data.filter(Person.forename.ilike(f"%{forename}%"))
+        conditions.append(Person.forename.ilike(f"%{forename}%"))
     if date_of_birth:
-        filtered_data = filtered_data.filter(Person.date_of_birth.ilike(f"%{date_of_birth}%"))
+        conditions.append(Person.date_of_birth.ilike(f"%{date_of_birth}%"))
     if entity_id:
-        filtered_data = filtered_data.filter(Person.entity_id.ilike(f"%{entity_id}%"))
+        conditions.append(Person.entity_id.ilike(f"%{entity_id}%"))
     if nationalities:
-        filtered_data = filtered_data.filter(Person.nationalities.ilike(f"%{nationalities}%"))
+        conditions.append(Person.nationalities.ilike(f"%{nationalities}%"))
     if name:
-        filtered_data = filtered_data.filter(Person.name.ilike(f"%{name}%"))
+        conditions.append(Person.name.ilike(f"%{name}%"))
     if image:
-        filtered_data = filtered_data.filter(Person.image == image)
-
-    results = filtered_data.all()
-
-    # Format the nationalities field from JSON string to list of country names
-    for person in results:
-        nationalities_list = json.loads(person.nationalities) 
-        person.nationalities = [COUNTRY_NAMES.get(country_code, country_code) for country_code in nationalities_list]
-
-    # Convert the SQLAlchemy objects to dictionaries for JSON serialization
-    data = [person.__dict__ for person in results]
-
-    # Remove any unnecessary keys (e.g., '_sa_instance_state') from the dictionary
-    for person_data in data:
-        person_data.pop('_sa_instance_state', None)
+        conditions.append(Person.image == image)
+
+    # Birth year and age ranges become range conditions on the indexed birth_date column
+    if birth_year_min is not None:
+        conditions.append(Person.birth_date >= datetime.date(birth_year_min, 1, 1))
+    if birth_year_max is not None:
+        conditions.append(Person.birth_date < datetime.date(birth_year_max + 1, 1, 1))
+    if age_min is not None or age_max is not None:
+        lower, upper = birth_date_range_for_age(age_min, age_max)
+        if lower is not None:
+            conditions.append(Person.birth_date >= lower)
+        if upper is not None:
+            conditions.append(Person.birth_date < upper)
 
     # Return the filtered results in JSON format
-    return jsonify(data=data)
-
-
-
-def start_rabbitmq_consumer():
-    """Start the RabbitMQConsumer in a separate thread."""
-    db_registrar = DBRegistrar(Person, my_db)  # Pass the Person model class and the database instance
-    rabbitmq_consumer = RabbitMQConsumer(hostname="container_c", port=5672, queue_name="interpol_data", db_registrar=db_registrar)
-    rabbitmq_consumer.consume_data()
+    prefix = '{"data":' if limit is None else f'{{"total":{count_people(conditions)},"offset":{offset},"data":'
+    body = stream_json_array(prefix, stream_documents(my_db.engine, select_people(fields, conditions, offset, limit), fields), '}')
+    return json_response(body, etag)
+
+
+@views.route('/person/<path:entity_id>', methods=['GET'])
+def person_detail(entity_id):
+    """
+    Return a record together with the full detail document of its notice.
+
+    The detail document is fetched from the Interpol API on the first view and cached, see notice_details.py;
+    'stale' is true if it has expired and could not be refreshed.
+    """
+    document = my_db.session.execute(
+        my_db.select(Person.document).where(Person.entity_id == entity_id)
+    ).scalar()
+    if document is None:
+        return jsonify(error="not found"), 404
+
+    try:
+        detail = NOTICE_DETAILS.lookup(entity_id)
+    except DetailUnavailable as e:
+        return jsonify(error=f"notice detail unavailable: {str(e)}"), 502
+    if detail is None:
+        return jsonify(error="notice detail not found"), 404
+
+    detail_document, fetched_at, stale = detail
+    etag = snapshot_etag('person', entity_id, document, fetched_at)
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+    return json_response(
+        f'{{"person":{document},"detail":{detail_document},'
+        f'"fetched_at":{json.dumps(fetched_at.isoformat())},"stale":{json.dumps(stale)}}}',
+        etag,
+    )
+
+
+@views.route('/aggregates', methods=['GET'])
+def aggregates():
+    """
+    Return the record counts in total, per nationality, per birth year and per age band.
+
+    The counts are read from the summary table maintained by the consumer, so they cost the same at any number of
+    records. They also serve as the facet counts of the filter form.
+    """
+    # Age bands depend on the current date, so it is part of the ETag
+    etag = snapshot_etag('aggregates', current_change_seq(), datetime.date.today())
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+    return json_response(json.dumps(aggregate_statistics(my_db, PersonAggregate)), etag)
+
+
+@views.route('/changes', methods=['GET'])
+def changes():
+    """
+    Return the records changed since the 'since' sequence number, for incremental client sync.
+
+    Only the latest change of each entity is returned. Clients pass the returned 'last_seq' as 'since' on the next
+    call; 'has_more' is true if the page was truncated by 'limit'. If the table was wiped in the meantime, or the
+    changes after 'since' were pruned from the log, 'reset' is true and the client has to reload the snapshot from
+    /live_data.
+    """
+    since = request.args.get('since', 0, type=int)
+    limit = max(1, min(request.args.get('limit', 1000, type=int), 10000))
+
+    entries = PersonChange.query.filter(PersonChange.seq > since).order_by(PersonChange.seq).limit(limit).all()
+    if not entries:
+        return jsonify(last_seq=since, reset=False, has_more=False, changes=[])
+
+    last_seq = entries[-1].seq
+    has_more = len(entries) == limit
+    # A gap after 'since' is either a rolled back write or pruned entries
+    pruned = entries[0].seq > since + 1 and first_change_seq() > since + 1
+    if pruned or any(entry.operation == 'reset' for entry in entries):
+        return jsonify(last_seq=last_seq, reset=True, has_more=has_more, changes=[])
+
+    # Keep only the latest change per entity
+    latest = {}
+    for entry in entries:
+        latest.pop(entry.entity_id, None)
+        latest[entry.entity_id] = entry
+
+    upserted_ids = [entity_id for entity_id, entry in latest.items() if entry.operation == 'upsert']
+    documents = dict(
+        Person.query.with_entities(Person.entity_id, Person.document).filter(Person.entity_id.in_(upserted_ids))
+    ) if upserted_ids else {}
+
+    data = []
+    for entity_id, entry in latest.items():
+        document = documents.get(entity_id)
+        if entry.operation == 'upsert' and document is not None:
+            data.append(f'{{"seq":{entry.seq},"operation":"upsert","entity_id":{json.dumps(entity_id)},"person":{document}}}')
+        else:
+            # Deleted, or upserted and removed again by a later change beyond this page
+            data.append(f'{{"seq":{entry.seq},"operation":"delete","entity_id":{json.dumps(entity_id)}}}')
+
+    return json_response(f'{{"last_seq":{last_seq},"reset":false,"has_more":{json.dumps(has_more)},"changes":{json_array(data)}}}')
+
+
+@views.route('/events')
+def events():
+    """
+    Stream the per-record change events to the web page as server-sent events.
+
+    When the worker already serves SSE_MAX_SUBSCRIBERS clients, the stream ends right away with a 'retry' delay, so
+    the browser reconnects later (an error status would make EventSource give up for good).
+    """
+    subscriber = CHANGE_EVENTS.subscribe()
+    if subscriber is None:
+        return Response(f"retry: {SSE_RETRY_MILLISECONDS}\n\n", mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache'})
+
+    def generate():
+        try:
+            while True:
+                try:
+                    yield subscriber.get(timeout=SSE_KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    # Comment line that keeps proxies from closing an idle connection
+                    yield ": keepalive\n\n"
+        finally:
+            CHANGE_EVENTS.unsubscribe(subscriber)
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@views.route('/search', methods=['GET'])
+def search():
+    """Return the ranked fuzzy/phonetic matches for the 'q' name query from the in-memory name index."""
+    query = request.args.get('q', '')
+    try:
+        limit = requested_int('limit', 1, MAX_SEARCH_RESULTS)
+    except ValueError as e:
+        return invalid_request(str(e))
+    if limit is None:
+        limit = 20
+
+    return jsonify(data=NAME_INDEX.search(query, limit=limit))
+
+
+
+@views.route('/metrics', methods=['GET'])
+def metrics():
+    """Expose the metrics in the Prometheus text format."""
+    body, content_type = metrics_payload()
+    return Response(body, content_type=content_type)
+
+
+@views.route('/healthz', methods=['GET'])
+def healthz():
+    """Liveness probe: the process is up and serving requests."""
+    return jsonify(status="ok")
+
+
+@views.route('/readyz', methods=['GET'])
+def readyz():
+    """Readiness probe: PostgreSQL answers and the name index has been loaded."""
+    checks = {}
+    try:
+        my_db.session.execute(my_db.text('SELECT 1'))
+        checks['database'] = True
+    except Exception:
+        my_db.session.rollback()
+        checks['database'] = False
+
+    follower = current_app.extensions.get('change_follower')
+    checks['name_index'] = follower is None or follower.loaded.is_set()
+
+    ready = all(checks.values())
+    return jsonify(status="ready" if ready else "not ready", checks=checks), 200 if ready else 503
 
 
 def main():
-    """Main function to start the Flask application, create database tables, and consume data from RabbitMQ."""
-    # Create the database tables if they don't exist
-    my_db.create_all()
+    """Run the Flask development server. The RabbitMQ consumer runs in its own process, see consumer.py."""
+    # Create the database tables, or migrate them to the current schema
+    app = create_app(follow_changes=True, migrate=True)
     print("---- Database created. ----")
-    # Start the RabbitMQ consumer in a separate thread
-    consumer_thread = threading.Thread(target=start_rabbitmq_consumer)
-    consumer_thread.start()
 
-    # # Start the auto-refresh data thread
-    # refresh_thread = threading.Thread(target=refresh_data)
-    # refresh_thread.start()
+    # The reloader would start a second process with its own change follower
+    app.run(debug=True, threaded=True, host='0.0.0.0', use_reloader=False)
 
-    # Run the Flask application in debug mode
-    app.run(debug=True, threaded=True, host='0.0.0.0')
-    print("---- Data consumed and stored in the PostgreSQL database. ----")
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
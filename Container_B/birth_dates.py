@@ -0,0 +1,89 @@
+"""
+birth_dates.py
+
+This module parses the free-text 'date_of_birth' values of the Interpol notices (e.g. "1989/02/23", "1989/02"
+or "1989") into a typed date plus a precision marker, and converts age ranges into birth date ranges so that
+they can be answered with index range scans on the typed column.
+
+Partial dates are stored as the first day of the period they cover, together with their precision.
+
+@Author: Nisanur Genc
+
+"""
+
+import datetime
+import re
+
+PRECISION_DAY = "day"
+PRECISION_MONTH = "month"
+PRECISION_YEAR = "year"
+
+# The largest age accepted by the age filters, so the birth date range stays within the range of datetime.date
+MAX_AGE = 150
+
+DATE_PATTERN = re.compile(r"^\s*(\d{4})(?:[/-](\d{1,2})(?:[/-](\d{1,2}))?)?\s*$")
+
+
+def parse_date_of_birth(value):
+    """
+    Parse a date of birth string into a (date, precision) tuple.
+
+    :param value: The date of birth as received from Interpol, e.g. "1989/02/23".
+    :type value: str
+    :return: The parsed date and its precision, or (None, None) if the value cannot be parsed.
+    :rtype: tuple
+    """
+    if not value:
+        return None, None
+
+    match = DATE_PATTERN.match(value)
+    if not match:
+        return None, None
+
+    year, month, day = match.groups()
+    # Some notices use "00" for the unknown parts of the date
+    month = int(month) if month and int(month) else None
+    day = int(day) if day and int(day) else None
+
+    try:
+        if month and day:
+            return datetime.date(int(year), month, day), PRECISION_DAY
+        if month:
+            return datetime.date(int(year), month, 1), PRECISION_MONTH
+        return datetime.date(int(year), 1, 1), PRECISION_YEAR
+    except ValueError:
+        return None, None
+
+
+def subtract_years(date, years):
+    """Return the same calendar day the given number of years earlier (Feb 29 falls back to Feb 28)."""
+    try:
+        return date.replace(year=date.year - years)
+    except ValueError:
+        return date.replace(year=date.year - years, day=28)
+
+
+def birth_date_range_for_age(age_min=None, age_max=None, today=None):
+    """
+    Convert an age range into the matching half-open birth date range [lower, upper).
+
+    :param age_min: The minimum age in years (optional).
+    :type age_min: int
+    :param age_max: The maximum age in years (optional).
+    :type age_max: int
+    :param today: The reference date, defaults to the current date.
+    :type today: datetime.date
+    :return: A (lower, upper) tuple, where either bound may be None.
+    :rtype: tuple
+    """
+    today = today or datetime.date.today()
+    lower = upper = None
+
+    if age_min is not None:
+        # Born on or before this day -> at least age_min years old
+        upper = subtract_years(today, age_min) + datetime.timedelta(days=1)
+    if age_max is not None:
+        # Born after this day -> not yet age_max + 1 years old
+        lower = subtract_years(today, age_max + 1) + datetime.timedelta(days=1)
+
+    return lower, upper
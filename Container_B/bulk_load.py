@@ -0,0 +1,220 @@
+"""
+bulk_load.py
+
+Bulk import of notice snapshots into PostgreSQL, without going through RabbitMQ and DBRegistrar one row at a time.
+The snapshot rows are normalized like DBRegistrar does (defaults, typed birth date, read model document), streamed
+into a temporary staging table with COPY, and then applied to the Person table in a single transaction:
+
+- replace: the Person table is swapped for the snapshot (TRUNCATE + INSERT), and a 'reset' entry is appended to the
+  change log so the web workers and the live web pages reload.
+- merge: the snapshot rows are upserted (INSERT ... ON CONFLICT), with one 'upsert' change log entry per row; large
+  merges append a single 'reset' entry instead.
+
+Either way the summary table of /aggregates is recounted in the same transaction.
+
+Supported snapshots are the CSV export of the crawler (Container_A/data.csv, where 'nationalities' and '_links' are
+Python literals) and NDJSON files of notices, either cleaned as published by Container A or raw from the API.
+The images are not downloaded, the image column keeps the Interpol URL like the consumer stores it.
+
+    python bulk_load.py ../Container_A/data.csv --mode replace
+
+@Author: Nisanur Genc
+
+"""
+
+import argparse
+import ast
+import csv
+import io
+import json
+import os
+import sys
+import time
+from aggregates import REBUILD_SQL
+from app import COUNTRY_NAMES, create_app
+from db_registrar import IMAGE_DIRECTORY, apply_notice_defaults, build_person_fields
+from models import my_db, Person, PersonChange, migrate_database
+from read_model import build_person_view, serialize_view
+
+STAGING_TABLE = 'person_staging'
+COPY_CHUNK_ROWS = 1000  # Rows encoded per read() of the COPY stream
+MERGE_RESET_THRESHOLD = 10000  # Above this many merged rows, the followers reload instead of applying every upsert
+
+
+def read_csv_notices(path):
+    """Yield the notices of a CSV snapshot with the columns of Container_A/data.csv."""
+    with open(path, newline='', encoding='utf-8') as snapshot:
+        for row in csv.DictReader(snapshot):
+            notice = {key: value or None for key, value in row.items()}
+            for column in ('nationalities', '_links'):
+                if notice.get(column):
+                    notice[column] = ast.literal_eval(notice[column])
+            yield notice
+
+
+def read_ndjson_notices(path):
+    """Yield the notices of an NDJSON snapshot, one JSON object per line."""
+    with open(path, encoding='utf-8') as snapshot:
+        for line in snapshot:
+            if line.strip():
+                yield json.loads(line)
+
+
+def notice_image(notice):
+    """Return the image URL of a notice: the cleaned 'image' field, or the thumbnail link of a raw notice."""
+    if notice.get('image'):
+        return notice['image']
+    thumbnail = (notice.get('_links') or {}).get('thumbnail') or {}
+    return thumbnail.get('href') or "No Image Available"
+
+
+def person_rows(notices, columns):
+    """
+    Normalize the notices into Person rows, in the given column order.
+
+    :param notices: The notices of the snapshot.
+    :type notices: iterable
+    :param columns: The names of the Person columns to output.
+    :type columns: list
+    :return: A generator of the rows (tuples), notices without entity_id are skipped.
+    """
+    for notice in notices:
+        if not notice.get('entity_id'):
+            continue
+        apply_notice_defaults(notice)
+        person_fields = build_person_fields(notice, notice_image(notice))
+        image_path = os.path.join(IMAGE_DIRECTORY, f"{notice['entity_id']}.jpg")
+        if person_fields['image'].startswith(('http://', 'https://')) and not os.path.exists(image_path):
+            # Bulk loads do not download the images: without a fingerprint the next crawl writes the record again
+            # instead of skipping it, and downloads its image
+            person_fields['fingerprint'] = None
+        person_fields['document'] = serialize_view(build_person_view(person_fields, COUNTRY_NAMES))
+        # Columns that the snapshot does not fill (e.g. crawl_generation) are loaded as NULL
+        yield tuple(person_fields.get(column) for column in columns)
+
+
+class CopyStream(io.RawIOBase):
+    """Readable file object that encodes rows as CSV on demand, so COPY streams the snapshot without buffering it."""
+
+    def __init__(self, rows):
+        self.rows = iter(rows)
+        self.buffer = b''
+        self.row_count = 0
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            chunk = io.StringIO()
+            writer = csv.writer(chunk)
+            for row in self.rows:
+                # The line number orders the duplicates of the snapshot, the last one wins
+                writer.writerow(row + (self.row_count,))
+                self.row_count += 1
+                if self.row_count % COPY_CHUNK_ROWS == 0:
+                    break
+            if not chunk.tell():
+                break
+            self.buffer += chunk.getvalue().encode('utf-8')
+
+        if size < 0:
+            size = len(self.buffer)
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+
+def bulk_load(notices, mode='replace'):
+    """
+    Load notices into the Person table through a COPY into a staging table, atomically.
+
+    Must run inside an application context.
+
+    :param notices: The notices of the snapshot.
+    :type notices: iterable
+    :param mode: 'replace' to swap the whole table for the snapshot, 'merge' to upsert the snapshot rows.
+    :type mode: str
+    :return: The number of rows read from the snapshot and the number of distinct persons loaded.
+    :rtype: tuple
+    """
+    person_table = Person.__table__.name
+    change_table = PersonChange.__table__.name
+    columns = [column.name for column in Person.__table__.columns]
+    column_list = ', '.join(columns)
+
+    connection = my_db.engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        # The staging table only lives in this transaction
+        cursor.execute(
+            f'CREATE TEMP TABLE {STAGING_TABLE} (LIKE {person_table} INCLUDING DEFAULTS, line_number bigint) ON COMMIT DROP'
+        )
+        stream = CopyStream(person_rows(notices, columns))
+        cursor.copy_expert(
+            f"COPY {STAGING_TABLE} ({column_list}, line_number) FROM STDIN WITH (FORMAT csv)", stream
+        )
+
+        # The writers of the change log serialize on this lock for its ordering, hold the consumer's writes until the commit
+        cursor.execute(f'LOCK TABLE {change_table} IN EXCLUSIVE MODE')
+        deduplicated = (
+            f'SELECT DISTINCT ON (entity_id) {column_list} FROM {STAGING_TABLE} ORDER BY entity_id, line_number DESC'
+        )
+        if mode == 'replace':
+            cursor.execute(f'TRUNCATE {person_table}')
+            cursor.execute(f'INSERT INTO {person_table} ({column_list}) {deduplicated}')
+            loaded = cursor.rowcount
+            reset = True
+        else:
+            # A snapshot does not know which crawl saw the records, keep their generation
+            updates = ', '.join(
+                f'{column} = EXCLUDED.{column}' for column in columns if column not in ('entity_id', 'crawl_generation')
+            )
+            cursor.execute(
+                f'INSERT INTO {person_table} ({column_list}) {deduplicated} '
+                f'ON CONFLICT (entity_id) DO UPDATE SET {updates}'
+            )
+            loaded = cursor.rowcount
+            reset = loaded > MERGE_RESET_THRESHOLD
+
+        # Recount the summary table of /aggregates, still under the change log lock that holds the consumer's writes
+        for statement in REBUILD_SQL:
+            cursor.execute(statement)
+
+        if reset:
+            cursor.execute(f"INSERT INTO {change_table} (operation, changed_at) VALUES ('reset', now() at time zone 'utc')")
+        else:
+            cursor.execute(
+                f"INSERT INTO {change_table} (entity_id, operation, changed_at) "
+                f"SELECT DISTINCT entity_id, 'upsert', now() at time zone 'utc' FROM {STAGING_TABLE}"
+            )
+        connection.commit()
+        return stream.row_count, loaded
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk load a CSV or NDJSON snapshot of notices into PostgreSQL.")
+    parser.add_argument('snapshot', help="path of the snapshot")
+    parser.add_argument('--format', choices=['csv', 'ndjson'], help="default: from the file extension")
+    parser.add_argument('--mode', choices=['replace', 'merge'], default='merge',
+                        help="replace the whole table or upsert the snapshot rows (default)")
+    args = parser.parse_args()
+
+    snapshot_format = args.format or ('csv' if args.snapshot.endswith('.csv') else 'ndjson')
+    notices = read_csv_notices(args.snapshot) if snapshot_format == 'csv' else read_ndjson_notices(args.snapshot)
+
+    app = create_app()
+    with app.app_context():
+        migrate_database()
+        start_time = time.time()
+        row_count, loaded = bulk_load(notices, args.mode)
+        print(f"Loaded {loaded} persons from {row_count} rows ({args.mode}) in {time.time() - start_time:.1f} seconds")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,92 @@
+"""
+change_events.py
+
+This module contains the ChangeBroadcaster class, which fans out the per-record change events emitted by
+DBRegistrar to every connected server-sent events (SSE) client of the web page.
+
+@Author: Nisanur Genc
+
+"""
+
+import json
+import queue
+import threading
+
+
+class ChangeBroadcaster:
+    """Thread-safe publish/subscribe hub for record change events."""
+
+    def __init__(self, max_queued_events=1000, max_subscribers=None):
+        """
+        Initialize the ChangeBroadcaster.
+
+        :param max_queued_events: The maximum number of events buffered per subscriber. A subscriber that falls
+            further behind is sent a 'reset' event instead, telling the page to reload the table.
+        :type max_queued_events: int
+        :param max_subscribers: The maximum number of subscribers at a time, None for no limit.
+        :type max_subscribers: int
+        """
+        self.max_queued_events = max_queued_events
+        self.max_subscribers = max_subscribers
+        self.subscribers = set()
+        self.lock = threading.Lock()
+
+    def subscribe(self):
+        """
+        Register a new subscriber.
+
+        :return: The queue that will receive the published events, or None if max_subscribers is reached.
+        :rtype: queue.Queue
+        """
+        subscriber = queue.Queue(maxsize=self.max_queued_events)
+        with self.lock:
+            if self.max_subscribers is not None and len(self.subscribers) >= self.max_subscribers:
+                return None
+            self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        """
+        Remove a subscriber registered with subscribe().
+
+        :param subscriber: The queue returned by subscribe().
+        :type subscriber: queue.Queue
+        """
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+    def publish(self, event_type, data=None):
+        """
+        Send an event to every subscriber.
+
+        :param event_type: The type of the event, e.g. 'upsert' or 'reset'.
+        :type event_type: str
+        :param data: The JSON-serializable payload of the event.
+        :type data: dict
+        """
+        message = format_sse(event_type, data)
+
+        with self.lock:
+            subscribers = list(self.subscribers)
+
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(message)
+            except queue.Full:
+                # The client is too slow, drop its backlog and ask it to reload the whole table
+                with subscriber.mutex:
+                    subscriber.queue.clear()
+                subscriber.put_nowait(format_sse("reset"))
+
+
+def format_sse(event_type, data=None):
+    """
+    Format an event in the text/event-stream wire format.
+
+    :param event_type: The type of the event.
+    :type event_type: str
+    :param data: The JSON-serializable payload of the event.
+    :type data: dict
+    :rtype: str
+    """
+    return f"event: {event_type}\ndata: {json.dumps(data or {}, separators=(',', ':'), default=str)}\n\n"
@@ -0,0 +1,130 @@
+"""
+change_follower.py
+
+This module contains the ChangeFollower class. The RabbitMQ consumer runs in its own process, so every web worker
+follows the Person change log written by DBRegistrar to keep its in-memory name index up to date and to push the
+change events to the server-sent events clients connected to it.
+
+@Author: Nisanur Genc
+
+"""
+
+import json
+import threading
+import time
+
+
+class ChangeFollower(threading.Thread):
+    """Background thread that polls the change log and applies new entries to the in-process components."""
+
+    def __init__(self, app, db, person_model, change_model, name_index, change_events, poll_interval=1.0, batch_size=1000):
+        """
+        Initialize the ChangeFollower.
+
+        :param app: The Flask application whose database connection is used.
+        :type app: flask.Flask
+        :param db: The SQLAlchemy database instance.
+        :type db: flask_sqlalchemy.SQLAlchemy
+        :param person_model: The Person model class.
+        :type person_model: class
+        :param change_model: The PersonChange model class.
+        :type change_model: class
+        :param name_index: The in-memory name index to keep up to date.
+        :type name_index: name_index.NameIndex
+        :param change_events: The broadcaster of the server-sent events.
+        :type change_events: change_events.ChangeBroadcaster
+        :param poll_interval: The delay (in seconds) between two polls of the change log.
+        :type poll_interval: float
+        :param batch_size: The maximum number of change log entries applied per poll.
+        :type batch_size: int
+        """
+        super().__init__(name="change-follower", daemon=True)
+        self.app = app
+        self.db = db
+        self.person_model = person_model
+        self.change_model = change_model
+        self.name_index = name_index
+        self.change_events = change_events
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.last_seq = 0
+        self.loaded = threading.Event()  # Set once the name index has been loaded
+
+    def run(self):
+        """Load the name index, then apply the change log entries as they are committed."""
+        with self.app.app_context():
+            while not self.loaded.is_set():
+                try:
+                    self.reload()
+                    self.loaded.set()
+                except Exception as e:
+                    # PostgreSQL may still be starting up
+                    self.db.session.rollback()
+                    print(f"Error loading the name index: {str(e)}")
+                    time.sleep(self.poll_interval)
+
+            while True:
+                try:
+                    # Keep polling without delay while there is a backlog
+                    if self.poll() < self.batch_size:
+                        time.sleep(self.poll_interval)
+                except Exception as e:
+                    self.db.session.rollback()
+                    print(f"Error following the change log: {str(e)}")
+                    time.sleep(self.poll_interval)
+                finally:
+                    # Return the connection to the pool between polls
+                    self.db.session.remove()
+
+    def reload(self):
+        """Rebuild the name index from the Person table and continue after the latest change log entry."""
+        # Read the sequence first, changes committed during the rebuild are applied again afterwards
+        self.last_seq = self.db.session.query(
+            self.db.func.coalesce(self.db.func.max(self.change_model.seq), 0)
+        ).scalar()
+        self.name_index.rebuild(self.person_model)
+        self.db.session.remove()
+
+    def poll(self):
+        """
+        Apply the change log entries committed since the last poll.
+
+        :return: The number of entries read.
+        :rtype: int
+        """
+        entries = self.change_model.query.with_entities(
+            self.change_model.seq, self.change_model.entity_id, self.change_model.operation
+        ).filter(self.change_model.seq > self.last_seq).order_by(self.change_model.seq).limit(self.batch_size).all()
+        if not entries:
+            return 0
+
+        # A gap after the last entry is either a rolled back write or entries pruned while the follower was behind
+        pruned = entries[0][0] > self.last_seq + 1 and self.db.session.query(
+            self.db.func.min(self.change_model.seq)
+        ).scalar() > self.last_seq + 1
+        if pruned or any(operation == 'reset' for _, _, operation in entries):
+            self.reload()
+            self.change_events.publish('reset')
+            return len(entries)
+
+        # Keep only the latest change per entity
+        latest = {entity_id: operation for _, entity_id, operation in entries}
+        upserted_ids = [entity_id for entity_id, operation in latest.items() if operation == 'upsert']
+        rows = self.person_model.query.with_entities(
+            self.person_model.entity_id, self.person_model.name, self.person_model.forename, self.person_model.document
+        ).filter(self.person_model.entity_id.in_(upserted_ids)).all() if upserted_ids else []
+        people = {row[0]: row for row in rows}
+
+        for entity_id, operation in latest.items():
+            person = people.get(entity_id)
+            if operation == 'upsert' and person is not None:
+                _, name, forename, document = person
+                created = entity_id not in self.name_index
+                self.name_index.add(entity_id, name, forename)
+                self.change_events.publish('upsert', {'created': created, 'person': json.loads(document)})
+            else:
+                self.name_index.remove(entity_id)
+                self.change_events.publish('delete', {'entity_id': entity_id})
+
+        self.last_seq = entries[-1][0]
+        return len(entries)
@@ -0,0 +1,50 @@
+"""
+consumer.py
+
+Standalone entry point of the Container B RabbitMQ consumer. It runs in its own process, separate from the web
+server, so that ingest and HTTP requests do not compete for the same interpreter and can be scaled independently.
+
+@Author: Nisanur Genc
+
+"""
+
+from RabbitMQConsumer import RabbitMQConsumer
+from app import COUNTRY_NAMES, create_app
+from db_registrar import DBRegistrar
+from models import my_db, Person, PersonAggregate, PersonChange, migrate_database
+from readiness import wait_for
+from prometheus_client import start_http_server
+
+# The consumer stores one message at a time, so it needs a single connection (and one spare)
+CONSUMER_ENGINE_OPTIONS = {
+    'pool_size': 2,
+    'max_overflow': 0,
+    'pool_pre_ping': True,
+    'pool_recycle': 1800,
+}
+METRICS_PORT = 9100  # The consumer has no web server of its own, its metrics are served on this port
+
+
+def main():
+    """Create the database tables, or migrate them to the current schema, and consume data from RabbitMQ."""
+    app = create_app(engine_options=CONSUMER_ENGINE_OPTIONS)
+    start_http_server(METRICS_PORT)
+
+    with app.app_context():
+        # Start as soon as PostgreSQL accepts queries instead of sleeping for a fixed time
+        if not wait_for(lambda: my_db.session.execute(my_db.text('SELECT 1')), "PostgreSQL"):
+            return
+        my_db.session.remove()
+        migrate_database()
+        print("---- Database created. ----")
+
+        # Pass the Person model class, the database instance and the change log model
+        db_registrar = DBRegistrar(
+            Person, my_db, change_model=PersonChange, country_names=COUNTRY_NAMES, aggregate_model=PersonAggregate
+        )
+        rabbitmq_consumer = RabbitMQConsumer(hostname="container_c", port=5672, queue_name="interpol_data", db_registrar=db_registrar)
+        rabbitmq_consumer.consume_data()
+
+
+if __name__ == '__main__':
+    main()
@@ -7,15 +7,77 @@ This module contains the DBRegistrar class responsible for processing and storin
 
 """
 
+import datetime
 import json
 import os
+import time
 from flask_sqlalchemy import SQLAlchemy
 import requests
+from aggregates import adjust_aggregates, aggregate_keys
+from birth_dates import parse_date_of_birth
+from fingerprints import FingerprintCache, content_fingerprint
+from read_model import build_person_view, serialize_view
+from metrics import IMAGE_DOWNLOAD_LATENCY, STORE_LATENCY, SWEPT_RECORDS, UNCHANGED_MESSAGES
+from tracing import finish_trace
+
+IMAGE_DIRECTORY = './image_data'  # Where the images are downloaded, served under /images
+FINGERPRINT_CACHE_SIZE = int(os.environ.get('FINGERPRINT_CACHE_SIZE', 100000))  # Entity IDs kept in memory
+FINGERPRINT_SYNC_INTERVAL = 5.0  # Seconds between two checks of the change log for writes of other processes
+# Clients that fell further behind than this reload the snapshot
+CHANGE_LOG_RETENTION = float(os.environ.get('CHANGE_LOG_RETENTION_DAYS', 7)) * 24 * 3600
+CHANGE_LOG_PRUNE_INTERVAL = 3600.0  # Seconds between two prunes of the change log
+
+
+def apply_notice_defaults(data):
+    """
+    Replace the missing values of a cleaned notice in place, the way they are stored.
+
+    :param data: The notice as published by Container A.
+    :type data: dict
+    """
+    # Handle missing or None values and replace them with "Unknown"
+    for key in ['name', 'forename', 'date_of_birth']:
+        if key in data and data[key] is not None:
+            continue
+        data[key] = "Unknown"
+
+    # Handle the 'nationalities' field separately
+    nationalities = data.get('nationalities')
+    if nationalities is None:
+        # If 'nationalities' is None, initialize it as a list with "Unknown"
+        data['nationalities'] = ["Unknown"]
+
+
+def build_person_fields(data, image):
+    """
+    Build the column values of a Person record (without the read model document) from a cleaned notice.
+
+    :param data: The notice, with the defaults of apply_notice_defaults() applied.
+    :type data: dict
+    :param image: The value stored in the image column.
+    :type image: str
+    :rtype: dict
+    """
+    birth_date, birth_date_precision = parse_date_of_birth(data.get('date_of_birth'))
+    person_fields = dict(
+        forename=data.get('forename'),
+        date_of_birth=data.get('date_of_birth'),
+        birth_date=birth_date,
+        birth_date_precision=birth_date_precision,
+        entity_id=data['entity_id'],
+        nationalities=json.dumps(data.get('nationalities', [])),
+        name=data.get('name'),
+        image=image,
+    )
+    person_fields['fingerprint'] = content_fingerprint(person_fields)
+    return person_fields
+
 
 class DBRegistrar:
     """Class for processing and storing data in the PostgreSQL database."""
 
-    def __init__(self, person_model, db):
+    def __init__(self, person_model, db, change_model=None, name_index=None, country_names=None, change_events=None,
+                 aggregate_model=None, fingerprint_cache_size=FINGERPRINT_CACHE_SIZE):
         """
         Initialize the DBRegistrar.
 
@@ -23,11 +85,32 @@ class DBRegistrar:
         :type person_model: class
         :param db: The SQLAlchemy database instance.
         :type db: flask_sqlalchemy.SQLAlchemy
+        :param change_model: The PersonChange model class of the change log, appended to on every write (optional).
+        :type change_model: class
+        :param name_index: The in-memory name index to keep up to date with the stored records (optional).
+        :type name_index: name_index.NameIndex
+        :param country_names: The mapping of country codes to country names used in the stored read model.
+        :type country_names: dict
+        :param change_events: The broadcaster notified of every committed record (optional).
+        :type change_events: change_events.ChangeBroadcaster
+        :param aggregate_model: The PersonAggregate model class of the summary table, adjusted on every write (optional).
+        :type aggregate_model: class
+        :param fingerprint_cache_size: The number of record fingerprints kept in memory to skip unchanged messages.
+        :type fingerprint_cache_size: int
         """
         self.person_model = person_model
         self.db = db
+        self.change_model = change_model
+        self.name_index = name_index
+        self.country_names = country_names or {}
+        self.change_events = change_events
+        self.aggregate_model = aggregate_model
+        self.fingerprints = FingerprintCache(fingerprint_cache_size)
+        self.fingerprints_synced_at = 0.0
+        self.change_log_pruned_at = 0.0
 
 
+    @IMAGE_DOWNLOAD_LATENCY.time()
     def download_image(self, url, filename):
         """
         Download an image from the given URL and save it to the image_data directory.
@@ -36,13 +119,15 @@ class DBRegistrar:
         :type url: str
         :param filename: The filename to use when saving the image.
         :type filename: str
+        :return: True if the image was saved.
+        :rtype: bool
         """
         try:
             response = requests.get(url)
             response.raise_for_status()
 
             # Check if the image_data directory exists, if not, create it
-            image_dir = './image_data'
+            image_dir = IMAGE_DIRECTORY
             print(f"Image Directory: {image_dir}")
 
             if not os.path.exists(image_dir):
@@ -55,6 +140,7 @@ class DBRegistrar:
                 f.write(response.content)
 
             print(f"Image downloaded and saved to: {image_path}")
+            return True
         
         except requests.exceptions.HTTPError as e:
             print(f"HTTP error occurred while downloading the image: {str(e)}")
@@ -62,73 +148,105 @@ class DBRegistrar:
             print(f"Error occurred while downloading the image: {str(e)}")
         except Exception as e:
             print(f"Error downloading image: {str(e)}")
+        return False
 
 
 
-    def store_data_to_my_db(self, data):
+    @STORE_LATENCY.time()
+    def store_data_to_my_db(self, data, trace=None, generation=None):
         """
         Process and store the data in the PostgreSQL database.
 
         :param data: The data to be stored in the database.
         :type data: dict
+        :param trace: The trace context of the message, finished and exported once the data is committed (optional).
+        :type trace: dict
+        :param generation: The full crawl that published the notice, stamped on the record (optional).
+        :type generation: int
         """
         
         try:
-            # Print the received message body to check the actual data
-            print("Received Message Body:", data)
-
             # Check if the required key 'entity_id' is present in the data
             if 'entity_id' not in data:
                 print("Error: 'entity_id' key not found in the consumed message")
                 return
 
-            # Handle missing or None values and replace them with "Unknown"
-            for key in ['name', 'forename', 'date_of_birth']:
-                if key in data and data[key] is not None:
-                    continue
-                data[key] = "Unknown"
-
-            # Handle the 'nationalities' field separately
-            nationalities = data.get('nationalities')
-            if nationalities is None:
-                # If 'nationalities' is None, initialize it as a list with "Unknown"
-                data['nationalities'] = ["Unknown"]
+            apply_notice_defaults(data)
+            self.prune_change_log()
 
             # Extract the entity ID from the incoming data
             entity_id = data['entity_id']
 
-            # Check if the entity ID already exists in the database
-            existing_person = self.person_model.query.filter_by(entity_id=entity_id).first()
+            image_data = data.get('image', "Unknown")
+            person_fields = build_person_fields(data, image_data)
 
-            if existing_person:
-                # Delete the existing person record
-                self.person_model.query.filter_by(entity_id=entity_id).delete()
-                self.db.session.commit()
-                print(f"Old data deleted for entity ID: {entity_id}")
+            # Re-crawls publish every notice again, most of them unchanged
+            if self.skip_unchanged(entity_id, person_fields['fingerprint'], generation):
+                UNCHANGED_MESSAGES.inc()
+                return
 
-            # Store the data in the database
-            image_data = data.get('image', "Unknown")
-            
+            # Downloaded before the write transaction, which holds the change log lock
             image_url = data.get('image')
             if image_url:
                 image_filename = f"{data['entity_id']}.jpg"  # You can adjust the filename as needed
-                self.download_image(image_url, image_filename)
+                downloaded = self.download_image(image_url, image_filename)
+                if not downloaded and image_url.startswith(('http://', 'https://')):
+                    # Without a fingerprint the next publish of the notice is not skipped, and the download retried
+                    person_fields['fingerprint'] = None
 
-            nationalities_json = json.dumps(data.get('nationalities', []))
+            self.lock_change_log()
+            # Check if the entity ID already exists in the database
+            existing_person = self.person_model.query.filter_by(entity_id=entity_id).first()
+            removed_keys = []
 
-            person = self.person_model(
-                forename=data.get('forename'),
-                date_of_birth=data.get('date_of_birth'),
-                entity_id=entity_id,
-                nationalities=nationalities_json,
-                name=data.get('name'),
-                image=image_data,
-            )
+            if existing_person:
+                removed_keys = aggregate_keys(existing_person.nationalities, existing_person.birth_date)
+
+                # Notices republished outside of a full crawl keep the generation that last saw them
+                if generation is None:
+                    generation = existing_person.crawl_generation
+
+                # Delete the existing person record, committed together with the new one below
+                self.db.session.delete(existing_person)
+                self.db.session.flush()
+                print(f"Old data deleted for entity ID: {entity_id}")
+
+            # Build the read model once here instead of on every read
+            person_view = build_person_view(person_fields, self.country_names)
+            person = self.person_model(document=serialize_view(person_view), crawl_generation=generation, **person_fields)
 
             self.db.session.add(person)
+            change_seq = None
+            if self.change_model is not None:
+                # Record the write in the change log within the same transaction
+                change = self.change_model(entity_id=entity_id, operation='upsert')
+                self.db.session.add(change)
+                # Flushed for its sequence number
+                self.db.session.flush()
+                change_seq = change.seq
+            if self.aggregate_model is not None:
+                adjust_aggregates(
+                    self.db, self.aggregate_model,
+                    added=aggregate_keys(person.nationalities, person.birth_date), removed=removed_keys,
+                )
             self.db.session.commit()
             print(f"Data stored for entity ID: {entity_id}")
 
+            if change_seq is not None:
+                self.fingerprints.own_changes(change_seq, change_seq)
+            self.fingerprints.put(entity_id, person_fields['fingerprint'], generation)
+
+            if trace is not None:
+                finish_trace(trace, entity_id)
+
+            # Keep the search index in sync with the committed record
+            if self.name_index is not None:
+                self.name_index.add(entity_id, data.get('name'), data.get('forename'))
+
+            # Push the committed record to the live web page
+            if self.change_events is not None:
+                self.change_events.publish('upsert', {'created': existing_person is None, 'person': person_view})
+
         except Exception as e:
             self.db.session.rollback()  # Rollback the transaction if an error occurs
             print(f"Error storing data to the database: {str(e)}")
@@ -141,3 +259,183 @@ class DBRegistrar:
             print("Received Message Body (Failed to Decode) in Database:", data.decode())
         except KeyError as e:
             print(f"Error accessing key in JSON message in Database: {str(e)}")
+
+
+    def skip_unchanged(self, entity_id, fingerprint, generation):
+        """
+        Check whether a message matches the stored record, in which case it is acknowledged without any write.
+
+        A full crawl still stamps its generation on an unchanged record (a single-column UPDATE), otherwise the
+        sweep at the end of the crawl would delete it.
+
+        :param entity_id: The entity ID of the notice.
+        :type entity_id: str
+        :param fingerprint: The content fingerprint of the notice.
+        :type fingerprint: str
+        :param generation: The full crawl that published the notice (optional).
+        :type generation: int
+        :return: True if the record is unchanged and nothing else has to be done.
+        :rtype: bool
+        """
+        self.sync_fingerprints()
+        cached = self.fingerprints.get(entity_id)
+        if cached is None:
+            row = self.db.session.execute(
+                self.db.select(self.person_model.fingerprint, self.person_model.crawl_generation)
+                .where(self.person_model.entity_id == entity_id)
+            ).first()
+            self.db.session.commit()
+            if row is None or row.fingerprint is None:
+                return False
+            cached = (row.fingerprint, row.crawl_generation)
+            self.fingerprints.put(entity_id, *cached)
+
+        stored_fingerprint, stored_generation = cached
+        if stored_fingerprint != fingerprint:
+            return False
+        if generation is not None and (stored_generation is None or stored_generation < generation):
+            self.person_model.query.filter_by(entity_id=entity_id).update(
+                {'crawl_generation': generation}, synchronize_session=False
+            )
+            self.db.session.commit()
+            self.fingerprints.put(entity_id, fingerprint, generation)
+        return True
+
+    def lock_change_log(self):
+        """
+        Lock the change log until the end of the transaction, before its first write.
+
+        The entries are numbered by a sequence when they are inserted but become visible when they are committed:
+        with concurrent writers (the consumer, bulk loads) a client reading 'seq > last_seq' could move past an
+        entry that commits later with a smaller number. Holding the lock until the commit serializes the writers,
+        so the sequence numbers become visible in order. Bulk loads take the same lock.
+        """
+        if self.change_model is not None:
+            self.db.session.execute(
+                self.db.text(f'LOCK TABLE {self.change_model.__table__.name} IN EXCLUSIVE MODE')
+            )
+
+    def prune_change_log(self):
+        """
+        Delete the change log entries older than CHANGE_LOG_RETENTION, checked every CHANGE_LOG_PRUNE_INTERVAL.
+
+        The latest entry is always kept, so the current sequence number survives. Clients whose position was
+        pruned are told to reload the snapshot (see /changes and ChangeFollower).
+        """
+        if self.change_model is None:
+            return
+        now = time.monotonic()
+        if now - self.change_log_pruned_at < CHANGE_LOG_PRUNE_INTERVAL:
+            return
+        self.change_log_pruned_at = now
+        try:
+            latest_seq = self.db.session.query(self.db.func.max(self.change_model.seq)).scalar_subquery()
+            cutoff = datetime.datetime.utcnow() - datetime.timedelta(seconds=CHANGE_LOG_RETENTION)
+            pruned = self.change_model.query.filter(
+                self.change_model.seq < latest_seq, self.change_model.changed_at < cutoff
+            ).delete(synchronize_session=False)
+            self.db.session.commit()
+            if pruned:
+                print(f"Change log pruned: {pruned} entries older than {cutoff}")
+        except Exception as e:
+            self.db.session.rollback()
+            print(f"Error pruning the change log: {str(e)}")
+
+    def sync_fingerprints(self):
+        """Drop the fingerprint cache if another process wrote to the change log, checked every few seconds."""
+        if self.change_model is None:
+            return
+        now = time.monotonic()
+        if now - self.fingerprints_synced_at < FINGERPRINT_SYNC_INTERVAL:
+            return
+        self.fingerprints_synced_at = now
+        latest_seq = self.db.session.query(self.db.func.coalesce(self.db.func.max(self.change_model.seq), 0)).scalar()
+        self.db.session.commit()
+        self.fingerprints.sync(latest_seq)
+
+
+    def sweep_generation(self, generation, batch_size=1000, max_fraction=0.1):
+        """
+        Delete the records (and their images) that the complete crawl of the given generation did not see.
+
+        Records stamped with the generation, or with a later one, are kept. The records are deleted in batches,
+        each committed with its 'delete' change log entries. As a safety net against a crawl that missed part of
+        the listing, nothing is deleted if more than max_fraction of the records would be.
+
+        :param generation: The generation of the complete crawl.
+        :type generation: int
+        :param batch_size: The number of records deleted per transaction.
+        :type batch_size: int
+        :param max_fraction: The largest fraction of the records that a sweep may delete.
+        :type max_fraction: float
+        :return: The number of deleted records.
+        :rtype: int
+        """
+        stale = self.db.or_(
+            self.person_model.crawl_generation.is_(None), self.person_model.crawl_generation < generation
+        )
+        try:
+            total = self.person_model.query.count()
+            stale_count = self.person_model.query.filter(stale).count()
+            if total and stale_count > total * max_fraction:
+                print(f"Sweep of generation {generation} skipped: {stale_count} of {total} records were not seen")
+                self.db.session.rollback()
+                return 0
+
+            deleted = 0
+            while True:
+                entity_ids = [entity_id for entity_id, in self.person_model.query.with_entities(
+                    self.person_model.entity_id).filter(stale).limit(batch_size)]
+                if not entity_ids:
+                    break
+
+                removed_keys = []
+                if self.aggregate_model is not None:
+                    for nationalities, birth_date in self.person_model.query.with_entities(
+                            self.person_model.nationalities, self.person_model.birth_date).filter(
+                            self.person_model.entity_id.in_(entity_ids)):
+                        removed_keys.extend(aggregate_keys(nationalities, birth_date))
+
+                self.lock_change_log()
+                self.person_model.query.filter(self.person_model.entity_id.in_(entity_ids)).delete(synchronize_session=False)
+                if self.change_model is not None:
+                    self.db.session.add_all(
+                        self.change_model(entity_id=entity_id, operation='delete') for entity_id in entity_ids
+                    )
+                if removed_keys:
+                    self.db.session.flush()
+                    adjust_aggregates(self.db, self.aggregate_model, removed=removed_keys)
+                self.db.session.commit()
+                deleted += len(entity_ids)
+                SWEPT_RECORDS.inc(len(entity_ids))
+
+                for entity_id in entity_ids:
+                    self.fingerprints.discard(entity_id)
+                    self.delete_image(f"{entity_id}.jpg")
+                    if self.name_index is not None:
+                        self.name_index.remove(entity_id)
+                    if self.change_events is not None:
+                        self.change_events.publish('delete', {'entity_id': entity_id})
+
+            print(f"Sweep of generation {generation}: {deleted} records deleted")
+            return deleted
+
+        except Exception as e:
+            self.db.session.rollback()
+            print(f"Error sweeping generation {generation}: {str(e)}")
+            return 0
+
+
+    def delete_image(self, filename):
+        """
+        Delete a downloaded image from the image_data directory, if it exists.
+
+        :param filename: The filename the image was saved with.
+        :type filename: str
+        """
+        try:
+            os.remove(os.path.join(IMAGE_DIRECTORY, filename))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Error deleting image {filename}: {str(e)}")
@@ -0,0 +1,94 @@
+"""
+fingerprints.py
+
+This module contains the content fingerprints of the Person records and the FingerprintCache class. Re-crawls
+publish every notice again, mostly unchanged: DBRegistrar compares the fingerprint of a message with the one of the
+stored record and skips the write (delete, insert, image download and change log entry) when they match.
+
+The fingerprints of the recently seen records are kept in memory, so most unchanged messages do not even read the
+database. The Person table can also be written outside of the consumer (bulk loads), so the cache is dropped as soon
+as the change log shows a change that the consumer did not write.
+
+@Author: Nisanur Genc
+
+"""
+
+import hashlib
+import json
+from collections import OrderedDict
+
+FINGERPRINT_FIELDS = ['entity_id', 'name', 'forename', 'date_of_birth', 'nationalities', 'image']
+
+
+def content_fingerprint(person_fields):
+    """
+    Compute the fingerprint of the content of a record.
+
+    :param person_fields: The column values of the record, as built by build_person_fields().
+    :type person_fields: Mapping
+    :return: The hex SHA-256 of the canonical JSON of the content fields.
+    :rtype: str
+    """
+    content = {field: person_fields.get(field) for field in FINGERPRINT_FIELDS}
+    return hashlib.sha256(json.dumps(content, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+
+
+class FingerprintCache:
+    """Bounded LRU cache of the stored fingerprint and crawl generation of each entity ID."""
+
+    def __init__(self, max_entries=100000):
+        """
+        Initialize the FingerprintCache.
+
+        :param max_entries: The number of entity IDs kept, the least recently used ones are evicted first.
+        :type max_entries: int
+        """
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # entity_id -> (fingerprint, crawl_generation)
+        self.last_seq = None  # The latest change log entry the cache is consistent with
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, entity_id):
+        """Return the (fingerprint, crawl_generation) of an entity ID, or None if it is not cached."""
+        entry = self.entries.get(entity_id)
+        if entry is not None:
+            self.entries.move_to_end(entity_id)
+        return entry
+
+    def put(self, entity_id, fingerprint, generation):
+        self.entries[entity_id] = (fingerprint, generation)
+        self.entries.move_to_end(entity_id)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def discard(self, entity_id):
+        self.entries.pop(entity_id, None)
+
+    def sync(self, latest_seq):
+        """
+        Drop the cache if the change log moved past the last change it is consistent with.
+
+        :param latest_seq: The sequence number of the latest change log entry.
+        :type latest_seq: int
+        """
+        if latest_seq != self.last_seq:
+            self.entries.clear()
+            self.last_seq = latest_seq
+
+    def own_changes(self, first_seq, last_seq):
+        """
+        Record change log entries written by the consumer itself.
+
+        If they do not directly follow the last known entry, another writer (or a rolled back transaction) took
+        sequence numbers in between, and the cache is dropped to be safe.
+
+        :param first_seq: The sequence number of the first entry written.
+        :type first_seq: int
+        :param last_seq: The sequence number of the last entry written.
+        :type last_seq: int
+        """
+        if self.last_seq is None or first_seq != self.last_seq + 1:
+            self.entries.clear()
+        self.last_seq = last_seq
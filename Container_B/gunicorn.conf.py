@@ -0,0 +1,41 @@
+"""
+gunicorn.conf.py
+
+Gunicorn settings of the Container B web server. The threaded workers keep the long-lived /events
+(server-sent events) connections from occupying a whole worker process each; they still hold a thread each, so
+only half of the threads of a worker serve them (SSE_MAX_SUBSCRIBERS in app.py).
+
+Every worker loads its own name index and runs its own change follower, so the requests are spread over threads
+rather than over many processes.
+
+@Author: Nisanur Genc
+
+"""
+
+import multiprocessing
+import os
+import shutil
+
+bind = "0.0.0.0:5000"
+workers = int(os.environ.get("GUNICORN_WORKERS", min(multiprocessing.cpu_count(), 4)))
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", 16))
+# Load the application in every worker after the fork, so each one gets its own engine and change follower thread
+preload_app = False
+keepalive = 5
+accesslog = "-"
+
+
+def on_starting(server):
+    """Start with an empty Prometheus multiprocess directory, the files of a previous run would be aggregated too."""
+    metrics_dir = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if metrics_dir:
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+        os.makedirs(metrics_dir, exist_ok=True)
+
+
+def child_exit(server, worker):
+    """Drop the live-process metrics of a worker that exited."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
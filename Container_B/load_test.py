@@ -0,0 +1,413 @@
+"""
+load_test.py
+
+Load-test suite of the Container B read endpoints. It seeds a PostgreSQL database with synthetic persons and
+representative images, drives concurrent requests against a running web server (e.g. gunicorn -c gunicorn.conf.py
+wsgi:app) and reports per endpoint the p50/p95/p99 latency, the throughput and the peak memory of the server.
+
+Every endpoint is measured in its own phase, so the memory peak of a phase belongs to that endpoint. The results are
+written as JSON lines, one record per (size, endpoint), and can be compared with the results of a previous run to
+catch regressions:
+
+    python load_test.py suite --database-url postgresql://... --url http://localhost:5000 \
+        --sizes 10000 100000 1000000 --server-pid <gunicorn master pid> --output results.jsonl
+    python load_test.py run --url http://localhost:5000 --size 100000 --baseline results.jsonl
+
+Seeding deletes all the Person records of the target database, so the database URL has to be given explicitly.
+
+@Author: Nisanur Genc
+
+"""
+
+import argparse
+import datetime
+import http.client
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlsplit
+from readFile import read_country_catalog
+
+ENDPOINTS = ['live_data', 'filter', 'images', 'search']
+IMAGE_DIR = os.path.join('image_data', 'loadtest')
+IMAGE_SIZE = 30 * 1024  # Bytes, about the size of a notice photo
+SYLLABLES = ['AL', 'AN', 'AR', 'BE', 'DA', 'DI', 'EL', 'EM', 'GO', 'HA', 'IL', 'IR', 'JO', 'KA', 'KO', 'LA', 'LI',
+             'MA', 'MI', 'NA', 'NO', 'OR', 'PA', 'RA', 'RI', 'SA', 'SE', 'TA', 'TO', 'UR', 'VA', 'YA', 'ZA', 'ZE']
+
+
+def synthetic_name(rng):
+    """Return a random upper case name of 2 to 4 syllables."""
+    return ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+
+
+def seed_people(database_url, size, image_count=100, seed=0, batch_size=10000):
+    """
+    Replace the Person records of a database with synthetic persons and write the representative images.
+
+    A 'reset' change log entry is appended afterwards, so the running web workers reload their name index.
+
+    :param database_url: The URL of the PostgreSQL database to seed.
+    :type database_url: str
+    :param size: The number of persons.
+    :type size: int
+    :param image_count: The number of distinct images, shared round-robin by the persons.
+    :type image_count: int
+    :param seed: The seed of the random generator.
+    :type seed: int
+    :param batch_size: The number of rows inserted per statement.
+    :type batch_size: int
+    """
+    # app reads DATABASE_URL when it is imported
+    os.environ['DATABASE_URL'] = database_url
+    from app import COUNTRY_NAMES, create_app
+    from birth_dates import parse_date_of_birth
+    from aggregates import REBUILD_SQL
+    from models import my_db, Person, PersonChange, lock_change_log, migrate_database
+    from read_model import build_person_view, serialize_view
+
+    rng = random.Random(seed)
+    os.makedirs(IMAGE_DIR, exist_ok=True)
+    for number in range(image_count):
+        with open(os.path.join(IMAGE_DIR, f'{number}.jpg'), 'wb') as image_file:
+            image_file.write(rng.getrandbits(IMAGE_SIZE * 8).to_bytes(IMAGE_SIZE, 'little'))
+
+    country_codes = sorted(COUNTRY_NAMES)
+    weights = [1 / (rank + 1) for rank in range(len(country_codes))]
+    today = datetime.date.today()
+
+    app = create_app()
+    with app.app_context():
+        migrate_database()
+        my_db.session.query(Person).delete()
+        my_db.session.commit()
+
+        start_time = time.time()
+        for batch_start in range(0, size, batch_size):
+            rows = []
+            for number in range(batch_start, min(batch_start + batch_size, size)):
+                date_of_birth = f'{today.year - rng.randint(18, 95)}/{rng.randint(1, 12):02d}/{rng.randint(1, 28):02d}'
+                birth_date, birth_date_precision = parse_date_of_birth(date_of_birth)
+                person_fields = dict(
+                    forename=synthetic_name(rng),
+                    date_of_birth=date_of_birth,
+                    birth_date=birth_date,
+                    birth_date_precision=birth_date_precision,
+                    entity_id=f'loadtest/{number}',
+                    nationalities=json.dumps(rng.choices(country_codes, weights)[:1]),
+                    name=synthetic_name(rng),
+                    image=f'/images/loadtest/{number % image_count}.jpg' if image_count else 'Unknown',
+                )
+                person_fields['document'] = serialize_view(build_person_view(person_fields, COUNTRY_NAMES))
+                rows.append(person_fields)
+            my_db.session.execute(Person.__table__.insert(), rows)
+            my_db.session.commit()
+
+        # The rows were inserted around the summary table of /aggregates, recount it with the reset of the change log
+        lock_change_log()
+        for statement in REBUILD_SQL:
+            my_db.session.execute(my_db.text(statement))
+        my_db.session.add(PersonChange(operation='reset'))
+        my_db.session.commit()
+        print(f"Seeded {size} persons in {time.time() - start_time:.1f} seconds", file=sys.stderr)
+
+
+def filter_form(rng, country_codes):
+    """Return a random /filter form, following the mix of filters used on the web page."""
+    kind = rng.choices(['name', 'forename', 'nationality', 'age', 'birth_year', 'combined'], [30, 15, 20, 15, 10, 10])[0]
+    if kind == 'name':
+        return {'forename': rng.choice(SYLLABLES)}
+    if kind == 'forename':
+        return {'name': rng.choice(SYLLABLES)}
+    if kind == 'nationality':
+        return {'nationalities': rng.choice(country_codes)}
+    if kind == 'age':
+        age_min = rng.randint(18, 80)
+        return {'age_min': age_min, 'age_max': age_min + rng.randint(0, 10)}
+    if kind == 'birth_year':
+        birth_year_min = rng.randint(1930, 2000)
+        return {'birth_year_min': birth_year_min, 'birth_year_max': birth_year_min + rng.randint(0, 5)}
+    age_min = rng.randint(18, 60)
+    return {'forename': rng.choice(SYLLABLES), 'age_min': age_min, 'age_max': age_min + 20}
+
+
+def make_request(endpoint, rng, country_codes, image_count):
+    """
+    Build a request of the given endpoint.
+
+    :return: The method, path, body and headers of the request.
+    :rtype: tuple
+    """
+    if endpoint == 'live_data':
+        return 'GET', '/live_data', None, {}
+    if endpoint == 'filter':
+        body = urlencode(filter_form(rng, country_codes))
+        return 'POST', '/filter', body, {'Content-Type': 'application/x-www-form-urlencoded'}
+    if endpoint == 'images':
+        return 'GET', f'/images/loadtest/{rng.randrange(image_count)}.jpg', None, {}
+    query = synthetic_name(rng)[:rng.randint(3, 6)]
+    return 'GET', '/search?' + urlencode({'q': query}), None, {}
+
+
+def process_tree_rss(pid):
+    """
+    Return the resident set size (in bytes) of a process and all its descendants, e.g. the gunicorn master and
+    its workers, read from /proc.
+    """
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f'/proc/{current}/status') as status_file:
+                for line in status_file:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1]) * 1024
+            for task in os.listdir(f'/proc/{current}/task'):
+                with open(f'/proc/{current}/task/{task}/children') as children_file:
+                    pending.extend(int(child) for child in children_file.read().split())
+        except (FileNotFoundError, ProcessLookupError):
+            # The process exited between two reads
+            continue
+    return total
+
+
+class MemorySampler(threading.Thread):
+    """Background thread recording the peak memory of the server during a phase."""
+
+    def __init__(self, pid, interval=0.2):
+        super().__init__(name='memory-sampler', daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.peak = max(self.peak, process_tree_rss(self.pid))
+            self.stopped.wait(self.interval)
+
+    def stop(self):
+        """Stop sampling and return the peak resident set size (in bytes)."""
+        self.stopped.set()
+        self.join()
+        return self.peak
+
+
+def percentile(sorted_values, fraction):
+    """Return the nearest-rank percentile of a sorted list."""
+    if not sorted_values:
+        return None
+    index = min(max(int(round(fraction * len(sorted_values) + 0.5)) - 1, 0), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def run_phase(url, endpoint, duration, concurrency, image_count, server_pid=None, seed=0):
+    """
+    Send requests to one endpoint from concurrent clients for a fixed duration.
+
+    Every client keeps its own HTTP/1.1 connection open, like a browser would.
+
+    :return: The number of requests and errors, the bytes received, the latencies (in seconds), the measured
+        duration and the peak memory of the server.
+    :rtype: dict
+    """
+    country_codes = sorted(read_country_catalog())
+    target = urlsplit(url)
+    deadline = time.perf_counter() + duration
+    sampler = MemorySampler(server_pid) if server_pid else None
+
+    def client(number):
+        rng = random.Random(f'{seed}-{endpoint}-{number}')
+        latencies, errors, received = [], 0, 0
+        connection = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=120)
+        while time.perf_counter() < deadline:
+            method, path, body, headers = make_request(endpoint, rng, country_codes, image_count)
+            start_time = time.perf_counter()
+            try:
+                connection.request(method, path, body=body, headers=headers)
+                response = connection.getresponse()
+                received += len(response.read())
+                if response.status >= 400:
+                    errors += 1
+            except (OSError, http.client.HTTPException):
+                errors += 1
+                connection.close()
+                connection = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=120)
+                continue
+            latencies.append(time.perf_counter() - start_time)
+        connection.close()
+        return latencies, errors, received
+
+    if sampler:
+        sampler.start()
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(client, range(concurrency)))
+    elapsed = time.perf_counter() - start_time
+
+    latencies = sorted(latency for client_latencies, _, _ in results for latency in client_latencies)
+    return {
+        'requests': len(latencies),
+        'errors': sum(errors for _, errors, _ in results),
+        'bytes_received': sum(received for _, _, received in results),
+        'latencies': latencies,
+        'elapsed': elapsed,
+        'server_rss_peak_bytes': sampler.stop() if sampler else None,
+    }
+
+
+def endpoint_record(size, endpoint, phase, label=None, concurrency=None):
+    """Build the result record of a phase."""
+    latencies = phase['latencies']
+
+    def milliseconds(value):
+        return round(value * 1000, 3) if value is not None else None
+
+    return {
+        'label': label,
+        'size': size,
+        'endpoint': endpoint,
+        'concurrency': concurrency,
+        'requests': phase['requests'],
+        'errors': phase['errors'],
+        'throughput_rps': round(phase['requests'] / phase['elapsed'], 2) if phase['elapsed'] else None,
+        'latency_ms': {
+            'p50': milliseconds(percentile(latencies, 0.50)),
+            'p95': milliseconds(percentile(latencies, 0.95)),
+            'p99': milliseconds(percentile(latencies, 0.99)),
+            'max': milliseconds(latencies[-1] if latencies else None),
+        },
+        'bytes_received': phase['bytes_received'],
+        'server_rss_peak_bytes': phase['server_rss_peak_bytes'],
+        'timestamp': datetime.datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+    }
+
+
+def wait_for_size(url, size, timeout=600):
+    """Wait until the server reports the expected number of persons and its name index is loaded."""
+    target = urlsplit(url)
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            connection = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=120)
+            connection.request('GET', '/readyz')
+            ready = connection.getresponse()
+            ready.read()
+            connection.request('GET', '/live_data')
+            live_data = json.loads(connection.getresponse().read())
+            connection.close()
+            if ready.status == 200 and live_data['total_people'] == size:
+                return True
+        except (OSError, http.client.HTTPException, ValueError, KeyError):
+            pass
+        time.sleep(1)
+    return False
+
+
+def run_suite(url, size, args):
+    """Measure every selected endpoint against the currently seeded database and return the records."""
+    records = []
+    for endpoint in args.endpoints:
+        phase = run_phase(url, endpoint, args.duration, args.concurrency, args.images, args.server_pid, args.seed)
+        record = endpoint_record(size, endpoint, phase, args.label, args.concurrency)
+        records.append(record)
+        print(json.dumps(record), file=sys.stderr)
+    return records
+
+
+def find_regressions(records, baseline_path, tolerance):
+    """
+    Compare results with the latest baseline record of each (size, endpoint).
+
+    :return: A description of every p95 latency or throughput regression beyond the tolerance.
+    :rtype: list
+    """
+    baseline = {}
+    with open(baseline_path) as baseline_file:
+        for line in baseline_file:
+            if line.strip():
+                record = json.loads(line)
+                baseline[(record['size'], record['endpoint'])] = record
+
+    regressions = []
+    for record in records:
+        previous = baseline.get((record['size'], record['endpoint']))
+        if previous is None:
+            continue
+        p95, previous_p95 = record['latency_ms']['p95'], previous['latency_ms']['p95']
+        if p95 is not None and previous_p95 and p95 > previous_p95 * (1 + tolerance):
+            regressions.append(f"{record['endpoint']} @ {record['size']}: p95 {previous_p95} ms -> {p95} ms")
+        throughput, previous_throughput = record['throughput_rps'], previous['throughput_rps']
+        if throughput is not None and previous_throughput and throughput < previous_throughput * (1 - tolerance):
+            regressions.append(
+                f"{record['endpoint']} @ {record['size']}: throughput {previous_throughput} -> {throughput} req/s"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the Container B read endpoints.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    seed_parser = subparsers.add_parser('seed', help="replace the persons of a database with synthetic ones")
+    run_parser = subparsers.add_parser('run', help="measure the endpoints against the current database")
+    suite_parser = subparsers.add_parser('suite', help="seed and measure every size in turn")
+
+    for command_parser in (seed_parser, suite_parser):
+        command_parser.add_argument('--database-url', required=True, help="database to seed (its persons are deleted)")
+    seed_parser.add_argument('--size', type=int, required=True)
+    run_parser.add_argument('--size', type=int, required=True, help="number of persons in the database")
+    suite_parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+
+    for command_parser in (seed_parser, run_parser, suite_parser):
+        command_parser.add_argument('--images', type=int, default=100, help="number of distinct images")
+        command_parser.add_argument('--seed', type=int, default=0)
+    for command_parser in (run_parser, suite_parser):
+        command_parser.add_argument('--url', default='http://localhost:5000', help="root URL of the web server")
+        command_parser.add_argument('--endpoints', nargs='+', choices=ENDPOINTS, default=ENDPOINTS)
+        command_parser.add_argument('--duration', type=float, default=30, help="seconds per endpoint")
+        command_parser.add_argument('--concurrency', type=int, default=16, help="concurrent clients")
+        command_parser.add_argument('--server-pid', type=int, help="PID of the server (e.g. the gunicorn master)")
+        command_parser.add_argument('--label', help="name of the run, e.g. the commit being measured")
+        command_parser.add_argument('--output', help="append the records to this JSON lines file")
+        command_parser.add_argument('--baseline', help="JSON lines results of a previous run to compare with")
+        command_parser.add_argument('--tolerance', type=float, default=0.2, help="allowed relative regression")
+    args = parser.parse_args()
+
+    if args.command == 'seed':
+        seed_people(args.database_url, args.size, args.images, args.seed)
+        return 0
+
+    records = []
+    if args.command == 'run':
+        records = run_suite(args.url, args.size, args)
+    else:
+        for size in args.sizes:
+            seed_people(args.database_url, size, args.images, args.seed)
+            if not wait_for_size(args.url, size):
+                print(f"The server did not load the {size} persons in time", file=sys.stderr)
+                return 1
+            records.extend(run_suite(args.url, size, args))
+
+    if args.output:
+        with open(args.output, 'a') as output_file:
+            for record in records:
+                output_file.write(json.dumps(record) + '\n')
+    else:
+        for record in records:
+            print(json.dumps(record))
+
+    if args.baseline:
+        regressions = find_regressions(records, args.baseline, args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
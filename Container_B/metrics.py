@@ -0,0 +1,58 @@
+"""
+metrics.py
+
+This module defines the Prometheus metrics of Container B: the ingest path of the RabbitMQ consumer process and
+the request latency of the web server. The web workers run under gunicorn, so when PROMETHEUS_MULTIPROC_DIR is
+set the metrics of all workers are aggregated by the multiprocess collector on /metrics.
+
+@Author: Nisanur Genc
+
+"""
+
+import os
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+
+# Consumer process
+MESSAGES_CONSUMED = Counter('consumer_messages_total', 'Messages received from the RabbitMQ queue')
+DECODE_FAILURES = Counter('consumer_decode_failures_total', 'Messages that could not be decoded as JSON')
+STORE_LATENCY = Histogram(
+    'consumer_store_seconds', 'Time spent in DBRegistrar.store_data_to_my_db',
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+IMAGE_DOWNLOAD_LATENCY = Histogram(
+    'consumer_image_download_seconds', 'Time spent downloading a notice image',
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+SWEPT_RECORDS = Counter('consumer_swept_records_total', 'Records deleted because a complete crawl did not see them')
+UNCHANGED_MESSAGES = Counter('consumer_unchanged_messages_total', 'Messages skipped because the stored record has the same content fingerprint')
+NOTICE_STAGE_LATENCY = Histogram(
+    'notice_stage_seconds', 'Latency of a notice per stage, from the Interpol listing response to the committed row',
+    ['stage'],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 3600),
+)
+
+# Web server
+REQUEST_LATENCY = Histogram(
+    'http_request_seconds', 'Latency of the HTTP requests per route',
+    ['method', 'route', 'status'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+DETAIL_LOOKUPS = Counter(
+    'person_detail_lookups_total', 'Notice detail lookups of /person per result',
+    ['result'],  # hit, coalesced, miss, revalidated, stale, not_found or error
+)
+
+
+def metrics_payload():
+    """
+    Render the metrics in the Prometheus text format.
+
+    :return: The body and the content type of the response.
+    :rtype: tuple
+    """
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
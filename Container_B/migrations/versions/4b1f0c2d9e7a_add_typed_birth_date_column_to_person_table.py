@@ -0,0 +1,57 @@
+"""Add typed birth_date column to Person table
+
+Revision ID: 4b1f0c2d9e7a
+Revises: 17860ae97c2d
+Create Date: 2026-10-19 10:12:31.218403
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from birth_dates import parse_date_of_birth
+
+
+# revision identifiers, used by Alembic.
+revision = '4b1f0c2d9e7a'
+down_revision = '17860ae97c2d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('person', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('birth_date', sa.Date(), nullable=True))
+        batch_op.add_column(sa.Column('birth_date_precision', sa.String(length=5), nullable=True))
+        batch_op.create_index(batch_op.f('ix_person_birth_date'), ['birth_date'], unique=False)
+
+    # Backfill the typed column from the existing date_of_birth strings
+    person = sa.table(
+        'person',
+        sa.column('entity_id', sa.String),
+        sa.column('date_of_birth', sa.String),
+        sa.column('birth_date', sa.Date),
+        sa.column('birth_date_precision', sa.String),
+    )
+    connection = op.get_bind()
+    rows = connection.execute(sa.select(person.c.entity_id, person.c.date_of_birth)).fetchall()
+
+    updates = []
+    for entity_id, date_of_birth in rows:
+        birth_date, precision = parse_date_of_birth(date_of_birth)
+        if birth_date is not None:
+            updates.append({'b_entity_id': entity_id, 'b_birth_date': birth_date, 'b_precision': precision})
+
+    if updates:
+        connection.execute(
+            person.update()
+            .where(person.c.entity_id == sa.bindparam('b_entity_id'))
+            .values(birth_date=sa.bindparam('b_birth_date'), birth_date_precision=sa.bindparam('b_precision')),
+            updates,
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('person', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_person_birth_date'))
+        batch_op.drop_column('birth_date_precision')
+        batch_op.drop_column('birth_date')
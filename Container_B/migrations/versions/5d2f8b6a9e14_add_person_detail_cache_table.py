@@ -0,0 +1,30 @@
+"""Add person_detail cache table
+
+Revision ID: 5d2f8b6a9e14
+Revises: e4a9b7c3d218
+Create Date: 2026-10-19 16:08:31.271045
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d2f8b6a9e14'
+down_revision = 'e4a9b7c3d218'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('person_detail',
+        sa.Column('entity_id', sa.String(length=100), nullable=False),
+        sa.Column('document', sa.Text(), nullable=False),
+        sa.Column('etag', sa.String(length=200), nullable=True),
+        sa.Column('fetched_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('entity_id')
+    )
+
+
+def downgrade():
+    op.drop_table('person_detail')
@@ -0,0 +1,30 @@
+"""Add person_change log table
+
+Revision ID: 9c3e5a71f2b8
+Revises: 4b1f0c2d9e7a
+Create Date: 2026-10-19 11:02:47.903516
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c3e5a71f2b8'
+down_revision = '4b1f0c2d9e7a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('person_change',
+        sa.Column('seq', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('entity_id', sa.String(length=100), nullable=True),
+        sa.Column('operation', sa.String(length=10), nullable=False),
+        sa.Column('changed_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('seq')
+    )
+
+
+def downgrade():
+    op.drop_table('person_change')
@@ -0,0 +1,39 @@
+"""Add person_aggregate summary table
+
+Revision ID: a83c1e6f4d27
+Revises: 5d2f8b6a9e14
+Create Date: 2026-10-19 17:21:09.448310
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a83c1e6f4d27'
+down_revision = '5d2f8b6a9e14'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('person_aggregate',
+        sa.Column('dimension', sa.String(length=20), nullable=False),
+        sa.Column('value', sa.String(length=100), nullable=False),
+        sa.Column('count', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('dimension', 'value')
+    )
+    # Count the existing records, the consumer keeps the counts up to date from now on
+    op.execute(
+        "INSERT INTO person_aggregate (dimension, value, count) "
+        "SELECT 'total', '', count(*) FROM person "
+        "UNION ALL "
+        "SELECT 'nationality', nationality, count(DISTINCT entity_id) "
+        "FROM person, json_array_elements_text(person.nationalities::json) AS nationality GROUP BY nationality "
+        "UNION ALL "
+        "SELECT 'birth_year', coalesce(extract(year FROM birth_date)::int::text, 'unknown'), count(*) FROM person GROUP BY 2"
+    )
+
+
+def downgrade():
+    op.drop_table('person_aggregate')
@@ -0,0 +1,47 @@
+"""Add document read model column to Person table
+
+Revision ID: c71d8e4a05f3
+Revises: 9c3e5a71f2b8
+Create Date: 2026-10-19 11:48:09.377120
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from read_model import DOCUMENT_FIELDS, build_person_view, serialize_view
+from readFile import read_country_data
+
+
+# revision identifiers, used by Alembic.
+revision = 'c71d8e4a05f3'
+down_revision = '9c3e5a71f2b8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('person', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('document', sa.Text(), nullable=True))
+
+    # Backfill the read model of the existing records
+    country_names = read_country_data("countries.txt")
+    person = sa.table('person', *(sa.column(field) for field in DOCUMENT_FIELDS), sa.column('document', sa.Text))
+    connection = op.get_bind()
+    rows = connection.execute(sa.select(*(person.c[field] for field in DOCUMENT_FIELDS))).mappings().fetchall()
+
+    updates = [
+        {'b_entity_id': row['entity_id'], 'b_document': serialize_view(build_person_view(row, country_names))}
+        for row in rows
+    ]
+    if updates:
+        connection.execute(
+            person.update()
+            .where(person.c.entity_id == sa.bindparam('b_entity_id'))
+            .values(document=sa.bindparam('b_document')),
+            updates,
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('person', schema=None) as batch_op:
+        batch_op.drop_column('document')
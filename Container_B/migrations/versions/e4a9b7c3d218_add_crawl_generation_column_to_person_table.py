@@ -0,0 +1,29 @@
+"""Add crawl_generation column to Person table
+
+Revision ID: e4a9b7c3d218
+Revises: c71d8e4a05f3
+Create Date: 2026-10-19 14:36:52.604118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4a9b7c3d218'
+down_revision = 'c71d8e4a05f3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing records have no generation, the first complete crawl stamps the ones it sees
+    with op.batch_alter_table('person', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('crawl_generation', sa.BigInteger(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_person_crawl_generation'), ['crawl_generation'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('person', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_person_crawl_generation'))
+        batch_op.drop_column('crawl_generation')
@@ -0,0 +1,27 @@
+"""Add fingerprint column to Person table
+
+Revision ID: f2b7d94c6a31
+Revises: a83c1e6f4d27
+Create Date: 2026-10-19 18:47:55.190372
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2b7d94c6a31'
+down_revision = 'a83c1e6f4d27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing records have no fingerprint, they are rewritten once by the next message of their notice
+    with op.batch_alter_table('person', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('fingerprint', sa.String(length=64), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('person', schema=None) as batch_op:
+        batch_op.drop_column('fingerprint')
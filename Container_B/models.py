@@ -0,0 +1,137 @@
+"""
+models.py
+
+This module defines the SQLAlchemy database instance and the models of Container B. It is shared by the web
+application and the standalone RabbitMQ consumer process, each of which binds it to its own Flask application
+(and so its own engine and connection pool) with init_app().
+
+@Author: Nisanur Genc
+
+"""
+
+import datetime
+from flask_migrate import stamp, upgrade
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import inspect
+
+my_db = SQLAlchemy()
+
+# The schema that the tables created by the baseline version (with create_all(), before the migrations were run)
+# correspond to, the later migrations are applied on top of it
+BASELINE_REVISION = '17860ae97c2d'
+
+
+class Person(my_db.Model):
+    """Model class representing a Person entity in the database."""
+    forename = my_db.Column(my_db.String(100))
+    date_of_birth = my_db.Column(my_db.String(100))
+    birth_date = my_db.Column(my_db.Date, index=True)  # Parsed date_of_birth, partial dates start at the first day of the period
+    birth_date_precision = my_db.Column(my_db.String(5))  # 'day', 'month' or 'year'
+    entity_id = my_db.Column(my_db.String(100), primary_key=True)
+    nationalities = my_db.Column(my_db.String(1000))
+    name = my_db.Column(my_db.String(100))
+    image = my_db.Column(my_db.String(1000))
+    document = my_db.Column(my_db.Text)  # Read model: the pre-serialized JSON returned by the read endpoints
+    crawl_generation = my_db.Column(my_db.BigInteger, index=True)  # The latest complete crawl that saw the notice
+    fingerprint = my_db.Column(my_db.String(64))  # SHA-256 of the content, unchanged messages are skipped on it
+
+    def __repr__(self):
+            return f"Person(forename={self.forename}, date_of_birth={self.date_of_birth}, " \
+                f"entity_id={self.entity_id}, nationalities={self.nationalities}, " \
+                f"name={self.name}, image={self.image}"
+
+
+class PersonChange(my_db.Model):
+    """
+    Model class representing one entry of the Person change log.
+
+    Every write of the Person table appends an entry in the same transaction. The writers (the RabbitMQ consumer,
+    bulk loads) hold an EXCLUSIVE lock on the log until their commit, see lock_change_log(), so 'seq' increases
+    monotonically with the committed changes. A 'reset' entry without entity_id marks a full wipe of the table,
+    after which clients have to reload the snapshot; so does a position older than the first entry, which means
+    that the entries after it were pruned.
+    """
+    seq = my_db.Column(my_db.BigInteger, primary_key=True, autoincrement=True)
+    entity_id = my_db.Column(my_db.String(100))
+    operation = my_db.Column(my_db.String(10), nullable=False)  # 'upsert', 'delete' or 'reset'
+    changed_at = my_db.Column(my_db.DateTime, nullable=False, default=datetime.datetime.utcnow)
+
+
+class PersonDetail(my_db.Model):
+    """
+    Model class caching the full detail document of a notice (charges, physical description, languages...).
+
+    The crawler only stores the listing fields, so the detail document is fetched from the Interpol API the first
+    time a notice is viewed and kept here for NOTICE_DETAIL_TTL, see notice_details.py.
+    """
+    entity_id = my_db.Column(my_db.String(100), primary_key=True)
+    document = my_db.Column(my_db.Text, nullable=False)  # The detail JSON as returned by the API
+    etag = my_db.Column(my_db.String(200))  # Validator of the upstream response, for the conditional refresh
+    fetched_at = my_db.Column(my_db.DateTime, nullable=False, default=datetime.datetime.utcnow)
+
+
+class PersonAggregate(my_db.Model):
+    """
+    Model class representing one count of the summary table behind /aggregates.
+
+    The counts are kept up to date by every write of the Person table (see aggregates.py), so the statistics are
+    read from a few hundred rows instead of scanning the whole table.
+    """
+    dimension = my_db.Column(my_db.String(20), primary_key=True)  # 'total', 'nationality' or 'birth_year'
+    value = my_db.Column(my_db.String(100), primary_key=True)
+    count = my_db.Column(my_db.BigInteger, nullable=False, default=0)
+
+
+def current_change_seq():
+    """Return the sequence number of the latest change log entry (0 if the log is empty)."""
+    return my_db.session.query(my_db.func.coalesce(my_db.func.max(PersonChange.seq), 0)).scalar()
+
+
+def lock_change_log():
+    """Lock the change log until the end of the transaction, so the sequence numbers are committed in order."""
+    my_db.session.execute(my_db.text(f'LOCK TABLE {PersonChange.__table__.name} IN EXCLUSIVE MODE'))
+
+
+def first_change_seq():
+    """Return the sequence number of the oldest change log entry still kept (None if the log is empty)."""
+    return my_db.session.query(my_db.func.min(PersonChange.seq)).scalar()
+
+
+def migrate_database():
+    """
+    Bring the database schema up to date with the Alembic migrations. Must run inside an application context.
+
+    An empty database is created from the models and stamped with the latest revision. A database created by
+    create_all() without migrations (the baseline deployments) is stamped with BASELINE_REVISION first, so the
+    migrations that add the later columns and tables run on it. The processes starting together (web workers,
+    consumer) take turns on a PostgreSQL advisory lock.
+    """
+    with my_db.engine.connect() as connection:
+        connection.execute(my_db.text("SELECT pg_advisory_lock(hashtext('migrate_database'))"))
+        try:
+            tables = inspect(connection).get_table_names()
+            if Person.__tablename__ not in tables:
+                my_db.create_all()
+                stamp()
+            else:
+                if 'alembic_version' not in tables:
+                    columns = [column['name'] for column in inspect(connection).get_columns(Person.__tablename__)]
+                    if 'birth_date' in columns:
+                        # Created by create_all() from the current models, only tables may be missing
+                        my_db.create_all()
+                        stamp()
+                    else:
+                        stamp(revision=BASELINE_REVISION)
+                upgrade()
+        finally:
+            connection.execute(my_db.text("SELECT pg_advisory_unlock(hashtext('migrate_database'))"))
+
+
+def clean_database():
+    """Clean the whole database by deleting all records."""
+    lock_change_log()
+    my_db.session.query(Person).delete()
+    my_db.session.query(PersonAggregate).delete()
+    my_db.session.add(PersonChange(operation='reset'))
+    my_db.session.commit()
+    print("Database cleaned")
@@ -0,0 +1,231 @@
+"""
+name_index.py
+
+This module contains the NameIndex class, an in-memory fuzzy search index over the 'name' and 'forename'
+fields of the Person records. Interpol names arrive in many transliterations (e.g. "MOHAMMED" / "MUHAMMAD"),
+so every name token is indexed both by its character trigrams and by a phonetic (Soundex) key. The index is
+rebuilt from PostgreSQL at startup and updated incrementally as DBRegistrar stores records.
+
+@Author: Nisanur Genc
+
+"""
+
+import heapq
+import re
+import sys
+import threading
+
+
+# Soundex digit for every consonant group; vowels and H/W/Y are not coded
+SOUNDEX_CODES = {}
+for letters, digit in (("BFPV", "1"), ("CGJKQSXZ", "2"), ("DT", "3"), ("L", "4"), ("MN", "5"), ("R", "6")):
+    for letter in letters:
+        SOUNDEX_CODES[letter] = digit
+
+TOKEN_PATTERN = re.compile(r"[A-Z]+")
+
+
+def tokenize(text):
+    """
+    Split a name into upper-case alphabetic tokens.
+
+    :param text: The name or forename to tokenize.
+    :type text: str
+    :return: The list of tokens (empty for missing or "Unknown" values).
+    :rtype: list
+    """
+    if not text or text == "Unknown":
+        return []
+    return TOKEN_PATTERN.findall(text.upper())
+
+
+def trigrams(token):
+    """
+    Return the set of character trigrams of a token, padded so that short tokens and word edges are indexed.
+
+    :param token: An upper-case name token.
+    :type token: str
+    :rtype: set
+    """
+    padded = f"$${token}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def soundex(token):
+    """
+    Return the Soundex key of a token, e.g. both "MOHAMMED" and "MUHAMMAD" map to "M530".
+
+    :param token: An upper-case name token.
+    :type token: str
+    :rtype: str
+    """
+    first = token[0]
+    key = [first]
+    previous = SOUNDEX_CODES.get(first)
+
+    for letter in token[1:]:
+        digit = SOUNDEX_CODES.get(letter)
+        if digit and digit != previous:
+            key.append(digit)
+            if len(key) == 4:
+                break
+        # H and W do not separate two letters with the same code, vowels do
+        if letter not in "HW":
+            previous = digit
+
+    return "".join(key).ljust(4, "0")
+
+
+class NameIndex:
+    """
+    Thread-safe in-memory n-gram and phonetic index over Person names.
+
+    Every entity is assigned a small integer document id, so the posting lists hold ints instead of
+    entity_id strings, and the trigram / phonetic keys are interned to keep the footprint compact.
+    """
+
+    # Weight of a phonetic key match relative to the trigram similarity
+    PHONETIC_WEIGHT = 0.5
+
+    def __init__(self):
+        """Initialize an empty NameIndex."""
+        self.lock = threading.Lock()
+        self.doc_ids = {}      # entity_id -> document id
+        self.documents = []    # document id -> (entity_id, name, forename, trigram keys, phonetic keys) or None
+        self.free_doc_ids = []
+        self.trigram_postings = {}
+        self.phonetic_postings = {}
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def __contains__(self, entity_id):
+        return entity_id in self.doc_ids
+
+    def rebuild(self, person_model):
+        """
+        Rebuild the index from the Person table, loading only the columns it needs.
+
+        :param person_model: The Person model class.
+        :type person_model: class
+        """
+        rows = person_model.query.with_entities(
+            person_model.entity_id, person_model.name, person_model.forename
+        ).yield_per(1000)
+
+        self.clear()
+        for entity_id, name, forename in rows:
+            self.add(entity_id, name, forename)
+        print(f"Name index rebuilt with {len(self)} records.")
+
+    def clear(self):
+        """Remove every record from the index."""
+        with self.lock:
+            self.doc_ids = {}
+            self.documents = []
+            self.free_doc_ids = []
+            self.trigram_postings = {}
+            self.phonetic_postings = {}
+
+    def add(self, entity_id, name, forename):
+        """
+        Add or replace the record for an entity.
+
+        :param entity_id: The entity ID of the person.
+        :type entity_id: str
+        :param name: The name of the person.
+        :type name: str
+        :param forename: The forename of the person.
+        :type forename: str
+        """
+        tokens = tokenize(name) + tokenize(forename)
+        gram_keys = frozenset(sys.intern(gram) for token in tokens for gram in trigrams(token))
+        phonetic_keys = frozenset(sys.intern(soundex(token)) for token in tokens)
+
+        with self.lock:
+            doc_id = self.doc_ids.get(entity_id)
+            if doc_id is not None:
+                self._unlink(doc_id)
+            elif self.free_doc_ids:
+                doc_id = self.free_doc_ids.pop()
+            else:
+                doc_id = len(self.documents)
+                self.documents.append(None)
+
+            self.doc_ids[entity_id] = doc_id
+            self.documents[doc_id] = (entity_id, name, forename, gram_keys, phonetic_keys)
+            for gram in gram_keys:
+                self.trigram_postings.setdefault(gram, set()).add(doc_id)
+            for key in phonetic_keys:
+                self.phonetic_postings.setdefault(key, set()).add(doc_id)
+
+    def remove(self, entity_id):
+        """
+        Remove the record of an entity if it is indexed.
+
+        :param entity_id: The entity ID of the person.
+        :type entity_id: str
+        """
+        with self.lock:
+            doc_id = self.doc_ids.pop(entity_id, None)
+            if doc_id is not None:
+                self._unlink(doc_id)
+                self.documents[doc_id] = None
+                self.free_doc_ids.append(doc_id)
+
+    def _unlink(self, doc_id):
+        """Drop a document from the posting lists (the caller holds the lock)."""
+        _, _, _, gram_keys, phonetic_keys = self.documents[doc_id]
+        for postings, keys in ((self.trigram_postings, gram_keys), (self.phonetic_postings, phonetic_keys)):
+            for key in keys:
+                docs = postings.get(key)
+                if docs is not None:
+                    docs.discard(doc_id)
+                    if not docs:
+                        del postings[key]
+
+    def search(self, query, limit=20):
+        """
+        Return the indexed records that best match the query, best match first.
+
+        The score combines the Jaccard similarity of the trigram sets with the share of query tokens whose
+        phonetic key matches the record.
+
+        :param query: The free-text name query.
+        :type query: str
+        :param limit: The maximum number of candidates to return.
+        :type limit: int
+        :return: A list of dicts with entity_id, name, forename and score.
+        :rtype: list
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+
+        query_grams = {gram for token in tokens for gram in trigrams(token)}
+        query_phonetic = {soundex(token) for token in tokens}
+
+        with self.lock:
+            gram_hits = {}
+            for gram in query_grams:
+                for doc_id in self.trigram_postings.get(gram, ()):
+                    gram_hits[doc_id] = gram_hits.get(doc_id, 0) + 1
+
+            phonetic_hits = {}
+            for key in query_phonetic:
+                for doc_id in self.phonetic_postings.get(key, ()):
+                    phonetic_hits[doc_id] = phonetic_hits.get(doc_id, 0) + 1
+
+            scored = []
+            for doc_id in gram_hits.keys() | phonetic_hits.keys():
+                entity_id, name, forename, gram_keys, _ = self.documents[doc_id]
+                hits = gram_hits.get(doc_id, 0)
+                similarity = hits / (len(query_grams) + len(gram_keys) - hits)
+                score = similarity + self.PHONETIC_WEIGHT * phonetic_hits.get(doc_id, 0) / len(query_phonetic)
+                scored.append((score, entity_id, name, forename))
+
+        best = heapq.nlargest(limit, scored)
+        return [
+            {"entity_id": entity_id, "name": name, "forename": forename, "score": round(score, 4)}
+            for score, entity_id, name, forename in best
+        ]
@@ -0,0 +1,172 @@
+"""
+notice_details.py
+
+This module contains the NoticeDetails class. The crawler only stores the fields of the Interpol listing, so the
+full detail document of a notice (charges, physical description, languages...) is fetched on demand, the first
+time the notice is viewed, and cached in the person_detail table for NOTICE_DETAIL_TTL:
+
+- concurrent requests for the same notice in a web worker wait for a single fetch,
+- no database connection is held during the request to the API: the cache is read, the connection returned to the
+  pool, and the document upserted afterwards in a short transaction. Across the web workers the same document may
+  thus be fetched once per worker, the last upsert wins,
+- an expired document is revalidated with a conditional GET, and is still served (marked as stale) if the API
+  cannot be reached.
+
+@Author: Nisanur Genc
+
+"""
+
+import datetime
+import json
+import os
+import threading
+from concurrent.futures import Future
+import requests
+from sqlalchemy.dialects.postgresql import insert
+from metrics import DETAIL_LOOKUPS
+
+INTERPOL_API_URL = os.environ.get('INTERPOL_API_URL', 'https://ws-public.interpol.int/notices/v1/red')
+NOTICE_DETAIL_TTL = int(os.environ.get('NOTICE_DETAIL_TTL', 24 * 3600))  # Seconds
+NOTICE_DETAIL_TIMEOUT = float(os.environ.get('NOTICE_DETAIL_TIMEOUT', 10))  # Seconds
+
+
+class DetailUnavailable(Exception):
+    """The detail document could not be fetched and no cached copy exists."""
+
+
+class NoticeDetails:
+    """On-demand, cached and coalesced lookup of the notice detail documents."""
+
+    def __init__(self, db, detail_model, api_url=INTERPOL_API_URL, ttl=NOTICE_DETAIL_TTL, timeout=NOTICE_DETAIL_TIMEOUT):
+        """
+        Initialize the NoticeDetails.
+
+        :param db: The SQLAlchemy database instance.
+        :type db: flask_sqlalchemy.SQLAlchemy
+        :param detail_model: The PersonDetail model class of the cache.
+        :type detail_model: class
+        :param api_url: The URL of the red notices API, the detail document of a notice is under <api_url>/<id>.
+        :type api_url: str
+        :param ttl: The time (in seconds) during which a cached document is served without revalidation.
+        :type ttl: int
+        :param timeout: The timeout (in seconds) of a request to the API.
+        :type timeout: float
+        """
+        self.db = db
+        self.detail_model = detail_model
+        self.api_url = api_url.rstrip('/')
+        self.ttl = datetime.timedelta(seconds=ttl)
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.in_flight = {}  # entity_id -> Future of the lookup run by the first request
+
+    def detail_url(self, entity_id):
+        """Return the API URL of the detail document, the API writes the '/' of the entity IDs as '-'."""
+        return f"{self.api_url}/{entity_id.replace('/', '-')}"
+
+    def is_fresh(self, row):
+        return datetime.datetime.utcnow() - row.fetched_at < self.ttl
+
+    def cached(self, entity_id):
+        """Read the cache entry of a notice (document, etag, fetched_at), or None."""
+        table = self.detail_model.__table__
+        query = self.db.select(table.c.document, table.c.etag, table.c.fetched_at).where(table.c.entity_id == entity_id)
+        return self.db.session.execute(query).first()
+
+    def lookup(self, entity_id):
+        """
+        Return the detail document of a notice, from the cache or from the API.
+
+        :param entity_id: The entity ID of the notice.
+        :type entity_id: str
+        :return: (serialized document, fetched_at, stale), or None if the API does not know the notice.
+        :rtype: tuple
+        :raises DetailUnavailable: If the document is not cached and the API cannot be reached.
+        """
+        row = self.cached(entity_id)
+        if row is not None and self.is_fresh(row):
+            DETAIL_LOOKUPS.labels('hit').inc()
+            return row.document, row.fetched_at, False
+        # Do not hold a pooled connection while waiting for the fetch
+        self.db.session.rollback()
+
+        with self.lock:
+            future = self.in_flight.get(entity_id)
+            leader = future is None
+            if leader:
+                future = self.in_flight[entity_id] = Future()
+
+        if not leader:
+            DETAIL_LOOKUPS.labels('coalesced').inc()
+            return future.result()
+
+        try:
+            future.set_result(self.refresh(entity_id))
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            with self.lock:
+                del self.in_flight[entity_id]
+        return future.result()
+
+    def refresh(self, entity_id):
+        """Fetch and store the detail document, without holding a database connection during the fetch."""
+        try:
+            # A previous fetch of this worker may have completed since the lookup read the cache
+            row = self.cached(entity_id)
+            # Return the connection to the pool, fetch() only takes one again for its write after the request
+            self.db.session.rollback()
+            if row is not None and self.is_fresh(row):
+                DETAIL_LOOKUPS.labels('coalesced').inc()
+                return row.document, row.fetched_at, False
+            result = self.fetch(entity_id, row)
+            self.db.session.commit()
+            return result
+        except Exception:
+            self.db.session.rollback()
+            raise
+
+    def fetch(self, entity_id, row):
+        """
+        Request the detail document from the API and update the cache entry.
+
+        :param entity_id: The entity ID of the notice.
+        :type entity_id: str
+        :param row: The expired cache entry, revalidated with its ETag, or None.
+        :return: See lookup().
+        :rtype: tuple
+        """
+        headers = {'If-None-Match': row.etag} if row is not None and row.etag else {}
+        try:
+            response = requests.get(self.detail_url(entity_id), headers=headers, timeout=self.timeout)
+            if response.status_code == 404:
+                # The notice was withdrawn, its cached document must not be served anymore
+                DETAIL_LOOKUPS.labels('not_found').inc()
+                self.db.session.query(self.detail_model).filter_by(entity_id=entity_id).delete()
+                return None
+            if response.status_code != 304:
+                response.raise_for_status()
+                document = json.dumps(response.json(), separators=(',', ':'))
+        except (requests.exceptions.RequestException, ValueError) as e:
+            print(f"Error fetching the notice detail of {entity_id}: {str(e)}")
+            if row is None:
+                DETAIL_LOOKUPS.labels('error').inc()
+                raise DetailUnavailable(str(e))
+            DETAIL_LOOKUPS.labels('stale').inc()
+            return row.document, row.fetched_at, True
+
+        if response.status_code == 304:
+            DETAIL_LOOKUPS.labels('revalidated').inc()
+            document, etag = row.document, row.etag
+        else:
+            DETAIL_LOOKUPS.labels('miss').inc()
+            etag = response.headers.get('ETag')
+
+        fetched_at = datetime.datetime.utcnow()
+        table = self.detail_model.__table__
+        statement = insert(table).values(entity_id=entity_id, document=document, etag=etag, fetched_at=fetched_at)
+        self.db.session.execute(statement.on_conflict_do_update(
+            index_elements=[table.c.entity_id],
+            set_={'document': document, 'etag': etag, 'fetched_at': fetched_at},
+        ))
+        return document, fetched_at, False
@@ -1,3 +1,13 @@
+import json
+import os
+
+# The country catalog maintained by Container A from the Interpol website, shared through the /shared volume
+COUNTRY_CATALOG_PATH = os.environ.get(
+    'COUNTRY_CATALOG_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'shared', 'countries.json'),
+)
+
+
 def read_country_data(file_path):
     country_data = {}
     with open(file_path, "r") as file:
@@ -6,4 +16,19 @@ def read_country_data(file_path):
             # Remove double quotes from the name
             name = name.strip('"')
             country_data[code.strip('"')] = name
-    return country_data
\ No newline at end of file
+    return country_data
+
+
+def read_country_catalog(catalog_path=COUNTRY_CATALOG_PATH, fallback_path="countries.txt"):
+    """
+    Read the country names by country code from the shared country catalog, or from the fallback file if the
+    catalog is not available.
+    """
+    try:
+        with open(catalog_path, encoding="utf-8") as catalog_file:
+            countries = json.load(catalog_file)['countries']
+        if countries:
+            return countries
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"Country catalog not available, using {fallback_path}: {str(e)}")
+    return read_country_data(fallback_path)
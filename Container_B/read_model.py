@@ -0,0 +1,69 @@
+"""
+read_model.py
+
+This module builds the denormalized read model of a Person record: the JSON document returned by the read
+endpoints, with the nationalities already resolved to country names. DBRegistrar stores it with every write,
+so the endpoints only need to concatenate the stored documents instead of rebuilding every row on each read.
+
+@Author: Nisanur Genc
+
+"""
+
+import json
+
+# Fields of the Person record exposed by the read endpoints, in output order
+DOCUMENT_FIELDS = ['entity_id', 'name', 'forename', 'date_of_birth', 'birth_date', 'birth_date_precision', 'nationalities', 'image']
+
+
+def parse_fields(value):
+    """
+    Parse the 'fields' projection parameter of the read endpoints, e.g. "entity_id,name,forename".
+
+    :param value: The comma-separated field names, or None.
+    :type value: str
+    :return: The requested fields in output order, or None if the parameter is empty (the whole documents).
+    :rtype: list
+    :raises ValueError: If a field is not in DOCUMENT_FIELDS.
+    """
+    requested = {field.strip() for field in (value or '').split(',') if field.strip()}
+    if not requested:
+        return None
+    unknown = requested.difference(DOCUMENT_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}. Available: {', '.join(DOCUMENT_FIELDS)}")
+    return [field for field in DOCUMENT_FIELDS if field in requested]
+
+
+def build_person_view(person_fields, country_names, fields=DOCUMENT_FIELDS):
+    """
+    Build the dict exposed by the read endpoints for a Person record.
+
+    :param person_fields: The column values of the record; 'nationalities' is the stored JSON list of country codes.
+    :type person_fields: Mapping
+    :param country_names: The mapping of country codes to country names.
+    :type country_names: dict
+    :param fields: The fields of the view, a projection of DOCUMENT_FIELDS.
+    :type fields: list
+    :rtype: dict
+    """
+    view = {field: person_fields.get(field) for field in fields}
+
+    if 'nationalities' in view:
+        nationalities = view['nationalities']
+        if isinstance(nationalities, str):
+            nationalities = json.loads(nationalities)
+        view['nationalities'] = [country_names.get(country_code, country_code) for country_code in nationalities or []]
+
+    if view.get('birth_date') is not None:
+        view['birth_date'] = view['birth_date'].isoformat()
+    return view
+
+
+def serialize_view(view):
+    """Serialize a view built by build_person_view() to its compact JSON document."""
+    return json.dumps(view, separators=(',', ':'), ensure_ascii=False)
+
+
+def json_array(documents):
+    """Concatenate pre-serialized JSON documents into a JSON array without decoding them."""
+    return '[' + ','.join(documents) + ']'
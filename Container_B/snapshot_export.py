@@ -0,0 +1,224 @@
+"""
+snapshot_export.py
+
+Columnar snapshot export of the Person table for analysis, instead of post-processing the /live_data JSON.
+
+The table is read with a server-side cursor and written in row groups to a compressed Parquet (or Arrow IPC) file,
+so the memory use stays flat whatever the size of the table. The nationalities are exported as lists of country
+codes and of country names. The export can be partitioned by the year of the entity ID ("2013/54969" -> 2013) into
+hive-style directories (entity_year=2013/part-0.parquet) that Parquet readers prune when filtering on the year.
+
+Every file is written under a temporary name and renamed when complete, and carries the change log sequence
+(last_seq) of the snapshot in its metadata, so it can be refreshed incrementally from /changes.
+
+    python snapshot_export.py --output exports/people.parquet
+    python snapshot_export.py --output exports/people --partition-by-year --interval 3600
+
+@Author: Nisanur Genc
+
+"""
+
+import argparse
+import datetime
+import json
+import os
+import shutil
+import sys
+import time
+import pyarrow as pa
+import pyarrow.ipc
+import pyarrow.parquet as pq
+from app import COUNTRY_NAMES, create_app
+from models import my_db, Person, current_change_seq
+
+ROW_GROUP_SIZE = 50000
+HIVE_NULL_PARTITION = '__HIVE_DEFAULT_PARTITION__'  # Partition of the entity IDs without a year
+
+SCHEMA = pa.schema([
+    ('entity_id', pa.string()),
+    ('entity_year', pa.int16()),
+    ('name', pa.string()),
+    ('forename', pa.string()),
+    ('date_of_birth', pa.string()),
+    ('birth_date', pa.date32()),
+    ('birth_date_precision', pa.string()),
+    ('nationality_codes', pa.list_(pa.string())),
+    ('nationalities', pa.list_(pa.string())),
+    ('image', pa.string()),
+])
+
+EXPORTED_COLUMNS = [
+    Person.entity_id, Person.name, Person.forename, Person.date_of_birth, Person.birth_date,
+    Person.birth_date_precision, Person.nationalities, Person.image,
+]
+
+
+def entity_year(entity_id):
+    """Return the year prefix of an entity ID, e.g. 2013 for "2013/54969", or None."""
+    prefix = (entity_id or '').split('/', 1)[0]
+    return int(prefix) if prefix.isdigit() and len(prefix) == 4 else None
+
+
+def record_batch(rows):
+    """
+    Convert a chunk of Person rows into an Arrow record batch.
+
+    :param rows: Rows with the EXPORTED_COLUMNS values.
+    :type rows: list
+    :rtype: pyarrow.RecordBatch
+    """
+    columns = {field: [] for field in SCHEMA.names}
+    for entity_id, name, forename, date_of_birth, birth_date, birth_date_precision, nationalities, image in rows:
+        codes = json.loads(nationalities) if nationalities else []
+        columns['entity_id'].append(entity_id)
+        columns['entity_year'].append(entity_year(entity_id))
+        columns['name'].append(name)
+        columns['forename'].append(forename)
+        columns['date_of_birth'].append(date_of_birth)
+        columns['birth_date'].append(birth_date)
+        columns['birth_date_precision'].append(birth_date_precision)
+        columns['nationality_codes'].append(codes)
+        columns['nationalities'].append([COUNTRY_NAMES.get(code, code) for code in codes])
+        columns['image'].append(image)
+    return pa.RecordBatch.from_pydict(columns, schema=SCHEMA)
+
+
+class SnapshotWriter:
+    """Writes record batches to a Parquet or Arrow IPC file under a temporary name, renamed on close()."""
+
+    def __init__(self, path, file_format, schema, metadata):
+        """
+        :param path: The final path of the file.
+        :type path: str
+        :param file_format: 'parquet' or 'arrow'.
+        :type file_format: str
+        :param schema: The schema of the written tables.
+        :type schema: pyarrow.Schema
+        :param metadata: The key-value metadata stored in the file.
+        :type metadata: dict
+        """
+        self.path = path
+        self.temporary_path = path + '.tmp'
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        schema = schema.with_metadata({key: str(value) for key, value in metadata.items()})
+        if file_format == 'parquet':
+            self.writer = pq.ParquetWriter(self.temporary_path, schema, compression='zstd')
+        else:
+            self.sink = pa.OSFile(self.temporary_path, 'wb')
+            self.writer = pa.ipc.new_file(self.sink, schema, options=pa.ipc.IpcWriteOptions(compression='zstd'))
+        self.file_format = file_format
+
+    def write(self, table):
+        """Write a table as one row group (Parquet) or record batch (Arrow IPC)."""
+        if self.file_format == 'parquet':
+            self.writer.write_table(table, row_group_size=table.num_rows)
+        else:
+            self.writer.write_table(table, max_chunksize=table.num_rows)
+
+    def close(self):
+        """Finish the file and move it to its final path."""
+        self.writer.close()
+        if self.file_format != 'parquet':
+            self.sink.close()
+        os.replace(self.temporary_path, self.path)
+
+
+def export_snapshot(output, file_format='parquet', partition_by_year=False, row_group_size=ROW_GROUP_SIZE):
+    """
+    Export the Person table. Must run inside an application context.
+
+    :param output: The file to write or, when partitioned, the directory of the partitions.
+    :type output: str
+    :param file_format: 'parquet' or 'arrow'.
+    :type file_format: str
+    :param partition_by_year: Write one file per entity ID year.
+    :type partition_by_year: bool
+    :param row_group_size: The number of rows per row group, and so the number of rows held in memory.
+    :type row_group_size: int
+    :return: The number of exported rows.
+    :rtype: int
+    """
+    # Read the sequence before the rows, like /live_data, so a client syncing from it never misses a change
+    metadata = {
+        'last_seq': current_change_seq(),
+        'exported_at': datetime.datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+    }
+    my_db.session.remove()
+    extension = '.parquet' if file_format == 'parquet' else '.arrow'
+
+    if partition_by_year:
+        # Written next to the previous export and swapped in at the end
+        staging_directory = output.rstrip('/') + '.tmp'
+        shutil.rmtree(staging_directory, ignore_errors=True)
+
+    query = my_db.select(*EXPORTED_COLUMNS).order_by(Person.entity_id)
+    exported = 0
+    writer = None
+    # One open file per partition: entity IDs do not all start with their year, so the rows of a year are not
+    # necessarily contiguous
+    partition_writers = {}
+    with my_db.engine.connect() as connection:
+        result = connection.execution_options(stream_results=True).execute(query)
+        for rows in result.partitions(row_group_size):
+            batch = record_batch(rows)
+            if not partition_by_year:
+                writer = writer or SnapshotWriter(output, file_format, SCHEMA, metadata)
+                writer.write(pa.Table.from_batches([batch]))
+            else:
+                rows_by_year = {}
+                for index, year in enumerate(batch.column('entity_year').to_pylist()):
+                    rows_by_year.setdefault(year, []).append(index)
+                # The year is in the directory name, like any hive-style partition key
+                table = pa.Table.from_batches([batch]).drop(['entity_year'])
+                for year, indices in rows_by_year.items():
+                    if year not in partition_writers:
+                        partition = f"entity_year={year if year is not None else HIVE_NULL_PARTITION}"
+                        partition_writers[year] = SnapshotWriter(
+                            os.path.join(staging_directory, partition, 'part-0' + extension), file_format,
+                            table.schema, metadata,
+                        )
+                    partition_writers[year].write(table.take(indices))
+            exported += batch.num_rows
+
+    if writer is None and not partition_by_year:
+        # Empty table: still write a valid file with the schema
+        writer = SnapshotWriter(output, file_format, SCHEMA, metadata)
+    if writer is not None:
+        writer.close()
+    for partition_writer in partition_writers.values():
+        partition_writer.close()
+
+    if partition_by_year:
+        os.makedirs(staging_directory, exist_ok=True)
+        previous_directory = output.rstrip('/') + '.old'
+        shutil.rmtree(previous_directory, ignore_errors=True)
+        if os.path.exists(output):
+            os.replace(output, previous_directory)
+        os.replace(staging_directory, output)
+        shutil.rmtree(previous_directory, ignore_errors=True)
+    return exported
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the Person table to a columnar snapshot.")
+    parser.add_argument('--output', default='exports/people.parquet',
+                        help="file to write, or directory of the partitions with --partition-by-year")
+    parser.add_argument('--format', choices=['parquet', 'arrow'], default='parquet')
+    parser.add_argument('--partition-by-year', action='store_true', help="one file per entity ID year")
+    parser.add_argument('--row-group-size', type=int, default=ROW_GROUP_SIZE)
+    parser.add_argument('--interval', type=float, help="export again every INTERVAL seconds")
+    args = parser.parse_args()
+
+    app = create_app()
+    while True:
+        with app.app_context():
+            start_time = time.time()
+            exported = export_snapshot(args.output, args.format, args.partition_by_year, args.row_group_size)
+            print(f"Exported {exported} persons to {args.output} in {time.time() - start_time:.1f} seconds")
+        if not args.interval:
+            return 0
+        time.sleep(args.interval)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -7,12 +7,14 @@ function checkFields() {
   const forename = document.getElementById("forename").value;
   const nationalities = document.getElementById("nationalities");
   const dateOfBirth = document.getElementById("date_of_birth").value;
+  const ageMin = document.getElementById("age_min").value;
+  const ageMax = document.getElementById("age_max").value;
 
   // Check if the 'nationalities' field has the default selected option (disabled and selected)
   const isNationalityDefault = nationalities.selectedIndex === 0;
 
   // Calculate if the "Filter" button should be disabled or not
-  const isFilterButtonDisabled = !(name || forename || dateOfBirth || !isNationalityDefault);
+  const isFilterButtonDisabled = !(name || forename || dateOfBirth || ageMin || ageMax || !isNationalityDefault);
 
   // JavaScript code to handle the click event for the "Filter" button
   const filterButton = document.getElementById("find");
@@ -28,6 +30,8 @@ document.addEventListener("DOMContentLoaded", () => {
   document.getElementById("forename").addEventListener("input", checkFields);
   document.getElementById("nationalities").addEventListener("change", checkFields);
   document.getElementById("date_of_birth").addEventListener("input", checkFields);
+  document.getElementById("age_min").addEventListener("input", checkFields);
+  document.getElementById("age_max").addEventListener("input", checkFields);
 });
 
 /// Add event listener to the form submission for "Filter" button
@@ -65,76 +69,241 @@ document.querySelector('form[action="/filter"]').addEventListener('submit', func
       lastRefreshedElement.textContent = currentTime.getMinutes();
     }
 
-    // Call the updateLastRefreshedTime and updateTotalRecords functions when the page loads
+    // Show the number of records of every nationality in the filter form, from the summary counts of the server
+    async function updateFacets() {
+      try {
+        const response = await fetch('/aggregates');
+        const statistics = await response.json();
+
+        document.getElementById('totalPeople').textContent = statistics.total_people;
+        Array.from(document.getElementById('nationalities').options).forEach(option => {
+          if (option.disabled) {
+            return;
+          }
+          option.dataset.label = option.dataset.label || option.textContent;
+          option.textContent = `${option.dataset.label} (${statistics.nationalities[option.value] || 0})`;
+        });
+      } catch (error) {
+        console.error('Error fetching the aggregates:', error);
+      }
+    }
+
+    // Call the updateLastRefreshedTime and updateFacets functions when the page loads
     document.addEventListener('DOMContentLoaded', () => {
       updateLastRefreshedTime();
-      updateTotalRecords();
+      updateFacets();
     });
 
     // Add an interval to update the last refreshed time every minute
     setInterval(updateLastRefreshedTime, 60000);
 
-    async function updateTable(route, formData) {
+    // The results table is virtualized: only the rows in (or near) the viewport are in the DOM, and the records
+    // are fetched from the server one page at a time as the user scrolls to them
+    const ROW_HEIGHT = 121; // px, the 100px image plus the cell padding and border
+    const PAGE_SIZE = 100; // Records requested per page
+    const OVERSCAN_ROWS = 10; // Rows rendered above and below the viewport
+
+    // The route whose results are currently shown in the table ('/live_data' or '/filter')
+    let currentRoute = null;
+    let currentFormData = null; // The filter criteria of the '/filter' results
+    let resultCount = 0; // The number of records of the results
+    let pages = new Map(); // Page number -> records of the page
+    let previousPages = new Map(); // Pages shown while their reloaded version is being fetched
+    let pendingPages = new Set(); // Page numbers being fetched
+    let tableGeneration = 0; // Incremented when the results change, so late responses of older ones are dropped
+    let renderScheduled = false;
+    let reloadTimer = null;
+
+    // Load the images of the rows once they are about to scroll into view
+    const imageObserver = 'IntersectionObserver' in window ? new IntersectionObserver(entries => {
+      entries.forEach(entry => {
+        if (entry.isIntersecting) {
+          entry.target.src = entry.target.dataset.src;
+          imageObserver.unobserve(entry.target);
+        }
+      });
+    }, { root: document.getElementById('filteredResultsViewport'), rootMargin: '200px 0px' }) : null;
+
+    // Fill an empty table row with the cells of a person record
+    function renderPersonRow(row, person) {
+      row.dataset.entityId = person.entity_id;
+
+      // Loop through the columns to create table cells
+      const columns = ['image', 'entity_id', 'name', 'forename', 'nationalities', 'date_of_birth'];
+      columns.forEach(column => {
+        const newCell = row.insertCell();
+
+        // For the 'image' column, create an img element
+        if (column === 'image') {
+          const imgElement = document.createElement('img');
+          const imageUrl = `/images/${person.entity_id}.jpg`;
+          imgElement.loading = 'lazy';
+          imgElement.alt = `Image for ${person.name}`;
+          imgElement.style.width = '100px';
+          imgElement.style.height = '100px';
+          imgElement.style.objectFit = 'cover';
+          if (imageObserver) {
+            imgElement.dataset.src = imageUrl;
+            imageObserver.observe(imgElement);
+          } else {
+            imgElement.src = imageUrl;
+          }
+          newCell.appendChild(imgElement);
+        } else {
+          // For other columns, set the text content
+          newCell.textContent = person[column];
+        }
+      });
+    }
+
+    // Return the record at an index of the results, or undefined if its page is not loaded yet
+    function recordAt(index) {
+      const pageNumber = Math.floor(index / PAGE_SIZE);
+      const page = pages.get(pageNumber) || previousPages.get(pageNumber);
+      return page ? page[index % PAGE_SIZE] : undefined;
+    }
+
+    // Fetch one page of the current results, unless it is already loaded or being fetched
+    async function fetchPage(pageNumber) {
+      if (pages.has(pageNumber) || pendingPages.has(pageNumber)) {
+        return;
+      }
+      const generation = tableGeneration;
+      pendingPages.add(pageNumber);
+
+      const formData = new FormData();
+      if (currentFormData) {
+        currentFormData.forEach((value, key) => formData.append(key, value));
+      }
+      formData.append('offset', pageNumber * PAGE_SIZE);
+      formData.append('limit', PAGE_SIZE);
+
       try {
-        const response = await fetch(route, {
-          method: 'POST',
-          body: formData
-        });
-    
+        const response = await fetch(currentRoute, { method: 'POST', body: formData });
         const data = await response.json();
-        const tableBody = document.getElementById('filteredResultsBody'); // Use the tbody of the filtered results table
-    
-        // Clear any existing table rows
-        tableBody.innerHTML = '';
-    
-        // Add the filtered data to the table
-        data.data.forEach(person => {
-          const newRow = tableBody.insertRow();
-    
-          // Loop through the columns to create table cells
-          const columns = ['image', 'entity_id', 'name', 'forename', 'nationalities', 'date_of_birth'];
-          columns.forEach(column => {
-            const newCell = newRow.insertCell();
-    
-            // For the 'image' column, create an img element
-            if (column === 'image') {
-              const imgElement = document.createElement('img');
-              imgElement.src = `/images/${person.entity_id}.jpg`; 
-              imgElement.alt = `Image for ${person.name}`;
-              imgElement.style.width = '100px';
-              imgElement.style.height = '100px';
-              imgElement.style.objectFit = 'cover';
-              newCell.appendChild(imgElement);
-            } else {
-              // For other columns, set the text content
-              newCell.textContent = person[column];
-            }
-          });
-        });
-    
-        // Update the total number of records with the value obtained from the response
-        const totalPeopleElement = document.getElementById('totalPeople');
-        totalPeopleElement.textContent = data.total_people;
-
-          // Update the count of filtered people in the "filteredCount" element.
-          const filteredCountElement = document.getElementById('filteredCount');
-          filteredCountElement.textContent = data.data.length;
-    
-        // If the button was clicked, scroll to the table where the data is displayed
-        const showButton = document.getElementById('showButton');
-        if (showButton.dataset.clicked === 'true') {
-          const filteredResultsElement = document.getElementById('filteredResults');
-          filteredResultsElement.scrollIntoView({ behavior: 'smooth' });
-    
-          // Enable scrolling after clicking the showButton and scrolling to the filteredResults
-          document.body.classList.remove('disable-scrolling');
+        if (generation !== tableGeneration) {
+          return; // The results were replaced while the page was loading
         }
-    
+        pages.set(pageNumber, data.data);
+        updateCounts(data);
+        scheduleRender();
       } catch (error) {
         console.error('Error fetching data:', error);
+      } finally {
+        if (generation === tableGeneration) {
+          pendingPages.delete(pageNumber);
+        }
+      }
+    }
+
+    // Update the record counts shown above the tables from a page response
+    function updateCounts(data) {
+      if (data.total_people !== undefined) {
+        // Update the total number of records with the value obtained from the response
+        document.getElementById('totalPeople').textContent = data.total_people;
+      }
+      resultCount = data.total !== undefined ? data.total : data.total_people;
+
+      // Update the count of filtered people in the "filteredCount" element.
+      document.getElementById('filteredCount').textContent = resultCount;
+    }
+
+    // Render the visible rows on the next animation frame, at most once per frame
+    function scheduleRender() {
+      if (!renderScheduled) {
+        renderScheduled = true;
+        requestAnimationFrame(() => {
+          renderScheduled = false;
+          renderVisibleRows();
+        });
+      }
+    }
+
+    // Replace the rows of the table with the ones in the viewport, between two spacers keeping the scroll height
+    function renderVisibleRows() {
+      const viewport = document.getElementById('filteredResultsViewport');
+      const tableBody = document.getElementById('filteredResultsBody');
+      const headerHeight = tableBody.offsetTop;
+
+      const first = Math.max(Math.floor((viewport.scrollTop - headerHeight) / ROW_HEIGHT) - OVERSCAN_ROWS, 0);
+      const last = Math.min(Math.ceil((viewport.scrollTop + viewport.clientHeight - headerHeight) / ROW_HEIGHT) + OVERSCAN_ROWS, resultCount);
+
+      const fragment = document.createDocumentFragment();
+      fragment.appendChild(spacerRow(first * ROW_HEIGHT));
+      for (let index = first; index < last; index++) {
+        const row = document.createElement('tr');
+        row.style.height = `${ROW_HEIGHT}px`;
+        fetchPage(Math.floor(index / PAGE_SIZE));
+        const person = recordAt(index);
+        if (person) {
+          renderPersonRow(row, person);
+        } else {
+          row.insertCell().textContent = 'Loading...';
+        }
+        fragment.appendChild(row);
+      }
+      fragment.appendChild(spacerRow(Math.max(resultCount - Math.max(last, first), 0) * ROW_HEIGHT));
+
+      // Stop observing the images of the rows that are removed
+      if (imageObserver) {
+        tableBody.querySelectorAll('img[data-src]').forEach(img => imageObserver.unobserve(img));
+      }
+      tableBody.replaceChildren(fragment);
+    }
+
+    function spacerRow(height) {
+      const row = document.createElement('tr');
+      row.className = 'spacer';
+      row.style.height = `${height}px`;
+      return row;
+    }
+
+    async function updateTable(route, formData) {
+      // Drop the pages of the previous results, and any of their responses still in flight
+      tableGeneration++;
+      currentRoute = route;
+      currentFormData = formData || null;
+      pages = new Map();
+      previousPages = new Map();
+      pendingPages = new Set();
+      resultCount = 0;
+      document.getElementById('filteredResultsViewport').scrollTop = 0;
+
+      // The first page also tells the number of results, which sizes the table
+      await fetchPage(0);
+      updateFacets();
+
+      // If the button was clicked, scroll to the table where the data is displayed
+      const showButton = document.getElementById('showButton');
+      if (showButton.dataset.clicked === 'true') {
+        const filteredResultsElement = document.getElementById('filteredResults');
+        filteredResultsElement.scrollIntoView({ behavior: 'smooth' });
+
+        // Enable scrolling after clicking the showButton and scrolling to the filteredResults
+        document.body.classList.remove('disable-scrolling');
       }
     }
 
+    // Reload the pages of the current results, once a burst of changes is over
+    function scheduleReload() {
+      clearTimeout(reloadTimer);
+      reloadTimer = setTimeout(() => {
+        if (currentRoute === null) {
+          return;
+        }
+        tableGeneration++;
+        // The rows keep showing the previous records until their page is loaded again
+        previousPages = pages;
+        pages = new Map();
+        pendingPages = new Set();
+        fetchPage(0);
+        scheduleRender();
+      }, 2000);
+    }
+
+    document.getElementById('filteredResultsViewport').addEventListener('scroll', scheduleRender, { passive: true });
+    window.addEventListener('resize', scheduleRender);
+
 
   // Add event listener to the form submission for "Live Data" button
   document.querySelector('form[action="/live_data"]').addEventListener('submit', function(event) {
@@ -162,4 +331,55 @@ document.querySelector('form[action="/filter"]').addEventListener('submit', func
             // Submit the form to the '/filter' route when the "Filter" button is clicked
             $("form").submit();
         });
-    });
\ No newline at end of file
+    });
+
+
+    // Apply the change events pushed by the server to the table instead of reloading it
+    const changeEvents = new EventSource('/events');
+
+    changeEvents.addEventListener('upsert', function(event) {
+      const change = JSON.parse(event.data);
+      const person = change.person;
+
+      if (change.created) {
+        const totalPeopleElement = document.getElementById('totalPeople');
+        totalPeopleElement.textContent = (parseInt(totalPeopleElement.textContent, 10) || 0) + 1;
+      }
+
+      // Replace the record in the loaded page that holds it
+      let found = false;
+      pages.forEach(page => {
+        const index = page.findIndex(record => record.entity_id === person.entity_id);
+        if (index !== -1) {
+          page[index] = person;
+          found = true;
+        }
+      });
+
+      if (found) {
+        scheduleRender();
+      } else if (currentRoute === '/live_data') {
+        // New records only belong in the table when it shows the live data, not filtered results; the pages after
+        // its position in the entity ID order shift, so they are reloaded
+        scheduleReload();
+      }
+      updateLastRefreshedTime();
+    });
+
+    changeEvents.addEventListener('delete', function(event) {
+      const change = JSON.parse(event.data);
+      const shown = Array.from(pages.values()).some(page => page.some(record => record.entity_id === change.entity_id));
+
+      if (shown || currentRoute === '/live_data') {
+        scheduleReload();
+      }
+      const totalPeopleElement = document.getElementById('totalPeople');
+      totalPeopleElement.textContent = Math.max((parseInt(totalPeopleElement.textContent, 10) || 0) - 1, 0);
+    });
+
+    changeEvents.addEventListener('reset', function() {
+      // The server could not deliver every change, reload the table that is currently shown
+      if (currentRoute !== null) {
+        updateTable(currentRoute, currentFormData);
+      }
+    });
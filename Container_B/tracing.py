@@ -0,0 +1,97 @@
+"""
+tracing.py
+
+This module follows the end-to-end latency of every notice, from the Interpol listing response in Container A to
+the committed row in PostgreSQL. Container A sends the trace context as AMQP headers (trace_id, fetched_at,
+published_at), the consumer adds consumed_at and DBRegistrar committed_at. The per-stage latencies are observed
+in the 'notice_stage_seconds' histogram and appended as one JSON line per notice to the trace log.
+
+The trace log is rotated by size: once it exceeds NOTICE_TRACE_LOG_MAX_BYTES it is renamed to <log>.1 (the
+previous backups shifting to <log>.2 ...), and only the latest NOTICE_TRACE_LOG_BACKUPS backups are kept.
+
+@Author: Nisanur Genc
+
+"""
+
+import json
+import os
+import threading
+import time
+from metrics import NOTICE_STAGE_LATENCY
+
+TRACE_LOG_PATH = os.environ.get('NOTICE_TRACE_LOG', 'notice_traces.jsonl')
+TRACE_LOG_MAX_BYTES = int(os.environ.get('NOTICE_TRACE_LOG_MAX_BYTES', 50 * 1024 * 1024))
+TRACE_LOG_BACKUPS = int(os.environ.get('NOTICE_TRACE_LOG_BACKUPS', 3))
+
+# (stage, start timestamp, end timestamp) of the exported spans
+STAGES = [
+    ('fetch_to_publish', 'fetched_at', 'published_at'),
+    ('queue', 'published_at', 'consumed_at'),
+    ('consume_to_commit', 'consumed_at', 'committed_at'),
+    ('end_to_end', 'fetched_at', 'committed_at'),
+]
+
+trace_log_lock = threading.Lock()
+
+
+def start_trace(headers):
+    """
+    Build the trace of a consumed message from its AMQP headers.
+
+    :param headers: The AMQP headers of the message (may be None for messages sent without a trace context).
+    :type headers: dict
+    :return: The trace, with the consume time added.
+    :rtype: dict
+    """
+    trace = {}
+    for key in ('trace_id', 'fetched_at', 'published_at'):
+        value = (headers or {}).get(key)
+        if isinstance(value, bytes):
+            value = value.decode()
+        if value is not None:
+            trace[key] = value
+    trace['consumed_at'] = time.time()
+    return trace
+
+
+def rotate_trace_log():
+    """Shift the backups of the trace log by one, dropping the oldest, and move the log to <log>.1."""
+    for number in range(TRACE_LOG_BACKUPS - 1, 0, -1):
+        backup_path = f"{TRACE_LOG_PATH}.{number}"
+        if os.path.exists(backup_path):
+            os.replace(backup_path, f"{TRACE_LOG_PATH}.{number + 1}")
+    if TRACE_LOG_BACKUPS > 0:
+        os.replace(TRACE_LOG_PATH, f"{TRACE_LOG_PATH}.1")
+    else:
+        os.remove(TRACE_LOG_PATH)
+
+
+def finish_trace(trace, entity_id):
+    """
+    Add the commit time to a trace and export its per-stage latencies.
+
+    :param trace: The trace built by start_trace().
+    :type trace: dict
+    :param entity_id: The entity ID of the stored notice.
+    :type entity_id: str
+    """
+    trace['committed_at'] = time.time()
+
+    spans = {}
+    for stage, start_key, end_key in STAGES:
+        if start_key in trace and end_key in trace:
+            # The containers share the host clock, a small negative value is only rounding
+            duration = max(float(trace[end_key]) - float(trace[start_key]), 0.0)
+            spans[stage] = round(duration, 6)
+            NOTICE_STAGE_LATENCY.labels(stage).observe(duration)
+
+    record = dict(trace, entity_id=entity_id, spans=spans)
+    try:
+        with trace_log_lock:
+            with open(TRACE_LOG_PATH, 'a') as trace_log:
+                trace_log.write(json.dumps(record) + '\n')
+                full = trace_log.tell() > TRACE_LOG_MAX_BYTES
+            if full:
+                rotate_trace_log()
+    except OSError as e:
+        print(f"Error writing the notice trace: {str(e)}")
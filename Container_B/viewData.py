@@ -1,9 +1,9 @@
-
-from app import my_db, Person
+from app import create_app
+from models import Person
 
 def view_data():
-    with my_db.session_scope() as session:
-        persons = session.query(Person).all()
+    with create_app().app_context():
+        persons = Person.query.all()
 
         for person in persons:
             print(person)
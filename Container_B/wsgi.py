@@ -0,0 +1,28 @@
+"""
+wsgi.py
+
+WSGI entry point of the Container B web server, served by a multi-worker prefork server:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Every worker process builds its own application, engine and connection pool, loads its own name index and
+follows the change log written by the consumer process (consumer.py). The database schema is migrated before
+(models.migrate_database), the first worker does it and the others find it up to date.
+
+@Author: Nisanur Genc
+
+"""
+
+import os
+from app import create_app
+
+# One connection per request thread (see gunicorn.conf.py) plus the change follower, with some headroom for bursts.
+# The /events threads do not query the database, so in practice fewer connections are open.
+WEB_ENGINE_OPTIONS = {
+    'pool_size': int(os.environ.get('GUNICORN_THREADS', 16)) + 1,
+    'max_overflow': 4,
+    'pool_pre_ping': True,
+    'pool_recycle': 1800,
+}
+
+app = create_app(engine_options=WEB_ENGINE_OPTIONS, follow_changes=True, migrate=True)